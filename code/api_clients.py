@@ -1,9 +1,17 @@
 import os
+import io
 import json
-import requests
 import time
-from openai import OpenAI
-from dotenv import load_dotenv
+import hashlib
+from json_io import load_json, iter_jsonl
+from telemetry import classify_error, usage_to_dict
+
+# 批量API单个输入文件的默认上限，可在服务商配置中用 batch_max_requests、batch_max_bytes 覆盖
+BATCH_MAX_REQUESTS = 50000
+BATCH_MAX_BYTES = 100 * 1024 * 1024
+
+# 可在模型上单独配置的调优参数
+MODEL_TUNING_KEYS = ("concurrency", "group_size", "rate_limit")
 
 class APIClient:
     """统一的API客户端基类"""
@@ -15,27 +23,117 @@ class APIClient:
         self.model = config.get('model')
         self.name = config.get('name', 'Unknown')
         self.client_type = config.get('client_type', 'openai')
+        self.provider_id = config.get('provider_id', self.name)
+        # 遥测记录器（telemetry.Telemetry），为None时不记录
+        self.telemetry = None
+        # 并发控制器（concurrency_controller.AIMDController），每次请求尝试的结果都会通知它
+        self.controller = None
     
-    def call_api(self, messages, max_retries=3):
+    def call_api(self, messages, max_retries=3, group_size=None):
         """调用API的抽象方法，子类需要实现"""
         raise NotImplementedError
     
+    def _record_call(self, start, attempts, group_size, usage, error=None):
+        """记录一次API调用（含全部重试）的遥测数据"""
+        if self.telemetry is None:
+            return
+        outcome, status_code = ("ok", None) if error is None else classify_error(error)
+        self.telemetry.record(
+            provider=self.provider_id,
+            model=self.model,
+            group_size=group_size,
+            latency=round(time.perf_counter() - start, 4),
+            retries=attempts - 1,
+            outcome=outcome,
+            status_code=status_code,
+            error=None if error is None else str(error)[:200],
+            **usage
+        )
+    
+    def set_controller(self, controller):
+        self.controller = controller
+    
+    def _observe_attempt(self, attempt_start, group_size, error=None):
+        if self.controller is not None:
+            self.controller.observe(time.perf_counter() - attempt_start, group_size, error)
+    
+    @staticmethod
+    def _add_usage(total, usage):
+        for key, value in usage_to_dict(usage).items():
+            total[key] += value
+    
     def get_name(self):
         """获取服务商名称"""
         return self.name
 
+class BatchInputBuilder:
+    """
+    生成批量API的JSONL输入文件
+    内容相同的请求（模型、参数和消息都相同）只保留第一个，其余记录在 duplicates 中；
+    单个文件的请求数或字节数将超过上限时开始下一个文件
+    """
+    
+    def __init__(self, model, temperature, max_requests=BATCH_MAX_REQUESTS, max_bytes=BATCH_MAX_BYTES):
+        self.model = model
+        self.temperature = temperature
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.duplicates = {}
+    
+    def iter_files(self, requests_data):
+        """逐个产出 (文件内容bytes, 文件中的custom_id列表)"""
+        seen = {}  # 请求体摘要 → custom_id
+        buffer = io.BytesIO()
+        custom_ids = []
+        for i, request in enumerate(requests_data):
+            custom_id = request.get("custom_id", f"request-{i}")
+            body = {
+                "model": self.model,
+                "messages": request["messages"],
+                "response_format": {"type": "json_object"},
+                "temperature": self.temperature
+            }
+            body_json = json.dumps(body, ensure_ascii=False, separators=(',', ':'))
+            digest = hashlib.sha1(body_json.encode('utf-8')).digest()
+            if digest in seen:
+                self.duplicates[custom_id] = seen[digest]
+                continue
+            seen[digest] = custom_id
+            line = ('{"custom_id":%s,"method":"POST","url":"/v1/chat/completions","body":%s}\n'
+                    % (json.dumps(custom_id, ensure_ascii=False), body_json)).encode('utf-8')
+            if custom_ids and (len(custom_ids) >= self.max_requests or buffer.tell() + len(line) > self.max_bytes):
+                yield buffer.getvalue(), custom_ids
+                buffer = io.BytesIO()
+                custom_ids = []
+            buffer.write(line)
+            custom_ids.append(custom_id)
+        if custom_ids:
+            yield buffer.getvalue(), custom_ids
+
 class OpenAIClient(APIClient):
     """OpenAI兼容的API客户端（支持通义千问、硅基流动等）"""
     
     def __init__(self, config):
         super().__init__(config)
+        # openai 包导入需要近1秒，只在真正创建客户端时导入
+        from openai import OpenAI
         self.client = OpenAI(
             api_key=self.api_key,
             base_url=self.api_url,
         )
+        self._sdk_client = self.client  # 保留SDK默认重试的原始客户端
+    
+    def set_controller(self, controller):
+        # openai SDK 默认会静默重试429和5xx，控制器需要看到每一次限流，改由 call_api 自己重试；
+        # 移除控制器时换回原始客户端，恢复SDK的重试
+        super().set_controller(controller)
+        self.client = self._sdk_client.with_options(max_retries=0) if controller is not None else self._sdk_client
     
-    def call_api(self, messages, max_retries=3):
+    def call_api(self, messages, max_retries=3, group_size=None):
+        start = time.perf_counter()
+        usage = usage_to_dict(None)
         for attempt in range(max_retries):
+            attempt_start = time.perf_counter()
             try:
                 completion = self.client.chat.completions.create(
                     model=self.model,
@@ -43,97 +141,58 @@ class OpenAIClient(APIClient):
                     messages=messages,
                     response_format={"type": "json_object"}
                 )
+                # 解析失败的请求同样消耗了token，先累计用量
+                self._add_usage(usage, completion.usage)
                 
                 result_json = json.loads(completion.choices[0].message.content)
+                self._observe_attempt(attempt_start, group_size)
+                self._record_call(start, attempt + 1, group_size, usage)
                 return result_json
             except Exception as e:
+                self._observe_attempt(attempt_start, group_size, e)
                 if attempt == max_retries - 1:
+                    self._record_call(start, attempt + 1, group_size, usage, e)
                     raise e
                 time.sleep(2 + attempt * 2)
         
         raise Exception("所有重试都失败")
     
-    def create_batch_request(self, requests_data, batch_description="SFX Translation Batch"):
-        """创建批量请求（支持通义千问Batch API）"""
-        try:
-            # 检查是否支持批量API
-            if "dashscope" in self.api_url.lower():
-                return self._create_dashscope_batch(requests_data, batch_description)
-            else:
-                # 对于其他OpenAI兼容服务，使用常规批量处理
-                return self._create_openai_batch(requests_data, batch_description)
-        except Exception as e:
-            print(f"创建批量请求失败: {e}")
-            return None
-    
-    def _create_dashscope_batch(self, requests_data, batch_description):
-        """创建通义千问批量请求"""
+    def create_batch_jobs(self, requests_data, batch_description="SFX Translation Batch"):
+        """
+        创建批量作业（支持通义千问Batch API）
+        requests_data: [{"messages": ..., "custom_id": 可选，默认 request-序号}]
+        请求按服务商限制（batch_max_requests、batch_max_bytes）自动拆分为多个输入文件和作业，内容相同的请求只提交一次
+        返回 (作业列表, {重复请求的custom_id: 实际提交的custom_id})，不支持批量API时作业列表为空
+        """
+        if not self.supports_batch():
+            # 其他OpenAI兼容服务暂不支持批量API
+            return [], {}
+        builder = BatchInputBuilder(
+            self.model, self.config.get('temperature', 1.3),
+            max_requests=self.config.get('batch_max_requests', BATCH_MAX_REQUESTS),
+            max_bytes=self.config.get('batch_max_bytes', BATCH_MAX_BYTES),
+        )
+        jobs = []
         try:
-            # 准备批量请求数据
-            batch_input = []
-            for i, request in enumerate(requests_data):
-                batch_input.append({
-                    "custom_id": f"request-{i}",
-                    "method": "POST",
-                    "url": "/v1/chat/completions",
-                    "body": {
-                        "model": self.model,
-                        "messages": request["messages"],
-                        "response_format": {"type": "json_object"},
-                        "temperature": self.config.get('temperature', 1.3)
+            # 每个输入文件在内存中生成后直接上传，不写临时文件；上传完再生成下一个
+            for n, (data, custom_ids) in enumerate(builder.iter_files(requests_data), 1):
+                file_response = self.client.files.create(file=(f"sfx_batch_{n}.jsonl", data), purpose="batch")
+                batch_job = self.client.batches.create(
+                    input_file_id=file_response.id,
+                    endpoint="/v1/chat/completions",
+                    completion_window="24h",
+                    metadata={
+                        "description": batch_description,
+                        "created_by": "SFXRenamer"
                     }
-                })
-            
-            # 创建批量作业
-            batch_job = self.client.batches.create(
-                input_file_id=self._upload_batch_file(batch_input),
-                endpoint="/v1/chat/completions",
-                completion_window="24h",
-                metadata={
-                    "description": batch_description,
-                    "created_by": "SFXRenamer"
-                }
-            )
-            
-            print(f"✓ 批量作业已创建: {batch_job.id}")
-            return batch_job
-            
+                )
+                print(f"✓ 批量作业已创建: {batch_job.id}（{len(custom_ids)} 个请求，{len(data) / 1024 / 1024:.1f} MB）")
+                jobs.append(batch_job)
         except Exception as e:
             print(f"创建通义千问批量请求失败: {e}")
-            return None
-    
-    def _create_openai_batch(self, requests_data, batch_description):
-        """创建OpenAI标准批量请求"""
-        try:
-            # 对于其他服务，可能需要不同的实现
-            # 这里先返回None，表示不支持批量
-            return None
-        except Exception as e:
-            print(f"创建OpenAI批量请求失败: {e}")
-            return None
-    
-    def _upload_batch_file(self, batch_input):
-        """上传批量请求文件"""
-        import tempfile
-        
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.jsonl', delete=False) as f:
-            for item in batch_input:
-                f.write(json.dumps(item, ensure_ascii=False) + '\n')
-            temp_file_path = f.name
-        
-        try:
-            # 上传文件
-            with open(temp_file_path, 'rb') as f:
-                file_response = self.client.files.create(
-                    file=f,
-                    purpose="batch"
-                )
-            
-            return file_response.id
-        finally:
-            # 清理临时文件
-            os.unlink(temp_file_path)
+        if builder.duplicates:
+            print(f"✓ 跳过 {len(builder.duplicates)} 个内容重复的请求")
+        return jobs, builder.duplicates
     
     def get_batch_status(self, batch_id):
         """获取批量作业状态"""
@@ -143,27 +202,44 @@ class OpenAIClient(APIClient):
             print(f"获取批量作业状态失败: {e}")
             return None
     
-    def get_batch_results(self, batch_id):
-        """获取批量作业结果"""
+    def download_file(self, file_id, path, chunk_size=1 << 20):
+        """把服务商的文件按块流式下载到 path，不在内存中保留整个文件"""
+        with self.client.files.with_streaming_response.content(file_id) as response:
+            with open(path, 'wb') as f:
+                for chunk in response.iter_bytes(chunk_size):
+                    f.write(chunk)
+        return path
+    
+    def download_batch_results(self, batch_id, directory):
+        """
+        把已完成批量作业的结果文件和错误文件下载到 directory
+        返回 (batch, 结果文件路径, 错误文件路径)，没有对应文件时路径为None；作业未完成或出错时返回None
+        """
         try:
             batch = self.client.batches.retrieve(batch_id)
-            if batch.status == "completed" and batch.output_file_id:
-                # 下载结果文件
-                result_file = self.client.files.content(batch.output_file_id)
-                results = []
-                for line in result_file.text.strip().split('\n'):
-                    if line:
-                        results.append(json.loads(line))
-                return results
-            else:
+            if batch.status != "completed":
                 return None
+            paths = []
+            for kind, file_id in (("output", batch.output_file_id), ("error", getattr(batch, "error_file_id", None))):
+                paths.append(self.download_file(file_id, os.path.join(directory, f"{batch_id}_{kind}.jsonl"))
+                             if file_id else None)
+            return batch, paths[0], paths[1]
         except Exception as e:
             print(f"获取批量作业结果失败: {e}")
             return None
     
+    def get_batch_results(self, batch_id):
+        """获取批量作业的全部结果（含错误文件中的记录），作业未完成时返回None；结果很多时请用 download_batch_results 逐行处理"""
+        import tempfile
+        with tempfile.TemporaryDirectory(prefix="sfx_batch_") as directory:
+            downloaded = self.download_batch_results(batch_id, directory)
+            if downloaded is None:
+                return None
+            return [record for path in downloaded[1:] if path for record in iter_jsonl(path)]
+    
     def supports_batch(self):
-        """检查是否支持批量API"""
-        return "dashscope" in self.api_url.lower()
+        """检查是否支持批量API，可在服务商配置中用 supports_batch 显式指定"""
+        return self.config.get('supports_batch', "dashscope" in self.api_url.lower())
 
 class SiliconFlowClient(APIClient):
     """硅基流动API客户端（使用HTTP请求）"""
@@ -171,7 +247,10 @@ class SiliconFlowClient(APIClient):
     def __init__(self, config):
         super().__init__(config)
     
-    def call_api(self, messages, max_retries=3):
+    def call_api(self, messages, max_retries=3, group_size=None):
+        import requests
+        start = time.perf_counter()
+        usage = usage_to_dict(None)
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -184,28 +263,35 @@ class SiliconFlowClient(APIClient):
         }
         
         for attempt in range(max_retries):
+            attempt_start = time.perf_counter()
             try:
                 response = requests.post(self.api_url, headers=headers, json=data)
                 response.raise_for_status()
                 result = response.json()
+                self._add_usage(usage, result.get("usage"))
                 
                 if "choices" in result and len(result["choices"]) > 0:
                     content = result["choices"][0]["message"]["content"]
                     # 尝试解析JSON，如果失败则返回原始内容
                     try:
-                        return json.loads(content)
+                        parsed = json.loads(content)
                     except json.JSONDecodeError:
                         # 如果不是JSON格式，尝试从文本中提取JSON
                         import re
                         json_match = re.search(r'\{.*\}', content, re.DOTALL)
                         if json_match:
-                            return json.loads(json_match.group())
+                            parsed = json.loads(json_match.group())
                         else:
-                            raise Exception(f"无法解析响应内容为JSON: {content}")
+                            raise ValueError(f"无法解析响应内容为JSON: {content}")
+                    self._observe_attempt(attempt_start, group_size)
+                    self._record_call(start, attempt + 1, group_size, usage)
+                    return parsed
                 else:
                     raise Exception(f"API返回格式异常: {result}")
             except Exception as e:
+                self._observe_attempt(attempt_start, group_size, e)
                 if attempt == max_retries - 1:
+                    self._record_call(start, attempt + 1, group_size, usage, e)
                     raise e
                 time.sleep(2 + attempt * 2)
         
@@ -224,8 +310,7 @@ class ProvidersConfig:
     def _load_config(self):
         """加载配置文件"""
         try:
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return load_json(self.config_file)
         except FileNotFoundError:
             raise FileNotFoundError(f"配置文件不存在: {self.config_file}")
         except json.JSONDecodeError as e:
@@ -242,6 +327,7 @@ class ProvidersConfig:
             raise ValueError(f"未找到服务商: {provider_id}")
         
         provider_config = providers[provider_id].copy()
+        provider_config['provider_id'] = provider_id
         common_settings = self.config.get('common_settings', {})
         
         # 合并通用设置
@@ -256,8 +342,33 @@ class ProvidersConfig:
             provider_config['model'] = provider_config.get('default_model', 
                                                           provider_config.get('models', [{}])[0].get('id', ''))
         
+        # 设置模型单价
+        pricing = self.get_model_pricing(provider_id, provider_config['model'])
+        if pricing:
+            provider_config['pricing'] = pricing
+        
+        # 模型上的压测推荐配置（config_manager.py bench 写入）优先于服务商的同名配置
+        for model in provider_config.get('models', []):
+            if model.get('id') == provider_config['model']:
+                for key in MODEL_TUNING_KEYS:
+                    if key in model:
+                        provider_config[key] = model[key]
+        
         return provider_config
     
+    def get_model_pricing(self, provider_id, model_id):
+        """
+        获取模型单价 {"input": 元/千token, "output": 元/千token, "cached_input": 元/千token}
+        优先使用模型的 pricing，其次使用服务商的 pricing，都没有时返回None
+        """
+        provider = self.get_providers().get(provider_id, {})
+        for model in provider.get('models', []):
+            if model.get('id') == model_id and model.get('pricing'):
+                return dict(model['pricing'])
+        if provider.get('pricing'):
+            return dict(provider['pricing'])
+        return None
+    
     def get_provider_models(self, provider_id):
         """获取指定服务商的模型列表"""
         providers = self.get_providers()
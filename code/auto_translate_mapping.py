@@ -2,25 +2,42 @@ import os
 import json
 import time
 import argparse
-from dotenv import load_dotenv
-import importlib.util
-import tiktoken
-from api_clients import APIClientFactory, get_client_by_provider, ProvidersConfig
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from api_clients import get_client_by_provider, ProvidersConfig
+from json_io import load_json, dump_json, iter_jsonl
+from prompts import build_translation_messages, build_glossary
+from telemetry import Telemetry, DEFAULT_METRICS_DIR, usage_to_dict
+from cost_estimator import CostEstimator, default_pricing
+from group_mapping_blocks import group_mapping, iter_group_mapping, STRATEGIES
+from rule_translator import RuleTranslator, DEFAULT_RULES_PATH
+from mapping_writer import MappingWriter
+from concurrency_controller import AIMDController, CONCURRENCY_LOG_FILE
 
-# 加载.env配置
-load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+# 配置管理器（首次使用时加载）
+_providers_config = None
 
-# 配置管理器
-providers_config = ProvidersConfig()
+# tiktoken 编码器缓存（首次估算时加载）
+_encodings = {}
 
 # 全局API客户端
 selected_client = None
 
+# 提示词选项（术语表、缓存标记），由 configure_prompt 设置
+_prompt_options = {"glossary": "", "cache_hint": False}
+
 # 文件路径
 MAPPING_PATH = os.path.join(os.path.dirname(__file__), "..", "json", "mapping.json")
 
+def get_providers_config():
+    """获取服务商配置，首次调用时读取 providers.json"""
+    global _providers_config
+    if _providers_config is None:
+        _providers_config = ProvidersConfig()
+    return _providers_config
+
 def select_provider():
     """让用户选择服务商"""
+    providers_config = get_providers_config()
     providers = providers_config.list_providers()
     default_provider = providers_config.get_default_provider()
     
@@ -49,6 +66,7 @@ def select_provider():
 
 def select_model(provider_id):
     """让用户选择模型"""
+    providers_config = get_providers_config()
     models = providers_config.get_provider_models(provider_id)
     default_model = providers_config.get_default_model(provider_id)
     
@@ -99,45 +117,86 @@ def initialize_client(provider_id, model_id=None):
         print(f"✗ 服务商 {provider_id} 初始化失败: {e}")
         return False
 
+def _get_encoding(model):
+    """获取模型对应的tiktoken编码器，首次调用时导入tiktoken并缓存"""
+    encoding = _encodings.get(model)
+    if encoding is None:
+        import tiktoken
+        try:
+            # 尝试使用对应的编码器
+            if "qwen" in model.lower():
+                # 通义千问模型使用类似GPT的编码方式
+                encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+            else:
+                encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # 如果模型不支持，使用默认编码器
+            encoding = tiktoken.get_encoding("cl100k_base")
+        _encodings[model] = encoding
+    return encoding
+
 def estimate_tokens(text, model="gpt-3.5-turbo"):
     """
     估算文本的token数量
     """
-    try:
-        # 尝试使用对应的编码器
-        if "qwen" in model.lower():
-            # 通义千问模型使用类似GPT的编码方式
-            encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-        else:
-            encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
-    except:
-        # 如果模型不支持，使用默认编码器
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
-
-def calculate_batch_tokens(block, model="gpt-3.5-turbo"):
+    return len(_get_encoding(model).encode(text))
+
+def configure_prompt(glossary_path=None, cache_hint=None):
+    """
+    设置提示词的固定前缀
+    glossary_path: 规则文件路径，其中的词典作为术语表放进前缀；None 表示不附加术语表
+    cache_hint: 是否在前缀上加 cache_control 标记，None 时读取服务商配置中的 prompt_cache
+    """
+    glossary = ""
+    if glossary_path:
+        translator = RuleTranslator.load(glossary_path)
+        if translator is not None:
+            terms = dict(translator.words)
+            terms.update((" ".join(k), v) for k, v in translator.phrases.items())
+            glossary = build_glossary(terms)
+    if cache_hint is None:
+        cache_hint = bool(selected_client and selected_client.config.get('prompt_cache'))
+    _prompt_options["glossary"] = glossary
+    _prompt_options["cache_hint"] = cache_hint
+    if cache_hint:
+        print("✓ 提示词前缀将带上缓存标记（cache_control）")
+
+def translation_messages(block, cache_hint=None):
+    """按当前提示词选项构造请求消息，cache_hint 为None时使用 configure_prompt 的设置"""
+    if cache_hint is None:
+        cache_hint = _prompt_options["cache_hint"]
+    return build_translation_messages(block, _prompt_options["glossary"], cache_hint)
+
+def prompt_overhead_tokens(model="gpt-3.5-turbo"):
+    """不含任何条目时提示词本身的token数"""
+    return sum(estimate_tokens(m["content"], model) for m in translation_messages([], cache_hint=False))
+
+def average_item_tokens(mapping, model="gpt-3.5-turbo", sample_size=2000):
+    """待翻译条目在请求中平均占用的输入token（抽取前 sample_size 条计算）"""
+    total = count = 0
+    for k, v in mapping.items():
+        if v.get("translation") or not v.get("original"):
+            continue
+        total += estimate_tokens(json.dumps({"id": k, "text": v["original"]}, ensure_ascii=False), model)
+        count += 1
+        if count >= sample_size:
+            break
+    return total / count if count else 0
+
+def calculate_batch_tokens(block, model="gpt-3.5-turbo", estimator=None):
     """
     计算一个批次的token消耗预算
+    estimator: CostEstimator，不传时按每个条目平均生成20个token估算输出
     """
-    items = [{"id": k, "text": v} for k, v in block]
-    user_content = (
-        "请将以下音效条目的text字段从英文翻译为中文，保持同类条目风格一致。\n"
-        "翻译为中文。保证翻译后的中文的每一个词汇用下划线分割，不使用空格。如遇某些无法翻译的词语或缩写，就保留\n"
-        "输出格式：JSON字典，key为id，value为翻译后的中文\n"
-        "示例输入：[{\"id\": \"123\", \"text\": \"WeaponSword_Wooden Hit_JSE\"}]\n"
-        "示例输出：{\"123\": \"武器_剑_木制_击打_JSE\"}\n\n"
-        "请翻译以下条目：\n" +
-        json.dumps(items, ensure_ascii=False)
-    )
-    
-    system_content = "你是专业的音效术语翻译助手，请将英文音效术语翻译为中文。"
+    messages = translation_messages(block, cache_hint=False)
     
     # 计算输入token
-    input_tokens = estimate_tokens(system_content, model) + estimate_tokens(user_content, model)
+    input_tokens = sum(estimate_tokens(m["content"], model) for m in messages)
     
-    # 估算输出token（假设每个条目平均生成20个token）
-    estimated_output_tokens = len(block) * 20
+    # 估算输出token
+    if estimator is None:
+        estimator = CostEstimator()
+    estimated_output_tokens = estimator.estimate_output(input_tokens, len(block))
     
     return {
         "input_tokens": input_tokens,
@@ -151,27 +210,13 @@ def batch_translate_block(block, max_retries=3):
     返回 {id: translation, ...}
     """
     # 构造批量输入
-    items = [{"id": k, "text": v} for k, v in block]
-    user_content = (
-        "请将以下音效条目的text字段从英文翻译为中文，保持同类条目风格一致。\n"
-        "翻译为中文。保证翻译后的中文的每一个词汇用下划线分割，不使用空格。如遇某些无法翻译的词语或缩写，就保留\n"
-        "输出格式：JSON字典，key为id，value为翻译后的中文\n"
-        "示例输入：[{\"id\": \"123\", \"text\": \"WeaponSword_Wooden Hit_JSE\"}]\n"
-        "示例输出：{\"123\": \"武器_剑_木制_击打_JSE\"}\n\n"
-        "请翻译以下条目：\n" +
-        json.dumps(items, ensure_ascii=False)
-    )
-    
-    messages = [
-        {"role": "system", "content": "你是专业的音效术语翻译助手，请将英文音效术语翻译为中文。"},
-        {"role": "user", "content": user_content}
-    ]
+    messages = translation_messages(block)
     
     # 使用选定的客户端
     if selected_client:
         try:
             print(f"  使用API: {selected_client.get_name()}")
-            result = selected_client.call_api(messages, max_retries)
+            result = selected_client.call_api(messages, max_retries, group_size=len(block))
             return result
         except Exception as e:
             print(f"  [错误] API调用失败: {e}")
@@ -179,52 +224,41 @@ def batch_translate_block(block, max_retries=3):
     print("[错误] 没有可用的API客户端，跳过该块。内容：", block)
     return {}
 
-def batch_translate_with_batch_api(groups):
-    """使用批量API进行翻译"""
-    if not selected_client or not selected_client.supports_batch():
-        print("当前客户端不支持批量API，使用常规翻译")
-        return False
-    
-    print(f"\n🚀 使用批量API进行翻译，共{len(groups)}组")
-    
-    # 准备批量请求数据
-    requests_data = []
-    group_mapping = {}  # 用于映射请求ID到分组
-    
-    for i, block in enumerate(groups):
-        items = [{"id": k, "text": v} for k, v in block]
-        user_content = (
-            "请将以下音效条目的text字段从英文翻译为中文，保持同类条目风格一致。\n"
-            "翻译为中文。保证翻译后的中文的每一个词汇用下划线分割，不使用空格。如遇某些无法翻译的词语或缩写，就保留\n"
-            "输出格式：JSON字典，key为id，value为翻译后的中文\n"
-            "示例输入：[{\"id\": \"123\", \"text\": \"WeaponSword_Wooden Hit_JSE\"}]\n"
-            "示例输出：{\"123\": \"武器_剑_木制_击打_JSE\"}\n\n"
-            "请翻译以下条目：\n" +
-            json.dumps(items, ensure_ascii=False)
-        )
-        
-        messages = [
-            {"role": "system", "content": "你是专业的音效术语翻译助手，请将英文音效术语翻译为中文。"},
-            {"role": "user", "content": user_content}
-        ]
+def apply_translations(mapping, result, ids=None):
+    """
+    把一次请求返回的翻译结果写入 mapping，返回更新的条数
+    result: {id: translation} 或 {"result": {id: translation}}
+    ids: 本次请求中的id，不在其中的结果（如模型照抄了示例对话）忽略，避免覆盖其他条目
+    """
+    updated_count = 0
+    if isinstance(result, dict):
+        # 检查是否有 "result" 键（AI可能返回 {"result": {...}} 格式）
+        if "result" in result:
+            translations = result["result"]
+        else:
+            translations = result
         
-        requests_data.append({
-            "messages": messages
-        })
-        group_mapping[f"request-{i}"] = block
-    
-    # 创建批量作业
-    batch_job = selected_client.create_batch_request(requests_data, "SFX Translation Batch")
-    if not batch_job:
-        print("❌ 批量作业创建失败")
-        return False
-    
-    print(f"✓ 批量作业已创建: {batch_job.id}")
-    print("⏳ 等待批量作业完成...")
-    
-    # 等待批量作业完成
+        # 检查translations是否为字典类型
+        if isinstance(translations, dict):
+            for k, v in translations.items():
+                if ids is not None and k not in ids:
+                    print(f"[警告] 条目 {k} 不在本次请求中，忽略")
+                elif k in mapping:
+                    mapping[k]["translation"] = v
+                    updated_count += 1
+                    print(f"  更新翻译: {k} -> {v}")
+                else:
+                    print(f"[警告] 条目 {k} 在mapping中不存在")
+        else:
+            print(f"[错误] 翻译结果不是字典类型: {type(translations)}, 内容: {translations}")
+    else:
+        print(f"[错误] 翻译结果不是字典类型: {result}")
+    return updated_count
+
+def _wait_batch(batch_id, poll_interval=30):
+    """等待批量作业结束，成功完成返回True"""
     while True:
-        batch_status = selected_client.get_batch_status(batch_job.id)
+        batch_status = selected_client.get_batch_status(batch_id)
         if not batch_status:
             print("❌ 获取批量作业状态失败")
             return False
@@ -233,120 +267,552 @@ def batch_translate_with_batch_api(groups):
         
         if batch_status.status == "completed":
             print("✅ 批量作业已完成")
-            break
-        elif batch_status.status == "failed":
+            return True
+        elif batch_status.status in ("failed", "expired"):
             print("❌ 批量作业失败")
             return False
         elif batch_status.status == "cancelled":
             print("❌ 批量作业已取消")
             return False
         
-        time.sleep(30)  # 每30秒检查一次状态
+        time.sleep(poll_interval)
+
+def _apply_batch_record(record, requests, mapping, writer, batch_id):
+    """
+    处理结果文件或错误文件中的一行，返回更新的条数；请求失败或结果无法解析时返回None
+    """
+    custom_id = record.get("custom_id")
+    block = requests.get(custom_id)
+    if block is None:
+        print(f"⚠️  未找到对应的分组: {custom_id}")
+        return 0
+    
+    response = record.get("response") or {}
+    body = response.get("body") or {}
+    status_code = response.get("status_code", 200 if not record.get("error") else None)
+    ok = status_code == 200 and not record.get("error")
+    if selected_client.telemetry is not None:
+        selected_client.telemetry.record(
+            provider=selected_client.provider_id, model=selected_client.model,
+            group_size=len(block), latency=None, retries=0,
+            outcome="ok" if ok else "error",
+            status_code=status_code, error=None if ok else str(record.get("error") or body.get("error"))[:200],
+            batch_id=batch_id, **usage_to_dict(response.get("usage") or body.get("usage"))
+        )
+    if not ok:
+        print(f"⚠️  请求失败: {custom_id}, {record.get('error') or body.get('error')}")
+        return None
     
-    # 获取结果
-    results = selected_client.get_batch_results(batch_job.id)
-    if not results:
-        print("❌ 获取批量作业结果失败")
-        return False
+    choices = response.get("choices") or body.get("choices") or []
+    content = choices[0].get("message", {}).get("content", "") if choices else ""
+    if not content:
+        print(f"⚠️  内容为空: {custom_id}")
+        return None
+    try:
+        translations = json.loads(content)
+    except ValueError as e:
+        print(f"⚠️  结果无法解析: {custom_id}, {e}")
+        return None
     
-    print(f"✓ 成功获取 {len(results)} 个翻译结果")
+    # 解析翻译结果并更新映射，由写入线程稍后写盘
+    with writer.lock:
+        updated_count = apply_translations(mapping, translations, {k for k, _ in block})
+    writer.mark_dirty(updated_count)
+    return updated_count
+
+def batch_translate_with_batch_api(groups, mapping=None, mapping_path=MAPPING_PATH, max_rounds=2, save_interval=5.0):
+    """
+    使用批量API进行翻译
+    mapping: 已载入的映射表，不传时从 mapping_path 读取；结果会写回 mapping_path
+    结果文件按块下载到临时目录后逐行解析、逐行写入 mapping，内存占用与结果数量无关；
+    错误文件中的请求、结果无法解析或缺失的请求收集起来重新提交，最多 max_rounds 轮
+    返回仍未完成的分组列表（全部成功时为空列表）；第一轮作业创建失败时返回None
+    """
+    if not selected_client or not selected_client.supports_batch():
+        print("当前客户端不支持批量API，使用常规翻译")
+        return None
     
-    # 处理结果
-    with open(MAPPING_PATH, "r", encoding="utf-8") as f:
-        mapping = json.load(f)
+    import tempfile
+    if mapping is None:
+        mapping = load_json(mapping_path)
     
     total_updated = 0
-    for result in results:
-        try:
-            custom_id = result.get("custom_id")
-            if custom_id not in group_mapping:
-                print(f"⚠️  未找到对应的分组: {custom_id}")
-                continue
-            
-            response = result.get("response", {})
-            choices = response.get("choices", [])
-            if not choices:
-                print(f"⚠️  结果为空: {custom_id}")
-                continue
+    pending = list(groups)
+    writer = MappingWriter(mapping, mapping_path, interval=save_interval)
+    try:
+        for round_no in range(1, max_rounds + 1):
+            if round_no == 1:
+                print(f"\n🚀 使用批量API进行翻译，共{len(pending)}组")
+            else:
+                print(f"\n🔁 重新提交失败的 {len(pending)} 组（第 {round_no} 轮）")
             
-            content = choices[0].get("message", {}).get("content", "")
-            if not content:
-                print(f"⚠️  内容为空: {custom_id}")
-                continue
+            # 准备批量请求数据（批量API不支持显式缓存标记，但前缀相同仍可命中服务商的隐式缓存）
+            requests = {f"request-{i}": block for i, block in enumerate(pending)}
+            requests_data = ({"messages": translation_messages(block, cache_hint=False)} for block in pending)
             
-            # 解析翻译结果
-            translation_result = json.loads(content)
-            if "result" in translation_result:
-                translations = translation_result["result"]
-            else:
-                translations = translation_result
+            # 创建批量作业（超过服务商限制时拆分为多个作业，内容相同的请求只提交一次）
+            jobs, duplicates = selected_client.create_batch_jobs(requests_data, "SFX Translation Batch")
+            if not jobs:
+                print("❌ 批量作业创建失败")
+                return None if round_no == 1 else pending
             
-            # 更新映射
-            if isinstance(translations, dict):
-                for k, v in translations.items():
-                    if k in mapping:
-                        mapping[k]["translation"] = v
-                        total_updated += 1
-                        print(f"  更新翻译: {k} -> {v}")
-                    else:
-                        print(f"[警告] 条目 {k} 在mapping中不存在")
+            failed = set()
+            seen = set()
+            for batch_job in jobs:
+                print(f"⏳ 等待批量作业 {batch_job.id} 完成...")
+                if not _wait_batch(batch_job.id):
+                    continue  # 该作业的请求都没有结果，下一轮重新提交
+                
+                # 结果文件流式下载到磁盘，逐行解析
+                with tempfile.TemporaryDirectory(prefix="sfx_batch_") as directory:
+                    downloaded = selected_client.download_batch_results(batch_job.id, directory)
+                    if downloaded is None:
+                        print("❌ 获取批量作业结果失败")
+                        continue
+                    _, output_path, error_path = downloaded
+                    for path in (output_path, error_path):
+                        if path is None:
+                            continue
+                        for record in iter_jsonl(path):
+                            custom_id = record.get("custom_id")
+                            seen.add(custom_id)
+                            try:
+                                updated_count = _apply_batch_record(record, requests, mapping, writer, batch_job.id)
+                            except Exception as e:
+                                print(f"❌ 处理结果失败: {custom_id}, {e}")
+                                updated_count = None
+                            if updated_count is None:
+                                failed.add(custom_id)
+                            else:
+                                total_updated += updated_count
             
-        except Exception as e:
-            print(f"❌ 处理结果失败: {e}")
-            continue
-    
-    # 保存结果
-    with open(MAPPING_PATH, "w", encoding="utf-8") as f:
-        json.dump(mapping, f, ensure_ascii=False, indent=2)
-    
-    print(f"✅ 批量翻译完成，共更新 {total_updated} 条翻译")
-    return True
+            # 重复的请求与实际提交的请求结果相同
+            for custom_id, canonical in duplicates.items():
+                if canonical in seen:
+                    seen.add(custom_id)
+                if canonical in failed:
+                    failed.add(custom_id)
+            # 结果和错误文件中都没有出现的请求同样需要重新提交
+            failed |= set(requests) - seen
+            pending = [block for custom_id, block in requests.items() if custom_id in failed]
+            print(f"✓ 本轮处理 {len(seen)} 个结果，失败 {len(pending)} 组")
+            if not pending:
+                break
+    finally:
+        writer.close()
+    
+    if pending:
+        print(f"⚠️  仍有 {len(pending)} 组未能通过批量API完成")
+    print(f"✅ 批量翻译完成，共更新 {total_updated} 条翻译，已保存到 {mapping_path}")
+    return pending
+
+def apply_rules(mapping, rules_path=DEFAULT_RULES_PATH):
+    """用词典和正则规则翻译能完全覆盖的条目（不调用API），返回翻译条数"""
+    translator = RuleTranslator.load(rules_path)
+    if translator is None:
+        return 0
+    count = translator.apply(mapping)
+    if count:
+        print(f"规则预翻译: {count} 条（标记为 source=rules），这些条目不再发送给API")
+    return count
+
+def get_grouped_blocks(mapping, min_group_size=2, max_group_items=100, strategy="detailed", stream=False):
+    """
+    直接调用 group_mapping_blocks.py 的分组函数，避免子进程和临时文件。
+    stream: 返回逐个产出分组的生成器，翻译时边分组边请求，不必等待全部分组完成
+    """
+    if stream:
+        return iter_group_mapping(mapping, strategy, min_group_size=min_group_size, max_group_items=max_group_items)
+    return group_mapping(mapping, strategy, min_group_size=min_group_size, max_group_items=max_group_items)
+
+def count_pending(mapping):
+    """未翻译的条目数（与分组函数的筛选条件相同）"""
+    return sum(1 for v in mapping.values() if not v.get("translation") and v.get("original"))
+
+def format_time(seconds):
+    """格式化时间显示"""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    if hours > 0:
+        return f"{hours}h {minutes}m {secs}s"
+    elif minutes > 0:
+        return f"{minutes}m {secs}s"
+    else:
+        return f"{secs}s"
+
+def choose_client(provider_id=None, model_id=None, interactive=True):
+    """
+    选择服务商和模型（未指定时交互式选择，interactive=False 时使用默认值）并初始化全局客户端
+    返回 provider_id
+    """
+    # 选择服务商
+    if not provider_id:
+        provider_id = select_provider() if interactive else get_providers_config().get_default_provider()
+
+    # 选择模型
+    if not model_id:
+        model_id = select_model(provider_id) if interactive else get_providers_config().get_default_model(provider_id)
+
+    # 初始化API客户端
+    if not initialize_client(provider_id, model_id):
+        print("API客户端初始化失败")
+    return provider_id
+
+def enable_telemetry(metrics_dir=DEFAULT_METRICS_DIR, enabled=True):
+    """为当前客户端开启调用记录"""
+    if selected_client:
+        selected_client.telemetry = Telemetry(metrics_dir, enabled=enabled)
+
+def build_estimator(provider_id, metrics_dir=DEFAULT_METRICS_DIR):
+    """
+    创建费用估算器：单价来自 providers.json，输出token比例从历史调用记录中学习
+    返回 (estimator, pricing, model)
+    """
+    model = selected_client.model if selected_client else "gpt-3.5-turbo"
+    provider_name = selected_client.provider_id if selected_client else provider_id
+    pricing = (selected_client.config.get('pricing') if selected_client else None) or default_pricing(provider_id)
+    estimator = CostEstimator.calibrate(pricing, prompt_overhead_tokens(model), metrics_dir, provider_name, model)
+    print(f"输出token估算: {estimator.describe()}")
+    return estimator, pricing, model
+
+def resolve_group_size(max_group_items, mapping, estimator, model):
+    """max_group_items 为 "auto" 时根据估算器计算每组条数，否则转换为整数"""
+    if max_group_items != "auto":
+        return int(max_group_items)
+    max_output_tokens = selected_client.config.get('max_output_tokens', 4096) if selected_client else 4096
+    item_tokens = average_item_tokens(mapping, model)
+    size = estimator.suggest_group_size(item_tokens, max_output_tokens)
+    print(f"自动分组大小: 每组最多 {size} 条（平均每条输入 {item_tokens:.1f} token，最大输出 {max_output_tokens} token）")
+    # config_manager.py bench 测得的推荐分组大小作为上限
+    benched = selected_client.config.get('group_size') if selected_client else None
+    if benched and benched < size:
+        size = benched
+        print(f"  按压测推荐的分组大小限制为每组 {size} 条")
+    return size
+
+def request_interval():
+    """两次请求之间的最短间隔（秒），按服务商配置的 rate_limit.requests_per_minute 计算，未配置或无效时按15000"""
+    rate_limit = (selected_client.config.get('rate_limit') if selected_client else None) or {}
+    requests_per_minute = rate_limit.get('requests_per_minute') or 0
+    return 60 / (requests_per_minute if requests_per_minute > 0 else 15000)
+
+def print_budget(groups, model, estimator, pricing):
+    """计算并打印token预算和预估费用，返回总计"""
+    total_input_tokens = 0
+    total_estimated_output_tokens = 0
+    total_estimated_tokens = 0
+
+    print("\n=== Token 预算计算 ===")
+    for block in groups:
+        token_info = calculate_batch_tokens(block, model, estimator)
+        total_input_tokens += token_info["input_tokens"]
+        total_estimated_output_tokens += token_info["estimated_output_tokens"]
+        total_estimated_tokens += token_info["total_estimated_tokens"]
+    print("\n=== 总计 ===")
+    print(f"总输入token: {total_input_tokens}")
+    print(f"总预计输出token: {total_estimated_output_tokens}")
+    print(f"总预计token: {total_estimated_tokens}")
+
+    # 按模型的输入/输出单价计算费用
+    estimated_cost = estimator.cost(total_input_tokens, total_estimated_output_tokens)
+    print(f"预估费用 (输入 {pricing.get('input', 0)} 元/千token，输出 {pricing.get('output', 0)} 元/千token): {estimated_cost:.4f} 元")
+    return {
+        "input_tokens": total_input_tokens,
+        "estimated_output_tokens": total_estimated_output_tokens,
+        "total_estimated_tokens": total_estimated_tokens,
+        "estimated_cost": estimated_cost,
+    }
+
+def print_quick_budget(mapping, total, max_group_items, model, estimator, pricing):
+    """
+    流式分组时的快速预算：不生成分组，按抽样的平均条目token和每组 max_group_items 条估算
+    实际分组数更多（小分组、拆分），结果偏低，仅供参考
+    """
+    item_tokens = average_item_tokens(mapping, model)
+    group_count = -(-total // max_group_items) if total else 0
+    input_tokens = int(total * item_tokens + group_count * prompt_overhead_tokens(model))
+    output_tokens = estimator.estimate_output(input_tokens // group_count, max_group_items) * group_count if group_count else 0
+    print("\n=== Token 预算（快速估算）===")
+    print(f"至少 {group_count} 组，平均每条输入 {item_tokens:.1f} token")
+    print(f"总输入token: 约 {input_tokens}")
+    print(f"总预计输出token: 约 {output_tokens}")
+    estimated_cost = estimator.cost(input_tokens, output_tokens)
+    if estimated_cost is not None:
+        print(f"预估费用 (输入 {pricing.get('input', 0)} 元/千token，输出 {pricing.get('output', 0)} 元/千token): 约 {estimated_cost:.4f} 元")
+    return {"input_tokens": input_tokens, "estimated_output_tokens": output_tokens, "estimated_cost": estimated_cost}
+
+def translate_groups(groups, mapping, mapping_path=MAPPING_PATH, save_interval=5.0, total=None, controller=None):
+    """
+    调用API翻译各分组，返回更新的条数
+    groups: 分组列表，或 get_grouped_blocks(stream=True) 返回的生成器（此时需传入 total）
+    total: 待翻译条目总数，用于计算进度和剩余时间
+    controller: AIMDController，决定同时发出的请求数；不传时逐组串行请求
+    mapping 由后台线程合并写盘（最多每 save_interval 秒一次），结束或 Ctrl+C 中断时写出全部已完成的翻译
+    """
+    print("\n开始翻译...")
+    if total is None:
+        total = sum(len(g) for g in groups)
+    group_count = f"/{len(groups)}" if isinstance(groups, list) else ""
+    if controller is None:
+        controller = AIMDController(initial=1, adaptive=False)
+    if selected_client:
+        selected_client.set_controller(controller if controller.adaptive else None)
+
+    # 时间统计变量
+    start_time = time.time()
+    loop_times = []
+    done = 0
+    total_updated = 0
+    writer = MappingWriter(mapping, mapping_path, interval=save_interval)
+
+    def work(block):
+        loop_start_time = time.time()
+        try:
+            return batch_translate_block(block), time.time() - loop_start_time
+        finally:
+            controller.release()
+
+    def finish(i, block, future):
+        """在主线程中写入一个分组的结果并打印进度"""
+        nonlocal done, total_updated
+        result, loop_duration = future.result()
 
-def get_grouped_blocks(mapping, min_group_size=2):
+        # 更新翻译结果到 mapping，由写入线程稍后写盘
+        with writer.lock:
+            updated_count = apply_translations(mapping, result, {k for k, _ in block})
+        writer.mark_dirty(updated_count)
+        total_updated += updated_count
+
+        print(f"  分组 {i} 成功更新 {updated_count} 条翻译")
+        done += len(block)
+        loop_times.append(loop_duration)
+
+        # 计算平均时间和预计时间（按条目数推算，流式分组时总组数未知）
+        avg_time_per_loop = sum(loop_times) / len(loop_times)
+        elapsed_time = time.time() - start_time
+        estimated_remaining_time = elapsed_time / done * max(total - done, 0)
+        estimated_total_time = elapsed_time + estimated_remaining_time
+        progress_percent = (done / total) * 100 if total else 100.0
+
+        print(f"  本次耗时: {format_time(loop_duration)}")
+        print(f"  平均耗时: {format_time(avg_time_per_loop)}")
+        print(f"  已用时间: {format_time(elapsed_time)}")
+        print(f"  预计总时间: {format_time(estimated_total_time)}")
+        print(f"  预计剩余: {format_time(estimated_remaining_time)}")
+        print(f"  进度: {progress_percent:.1f}% ({done}/{total}条)")
+        print(f"已完成: {done}/{total}")
+
+    pool = ThreadPoolExecutor(max_workers=controller.maximum)
+    running = {}
+    try:
+        for i, block in enumerate(groups, 1):
+            # 等待空闲的并发槽位，期间完成的分组先写入结果
+            controller.acquire()
+            for future in [f for f in running if f.done()]:
+                finish(*running.pop(future), future)
+
+            prefix = block[0][1].split('_')[0] if block else ''
+            print(f"正在翻译分组 {i}{group_count}: {prefix}，共{len(block)}条（并发 {controller.in_flight}/{controller.limit}）")
+            running[pool.submit(work, block)] = (i, block)
+            time.sleep(request_interval())  # 防止API限流
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                finish(*running.pop(future), future)
+    except KeyboardInterrupt:
+        print("\n⚠️  翻译已中断，正在保存已完成的翻译...")
+        raise
+    finally:
+        # 中断或出错时不再等待正在进行的请求，但已经返回、还没写入的分组结果先写入 mapping
+        pool.shutdown(wait=False, cancel_futures=True)
+        for future in list(running):
+            if future.done() and not future.cancelled() and future.exception() is None:
+                finish(*running.pop(future), future)
+        writer.close()
+        print(f"  ✓ 已保存到 {mapping_path}（写盘 {writer.flushes} 次，共 {writer.write_seconds:.2f}s）")
+        if controller.adaptive:
+            print(f"  {controller.summary()}")
+
+    total_time = time.time() - start_time
+    print(f"\n🎉 全部批量翻译完成！总耗时: {format_time(total_time)}")
+    return total_updated
+
+def build_controller(concurrency=None, max_concurrency=None, adaptive=True, metrics_dir=DEFAULT_METRICS_DIR):
     """
-    直接import group_mapping_blocks.py的分组函数，避免子进程和临时文件。
+    创建并发控制器
+    concurrency: 初始并发，不传时使用 config_manager.py bench 写入的 concurrency，都没有时为1
+    max_concurrency: 并发上限，不传时为初始并发的2倍（至少8）
+    决策日志写入 metrics_dir/concurrency.jsonl（未启用调用记录时不写）
     """
-    code_path = os.path.join(os.path.dirname(__file__), 'group_mapping_blocks.py')
-    spec = importlib.util.spec_from_file_location("group_mapping_blocks", code_path)
-    group_mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(group_mod)
-    return group_mod.group_by_continuous_prefix(mapping, min_group_size=min_group_size)
+    benched = selected_client.config.get('concurrency') if selected_client else None
+    initial = concurrency or benched or 1
+    maximum = max_concurrency or max(initial * 2, 8)
+    telemetry = selected_client.telemetry if selected_client else None
+    log_path = os.path.join(metrics_dir, CONCURRENCY_LOG_FILE) if telemetry is not None and telemetry.enabled else None
+    mode = "自适应" if adaptive else "固定"
+    print(f"并发控制: {mode}，初始并发 {initial}" + (f"，上限 {maximum}" if adaptive else ""))
+    return AIMDController(initial=initial, maximum=maximum if adaptive else initial, adaptive=adaptive, log_path=log_path)
+
+def finish_telemetry(pricing):
+    """输出本次运行的调用统计（按与预估相同的单价计算实际费用）"""
+    telemetry = selected_client.telemetry if selected_client else None
+    if telemetry is not None:
+        telemetry.print_summary(pricing)
+        prom_path = telemetry.write_prometheus(pricing)
+        if prom_path:
+            print(f"Prometheus指标: {prom_path}")
+        telemetry.close()
+
+def run_translation(groups, mapping, mapping_path=MAPPING_PATH, use_batch=False, save_interval=5.0, total=None,
+                    controller=None):
+    """执行翻译（批量API失败时退回常规翻译）"""
+    if use_batch and selected_client.supports_batch():
+        groups = list(groups)  # 批量API需要一次提交全部请求
+        # 使用批量API，多轮重新提交后仍失败的分组改用常规翻译
+        remaining = batch_translate_with_batch_api(groups, mapping, mapping_path, save_interval=save_interval)
+        if remaining is not None:
+            if remaining:
+                print(f"改用常规翻译剩余的 {len(remaining)} 组")
+                translate_groups(remaining, mapping, mapping_path, save_interval, controller=controller)
+            return
+        print("❌ 批量翻译失败，尝试使用常规翻译")
+
+    # 使用常规翻译
+    translate_groups(groups, mapping, mapping_path, save_interval, total, controller)
+
+def enqueue_groups(queue_path, groups, mapping_path=MAPPING_PATH, lease_seconds=300):
+    """协调进程：把分组写入任务队列，返回写入的任务数"""
+    from work_queue import WorkQueue
+    queue = WorkQueue(queue_path, lease_seconds)
+    stats = queue.stats()
+    if any(stats.values()):
+        print(f"❌ 队列 {queue_path} 中已有任务: {stats}，请先 --collect 或换一个队列文件")
+        queue.close()
+        return 0
+    count = queue.enqueue(({"block": block} for block in groups),
+                          meta={"mapping_path": os.path.abspath(mapping_path), "created": time.time()})
+    queue.close()
+    print(f"✓ 已写入 {count} 个任务到 {queue_path}，启动工作进程: python auto_translate_mapping.py --worker {queue_path}")
+    return count
+
+def run_queue_worker(queue_path, worker_id=None, lease_seconds=300):
+    """工作进程：从队列领取分组并翻译，返回本进程完成的任务数"""
+    from work_queue import WorkQueue, run_worker, default_worker_id
+    worker_id = worker_id or default_worker_id()
+    queue = WorkQueue(queue_path, lease_seconds)
+
+    def handle(payload):
+        block = [tuple(item) for item in payload["block"]]
+        prefix = block[0][1].split('_')[0] if block else ''
+        print(f"[{worker_id}] 正在翻译: {prefix}，共{len(block)}条")
+        result = batch_translate_block(block)
+        if isinstance(result, dict) and isinstance(result.get("result"), dict):
+            result = result["result"]
+        return result
+
+    completed = run_worker(queue, handle, worker_id)
+    print(f"[{worker_id}] 队列已处理完，本进程完成 {completed} 个任务，队列状态: {queue.stats()}")
+    queue.close()
+    return completed
+
+def collect_queue_results(queue_path, mapping_path=MAPPING_PATH):
+    """把队列中已完成任务的结果写回映射表，返回更新的条数"""
+    from work_queue import WorkQueue
+    queue = WorkQueue(queue_path)
+    mapping = load_json(mapping_path)
+    total_updated = 0
+    for _, payload, result in queue.iter_results():
+        total_updated += apply_translations(mapping, result, {item[0] for item in payload["block"]})
+    dump_json(mapping, mapping_path)
+    stats = queue.stats()
+    queue.close()
+    print(f"✅ 已写回 {total_updated} 条翻译，队列状态: {stats}")
+    if stats["pending"] or stats["leased"] or stats["expired"] or stats["failed"]:
+        print("⚠️  队列中仍有未完成或失败的任务")
+    return total_updated
 
 def main():
     parser = argparse.ArgumentParser(description="自动批量翻译 mapping.json 中的 original 字段，分块保证风格统一")
     parser.add_argument("--min-group-size", type=int, default=2, help="分组最小条数，默认2")
+    parser.add_argument("--max-group-items", type=str, default="100",
+                        help="每组最大条数，默认100；auto 表示根据历史输出token比例和模型的最大输出token自动计算")
+    parser.add_argument("--strategy", type=str, default="detailed", choices=STRATEGIES,
+                        help="分组策略，默认detailed；trie 按前缀树分层合并小分组，请求数更少；minhash 按名称相似度聚类")
     parser.add_argument("--dry-run", action="store_true", help="仅计算token预算，不执行翻译")
+    parser.add_argument("--stream", action="store_true",
+                        help="边分组边翻译：不预先生成全部分组，第一组分好即开始请求（token预算改为快速估算）")
     parser.add_argument("--provider", type=str, help="指定服务商，不指定则交互式选择")
     parser.add_argument("--model", type=str, help="指定模型，不指定则交互式选择")
     parser.add_argument("--batch", action="store_true", help="使用批量API进行翻译（仅支持通义千问）")
+    parser.add_argument("--metrics-dir", type=str, default=DEFAULT_METRICS_DIR, help="API调用记录的输出目录，默认 json/metrics")
+    parser.add_argument("--no-metrics", action="store_true", help="不写出API调用记录（仍在结束时打印统计）")
+    parser.add_argument("--rules", type=str, default=DEFAULT_RULES_PATH, help="规则预翻译的词典文件，默认 config/translation_rules.json")
+    parser.add_argument("--no-rules", action="store_true", help="不使用规则预翻译，全部条目交给API")
+    parser.add_argument("--save-interval", type=float, default=5.0,
+                        help="翻译过程中后台保存 mapping.json 的最短间隔（秒），默认5；结束或中断时总会保存")
+    parser.add_argument("--concurrency", type=int, help="初始并发请求数，默认使用 config_manager.py bench 的推荐值，没有时为1")
+    parser.add_argument("--max-concurrency", type=int, help="自适应并发的上限，默认为初始并发的2倍（至少8）")
+    parser.add_argument("--no-adaptive", action="store_true", help="固定并发，不根据429/5xx和延迟自动调整")
+    parser.add_argument("--glossary", action="store_true", help="把规则文件中的词典作为术语表放进提示词的固定前缀")
+    parser.add_argument("--prompt-cache", action="store_true",
+                        help="在提示词前缀上加 cache_control 缓存标记（服务商配置 prompt_cache 为 true 时默认开启）")
+    parser.add_argument("--coordinator", type=str, metavar="QUEUE", help="分组后写入任务队列文件（SQLite）并退出，由 --worker 进程翻译")
+    parser.add_argument("--worker", type=str, metavar="QUEUE", help="作为工作进程从任务队列领取分组翻译，可同时运行多个")
+    parser.add_argument("--collect", type=str, metavar="QUEUE", help="把任务队列中已完成的翻译写回 mapping.json")
+    parser.add_argument("--worker-id", type=str, help="工作进程名称，默认为 主机名-进程号")
+    parser.add_argument("--lease-seconds", type=int, default=300, help="任务租约时长（秒），超时未续约的任务由其他工作进程接手，默认300")
     args = parser.parse_args()
-    
-    min_group_size = args.min_group_size
-    
-    # 选择服务商
-    if args.provider:
-        provider_id = args.provider
-    else:
-        provider_id = select_provider()
-    
-    # 选择模型
-    if args.model:
-        model_id = args.model
+
+    # 加载.env配置
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+    if args.max_group_items != "auto" and not args.max_group_items.isdigit():
+        parser.error("--max-group-items 必须是正整数或 auto")
+
+    # 分布式模式：--coordinator 分组入队，--worker 领取翻译，--collect 写回结果
+    if args.collect:
+        collect_queue_results(args.collect, MAPPING_PATH)
+        return
+    if args.worker:
+        provider_id = choose_client(args.provider, args.model, interactive=False)
+        enable_telemetry(args.metrics_dir, enabled=not args.no_metrics)
+        configure_prompt(args.rules if args.glossary else None, True if args.prompt_cache else None)
+        run_queue_worker(args.worker, args.worker_id, args.lease_seconds)
+        finish_telemetry((selected_client.config.get('pricing') if selected_client else None) or default_pricing(provider_id))
+        return
+    if args.coordinator and args.max_group_items != "auto":
+        # 固定分组大小时协调进程不需要API客户端
+        mapping = load_json(MAPPING_PATH)
+        if not args.no_rules and apply_rules(mapping, args.rules):
+            dump_json(mapping, MAPPING_PATH)
+        groups = get_grouped_blocks(mapping, args.min_group_size, int(args.max_group_items), args.strategy)
+        enqueue_groups(args.coordinator, groups, MAPPING_PATH, args.lease_seconds)
+        return
+
+    provider_id = choose_client(args.provider, args.model)
+    if not args.dry_run:
+        enable_telemetry(args.metrics_dir, enabled=not args.no_metrics)
+    configure_prompt(args.rules if args.glossary else None, True if args.prompt_cache else None)
+
+    mapping = load_json(MAPPING_PATH)
+    if not args.no_rules and apply_rules(mapping, args.rules) and not args.dry_run:
+        dump_json(mapping, MAPPING_PATH)
+    estimator, pricing, model = build_estimator(provider_id, args.metrics_dir)
+    max_group_items = resolve_group_size(args.max_group_items, mapping, estimator, model)
+
+    # 调用 group_mapping_blocks.py 生成分组（--stream 时为生成器，翻译过程中逐组生成）
+    stream = args.stream and not args.coordinator
+    groups = get_grouped_blocks(mapping, min_group_size=args.min_group_size, max_group_items=max_group_items,
+                                strategy=args.strategy, stream=stream)
+    if stream:
+        total = count_pending(mapping)
+        print(f"待翻译条目数: {total}，边分组边翻译")
     else:
-        model_id = select_model(provider_id)
-    
-    # 初始化API客户端
-    if not initialize_client(provider_id, model_id):
-        print("API客户端初始化失败")
-    
-    with open(MAPPING_PATH, "r", encoding="utf-8") as f:
-        mapping = json.load(f)
-    
-    # 调用 group_mapping_blocks.py 生成分组
-    groups = get_grouped_blocks(mapping, min_group_size=min_group_size)
-    total = sum(len(g) for g in groups)
-    print(f"待翻译条目数: {total}, 分为 {len(groups)} 组")
-    
+        total = sum(len(g) for g in groups)
+        print(f"待翻译条目数: {total}, 分为 {len(groups)} 组")
+
     # 检查是否支持批量API
     if args.batch:
         if selected_client.supports_batch():
@@ -354,140 +820,34 @@ def main():
         else:
             print("❌ 当前客户端不支持批量API，将使用常规翻译")
             args.batch = False
-    
+
     # 计算token预算
-    total_input_tokens = 0
-    total_estimated_output_tokens = 0
-    total_estimated_tokens = 0
-    
-    print("\n=== Token 预算计算 ===")
-    model = selected_client.model if selected_client else "gpt-3.5-turbo"
-    for i, block in enumerate(groups, 1):
-        prefix = block[0][1].split('_')[0] if block else ''
-        token_info = calculate_batch_tokens(block, model)
-        total_input_tokens += token_info["input_tokens"]
-        total_estimated_output_tokens += token_info["estimated_output_tokens"]
-        total_estimated_tokens += token_info["total_estimated_tokens"]    
-    print(f"\n=== 总计 ===")
-    print(f"总输入token: {total_input_tokens}")
-    print(f"总预计输出token: {total_estimated_output_tokens}")
-    print(f"总预计token: {total_estimated_tokens}")
-    
-    # 根据服务商调整费用计算
-    if "dashscope" in provider_id.lower():
-        # 通义千问定价（参考当前定价）
-        cost_per_1k_tokens = 0.004
-        print(f"预估费用 (通义千问，以1000token={cost_per_1k_tokens}元计算): {total_estimated_tokens * cost_per_1k_tokens / 1000:.4f} 元")
+    if stream:
+        print_quick_budget(mapping, total, max_group_items, model, estimator, pricing)
     else:
-        # 其他服务商
-        cost_per_1k_tokens = 0.002
-        print(f"预估费用 (以1000token={cost_per_1k_tokens}元计算): {total_estimated_tokens * cost_per_1k_tokens / 1000:.4f} 元")
-    
+        print_budget(groups, model, estimator, pricing)
+
+    if args.coordinator:
+        enqueue_groups(args.coordinator, groups, MAPPING_PATH, args.lease_seconds)
+        return
+
     if args.dry_run:
         print("\n--dry-run 模式，不执行翻译")
         return
-    
+
     # 询问用户是否继续
     if args.batch:
         print("\n💡 将使用批量API进行翻译，可能需要等待较长时间")
-    
-    confirm = input(f"\n是否继续执行翻译？(y/N): ").strip().lower()
+
+    confirm = input("\n是否继续执行翻译？(y/N): ").strip().lower()
     if confirm != 'y':
         print("已取消翻译")
         return
-    
-    # 选择翻译方式
-    if args.batch and selected_client.supports_batch():
-        # 使用批量API
-        success = batch_translate_with_batch_api(groups)
-        if not success:
-            print("❌ 批量翻译失败，尝试使用常规翻译")
-            args.batch = False
-    
-    if not args.batch:
-        # 使用常规翻译
-        print("\n开始翻译...")
-        
-        # 时间统计变量
-        start_time = time.time()
-        loop_times = []
-        done = 0
-        1
-        for i, block in enumerate(groups, 1):
-            loop_start_time = time.time()
-            
-            prefix = block[0][1].split('_')[0] if block else ''
-            print(f"正在翻译分组 {i}/{len(groups)}: {prefix}，共{len(block)}条")
-            
-            result = batch_translate_block(block)
-            
-            # 更新翻译结果到 mapping
-            updated_count = 0
-            if isinstance(result, dict):
-                # 检查是否有 "result" 键（AI可能返回 {"result": {...}} 格式）
-                if "result" in result:
-                    translations = result["result"]
-                else:
-                    translations = result
-                
-                # 检查translations是否为字典类型
-                if isinstance(translations, dict):
-                    for k, v in translations.items():
-                        if k in mapping:
-                            mapping[k]["translation"] = v
-                            updated_count += 1
-                            print(f"  更新翻译: {k} -> {v}")
-                        else:
-                            print(f"[警告] 条目 {k} 在mapping中不存在")
-                else:
-                    print(f"[错误] 翻译结果不是字典类型: {type(translations)}, 内容: {translations}")
-            else:
-                print(f"[错误] 翻译结果不是字典类型: {result}")
-            
-            print(f"  成功更新 {updated_count} 条翻译")
-            done += len(block)
-            
-            # 计算时间统计
-            loop_end_time = time.time()
-            loop_duration = loop_end_time - loop_start_time
-            loop_times.append(loop_duration)
-            
-            # 计算平均时间和预计时间
-            avg_time_per_loop = sum(loop_times) / len(loop_times)
-            elapsed_time = time.time() - start_time
-            remaining_loops = len(groups) - i
-            estimated_remaining_time = remaining_loops * avg_time_per_loop
-            estimated_total_time = elapsed_time + estimated_remaining_time
-            progress_percent = (i / len(groups)) * 100
-            
-            # 格式化时间显示
-            def format_time(seconds):
-                hours = int(seconds // 3600)
-                minutes = int((seconds % 3600) // 60)
-                secs = int(seconds % 60)
-                if hours > 0:
-                    return f"{hours}h {minutes}m {secs}s"
-                elif minutes > 0:
-                    return f"{minutes}m {secs}s"
-                else:
-                    return f"{secs}s"
-            
-            print(f"  本次耗时: {format_time(loop_duration)}")
-            print(f"  平均耗时: {format_time(avg_time_per_loop)}")
-            print(f"  已用时间: {format_time(elapsed_time)}")
-            print(f"  预计总时间: {format_time(estimated_total_time)}")
-            print(f"  预计剩余: {format_time(estimated_remaining_time)}")
-            print(f"  进度: {progress_percent:.1f}% ({done}/{total}条)")
-            
-            # 立即保存到文件
-            with open(MAPPING_PATH, "w", encoding="utf-8") as f:
-                json.dump(mapping, f, ensure_ascii=False, indent=2)
-            print(f"已完成: {done}/{total}")
-            time.sleep(60/15000)  # 防止API限流
-            print("  ✓ 已保存进度")
-        
-        total_time = time.time() - start_time
-        print(f"\n🎉 全部批量翻译完成！总耗时: {format_time(total_time)}")
+
+    controller = build_controller(args.concurrency, args.max_concurrency, not args.no_adaptive, args.metrics_dir)
+    run_translation(groups, mapping, MAPPING_PATH, use_batch=args.batch, save_interval=args.save_interval, total=total,
+                    controller=controller)
+    finish_telemetry(pricing)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
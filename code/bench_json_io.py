@@ -0,0 +1,71 @@
+"""
+JSON读写性能测试
+生成指定条目数的 mapping，对比标准库 json 与 json_io（orjson，如已安装）的读写耗时
+"""
+
+import os
+import json
+import time
+import argparse
+import tempfile
+import json_io
+
+
+def make_mapping(count):
+    """生成与真实 mapping.json 结构相同的测试数据"""
+    return {
+        str(i): {
+            "original": f"WEAPSwrd_Weapon {i % 100:02d} Unequip_JSE_MW",
+            "translation": f"武器_剑_武器_{i % 100:02d}_卸下_JSE_MW" if i % 2 else "",
+        }
+        for i in range(1, count + 1)
+    }
+
+
+def best_of(func, repeat):
+    """多次运行取最短耗时"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON读写性能测试")
+    parser.add_argument('--entries', type=int, default=100000, help='mapping条目数，默认100000')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最短耗时，默认3')
+    args = parser.parse_args()
+
+    mapping = make_mapping(args.entries)
+    codec = "orjson" if json_io.orjson is not None else "json（未安装orjson）"
+    print(f"=== JSON读写性能测试：{args.entries} 条，json_io 使用 {codec} ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "mapping.json")
+
+        def stdlib_dump():
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(mapping, f, ensure_ascii=False, indent=2)
+
+        def stdlib_load():
+            with open(path, "r", encoding="utf-8") as f:
+                json.load(f)
+
+        rows = [("json.dump (indent=2, 原地写入)", best_of(stdlib_dump, args.repeat))]
+        rows.append(("json.load", best_of(stdlib_load, args.repeat)))
+        for pretty in (True, False):
+            label = "缩进" if pretty else "紧凑"
+            rows.append((f"json_io.dump_json ({label}, 原子写入)",
+                         best_of(lambda: json_io.dump_json(mapping, path, pretty=pretty), args.repeat)))
+            size = os.path.getsize(path)
+            rows.append((f"json_io.load_json ({label}, {size / 1024 / 1024:.1f} MB)",
+                         best_of(lambda: json_io.load_json(path), args.repeat)))
+
+    for label, seconds in rows:
+        print(f"{label:<40} {seconds * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+启动耗时测试
+在独立进程中多次导入各脚本（或运行 --help），统计相对于空解释器的额外启动耗时，
+并检查导入时是否加载了 openai / tiktoken 等较重的依赖，用于防止启动变慢
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+import time
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 只应在真正调用API或估算token时才导入的包
+HEAVY_MODULES = ["openai", "tiktoken", "requests", "httpx", "pydantic"]
+
+# (名称, python参数)
+TARGETS = [
+    ("import api_clients", ["-c", "import api_clients"]),
+    ("import auto_translate_mapping", ["-c", "import auto_translate_mapping"]),
+    ("import config_manager", ["-c", "import config_manager"]),
+    ("import generate_sfx_json", ["-c", "import generate_sfx_json"]),
+    ("import group_mapping_blocks", ["-c", "import group_mapping_blocks"]),
+    ("import rename_by_map", ["-c", "import rename_by_map"]),
+    ("import restore_and_regenerate_mapping", ["-c", "import restore_and_regenerate_mapping"]),
+    ("import create_placeholders", ["-c", "import create_placeholders"]),
+    ("auto_translate_mapping.py --help", ["auto_translate_mapping.py", "--help"]),
+    ("group_mapping_blocks.py --help", ["group_mapping_blocks.py", "--help"]),
+    ("config_manager.py --help", ["config_manager.py", "--help"]),
+]
+
+
+def time_command(python_args, runs):
+    """返回多次运行的耗时中位数（秒）"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + python_args, cwd=CODE_DIR,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def loaded_heavy_modules(module):
+    """导入 module 后返回已加载的重量级依赖"""
+    check = (f"import sys, {module}; "
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", check], cwd=CODE_DIR, capture_output=True, text=True)
+    return [m for m in result.stdout.strip().split(',') if m]
+
+
+def slowest_imports(module, top=5):
+    """用 -X importtime 找出导入 module 时耗时最多的直接依赖，返回 [(毫秒, 模块名)]"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=CODE_DIR, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time:   self [us] | cumulative | imported package"
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2][1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, int(parts[1]) / 1000, name.strip()))
+    # 输出按后序排列：子模块在父模块之前，向前查找 module 的直接子模块
+    entries = []
+    for i, (depth, _, name) in enumerate(rows):
+        if depth == 0 and name == module:
+            for child_depth, ms, child in reversed(rows[:i]):
+                if child_depth == 0:
+                    break
+                if child_depth == 1:
+                    entries.append((ms, child))
+            break
+    entries.sort(reverse=True)
+    return entries[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="测量各脚本的启动耗时")
+    parser.add_argument('--runs', type=int, default=7, help='每项运行次数（取中位数），默认7')
+    parser.add_argument('--budget-ms', type=float, default=75, help='相对空解释器允许的额外耗时（毫秒），默认75')
+    parser.add_argument('--fail-on-regression', action='store_true', help='超出预算或导入了重量级依赖时以非零状态码退出')
+    args = parser.parse_args()
+
+    baseline = time_command(["-c", "pass"], args.runs)
+    print(f"空解释器启动: {baseline * 1000:.1f}ms（以下为额外耗时）\n")
+    print(f"{'目标':<40} {'额外耗时':>10}  重量级依赖")
+
+    failures = []
+    for name, python_args in TARGETS:
+        extra = time_command(python_args, args.runs) - baseline
+        heavy = []
+        if python_args[0] == "-c":
+            heavy = loaded_heavy_modules(python_args[1].split()[-1])
+        mark = ""
+        if extra * 1000 > args.budget_ms or heavy:
+            mark = " ⚠️"
+            failures.append((name, python_args))
+        print(f"{name:<40} {extra * 1000:>8.1f}ms  {','.join(heavy) or '-'}{mark}")
+
+    if failures:
+        print(f"\n{len(failures)} 项超出预算（{args.budget_ms:.0f}ms）或导入了重量级依赖")
+        for name, python_args in failures:
+            if python_args[0] != "-c":
+                continue
+            module = python_args[1].split()[-1]
+            slowest = ", ".join(f"{mod} {ms:.1f}ms" for ms, mod in slowest_imports(module))
+            print(f"  {module}: {slowest}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
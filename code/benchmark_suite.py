@@ -0,0 +1,207 @@
+"""
+端到端性能测试
+用合成音效库在不同规模下测量扫描、分组、token估算、重命名和恢复的耗时，
+结果追加写入JSONL文件，并与上一次相同规模的结果对比，用于发现性能回退
+"""
+
+import os
+import io
+import sys
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from contextlib import redirect_stdout
+from json_io import dumps_json, loads_json, load_json
+from json_stream import iter_mapping
+import synthetic_library
+
+DEFAULT_RESULTS = os.path.join(os.path.dirname(__file__), '..', 'json', 'benchmarks.jsonl')
+
+STAGES = ["scan", "group", "tokens", "rename", "restore"]
+
+
+class StageSkipped(Exception):
+    """当前环境无法运行该阶段（例如缺少依赖）"""
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _quiet(func, *args):
+    """运行函数并丢弃其打印输出（各脚本会逐条打印日志）"""
+    with redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+def stage_scan(ctx):
+    import generate_sfx_json
+    tree = generate_sfx_json.scan_folder(ctx["library"])
+    mapping = {}
+    generate_sfx_json.build_mapping(tree, mapping)
+    return len(mapping)
+
+
+def stage_group(ctx):
+    from group_mapping_blocks import group_by_continuous_prefix
+    mapping = load_json(ctx["mapping"])
+    ctx["groups"] = group_by_continuous_prefix(mapping)
+    return sum(len(g) for g in ctx["groups"])
+
+
+def stage_tokens(ctx):
+    try:
+        from auto_translate_mapping import calculate_batch_tokens
+        calculate_batch_tokens([("0", "warmup")])  # 首次调用会加载编码表，不计入耗时
+    except Exception as e:
+        raise StageSkipped(f"无法估算token: {e}")
+    groups = ctx.get("groups")
+    if groups is None:
+        from group_mapping_blocks import group_by_continuous_prefix
+        groups = group_by_continuous_prefix(load_json(ctx["mapping"]))
+    start = time.perf_counter()
+    for block in groups:
+        calculate_batch_tokens(block)
+    ctx["tokens_seconds"] = time.perf_counter() - start
+    return sum(len(g) for g in groups)
+
+
+def stage_rename(ctx):
+    from rename_by_map import rename_files
+    return _quiet(rename_files, ctx["library"], ctx["structure"], ctx["translated_mapping"])
+
+
+def stage_restore(ctx):
+    from structure_index import StructureIndex
+    from restore_and_regenerate_mapping import restore_files
+    index = StructureIndex.load(ctx["structure"])
+    mapping = {file_id: {"original": original, "translation": translation}
+               for file_id, original, translation in iter_mapping(ctx["translated_mapping"])}
+    return _quiet(restore_files, ctx["library"], index, mapping)
+
+
+STAGE_FUNCS = {
+    "scan": stage_scan,
+    "group": stage_group,
+    "tokens": stage_tokens,
+    "rename": stage_rename,
+    "restore": stage_restore,
+}
+
+
+def prepare(workdir, size, args):
+    """生成音效库和两份mapping（未翻译 / 全部已翻译）"""
+    library = os.path.join(workdir, "library")
+    json_dir = os.path.join(workdir, "json")
+    translated_dir = os.path.join(workdir, "json_translated")
+
+    def files():
+        return synthetic_library.iter_synthetic_files(size, args.depth, args.fanout, args.seed)
+
+    synthetic_library.write_library(library, files(), args.sparse_size, args.seed)
+    synthetic_library.write_json(json_dir, files(), 0.0, args.seed)
+    synthetic_library.write_json(translated_dir, files(), 1.0, args.seed)
+    return {
+        "library": library,
+        "structure": os.path.join(json_dir, "structure.json"),
+        "mapping": os.path.join(json_dir, "mapping.json"),
+        "translated_mapping": os.path.join(translated_dir, "mapping.json"),
+    }
+
+
+def load_previous(path):
+    """读取历史结果，返回 {(size, stage): 最近一条记录}"""
+    previous = {}
+    if not os.path.exists(path):
+        return previous
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = loads_json(line)
+                previous[(record["size"], record["stage"])] = record
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用合成音效库测量各阶段耗时")
+    parser.add_argument('--sizes', type=str, default='1000,10000,100000',
+                        help='逗号分隔的文件数量，默认 1000,10000,100000（可加上1000000）')
+    parser.add_argument('--stages', type=str, default=','.join(STAGES), help=f"要运行的阶段，默认 {','.join(STAGES)}")
+    parser.add_argument('--depth', type=int, default=3, help='合成音效库的目录深度，默认3')
+    parser.add_argument('--fanout', type=int, default=6, help='合成音效库每级目录的子目录数，默认6')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，默认0')
+    parser.add_argument('--sparse-size', action='store_true', help='按真实大小创建稀疏文件')
+    parser.add_argument('--workdir', type=str, help='临时文件所在目录，默认使用系统临时目录')
+    parser.add_argument('--results', type=str, default=DEFAULT_RESULTS, help='结果文件（JSONL，追加写入）')
+    parser.add_argument('--threshold', type=float, default=0.2, help='比上次慢超过该比例视为回退，默认0.2')
+    parser.add_argument('--fail-on-regression', action='store_true', help='发现回退时以非零状态码退出')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = [s for s in stages if s not in STAGE_FUNCS]
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(unknown)}")
+
+    previous = load_previous(args.results)
+    run_info = {
+        "timestamp": datetime.now().isoformat(timespec='seconds'),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    records = []
+    regressions = []
+
+    print(f"{'规模':>9} {'阶段':<8} {'耗时':>10} {'条/秒':>12}  对比上次")
+    for size in sizes:
+        with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+            ctx = prepare(workdir, size, args)
+            for stage in stages:
+                start = time.perf_counter()
+                try:
+                    count = STAGE_FUNCS[stage](ctx)
+                except StageSkipped as e:
+                    print(f"{size:>9} {stage:<8} {'跳过':>10}  {e}")
+                    continue
+                seconds = time.perf_counter() - start
+                # token阶段只统计估算本身，不含加载编码表的时间
+                seconds = ctx.pop("tokens_seconds", seconds)
+                record = dict(run_info, size=size, stage=stage, seconds=round(seconds, 6), items=count)
+                records.append(record)
+
+                compare = ""
+                last = previous.get((size, stage))
+                if last and last.get("seconds"):
+                    change = seconds / last["seconds"] - 1
+                    compare = f"{change:+.1%}"
+                    if change > args.threshold:
+                        compare += " ⚠️ 回退"
+                        regressions.append((size, stage, change))
+                rate = count / seconds if seconds > 0 else 0
+                print(f"{size:>9} {stage:<8} {seconds * 1000:>8.1f}ms {rate:>12.0f}  {compare}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, 'ab') as f:
+        for record in records:
+            f.write(dumps_json(record, pretty=False) + b'\n')
+    print(f"\n结果已追加到 {args.results}")
+
+    if regressions:
+        print(f"发现 {len(regressions)} 项性能回退（阈值 {args.threshold:.0%}）")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+自适应并发控制（AIMD）
+翻译循环同时发出的请求数由控制器决定：请求持续成功且延迟平稳时每轮加1（加性增），
+遇到429/5xx或延迟突增时减半（乘性减）。服务商的承载能力随时段变化，固定并发要么太保守、要么引发大量限流。
+每次调整都会打印，并可追加写入 JSON Lines 日志
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from json_io import dumps_json
+from telemetry import classify_error
+
+# 触发减半的错误类型（见 telemetry.classify_error）
+BACKOFF_OUTCOMES = ("rate_limited", "server_error")
+
+CONCURRENCY_LOG_FILE = "concurrency.jsonl"
+
+
+class AIMDController:
+    """
+    acquire()/release() 限制同时进行的请求数，observe() 接收每次请求尝试的结果并调整上限
+    initial / minimum / maximum: 初始、最小、最大并发
+    decrease: 乘性减的系数
+    latency_factor: 归一化延迟超过基线的该倍数时视为延迟突增
+    adaptive: 为False时并发固定为 initial，只统计不调整
+    """
+
+    def __init__(self, initial=1, minimum=1, maximum=8, decrease=0.5, latency_factor=3.0,
+                 adaptive=True, log_path=None, verbose=True):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.adaptive = adaptive
+        self.log_path = log_path
+        self.verbose = verbose
+        self.in_flight = 0
+        self.decisions = []
+        self._cond = threading.Condition()
+        self._successes = 0  # 上次调整后连续成功的次数
+        self._baseline = None  # 成功请求归一化延迟的指数移动平均
+        self._latency = None  # 成功请求延迟的指数移动平均（秒）
+        self._samples = 0
+        self._last_decrease = 0.0
+
+    # ---- 并发槽位 ----
+
+    def acquire(self):
+        """等待直到同时进行的请求数低于当前上限"""
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    # ---- 调整 ----
+
+    @staticmethod
+    def _normalize(latency, group_size):
+        """按分组条数粗略归一化延迟（固定开销约相当于10个条目），使大小不同的分组可以比较"""
+        return latency / (10 + (group_size or 0))
+
+    def observe(self, latency, group_size=None, error=None):
+        """记录一次请求尝试（含重试中的每一次）：error 为None表示成功"""
+        if not self.adaptive:
+            return
+        with self._cond:
+            now = time.monotonic()
+            if error is not None:
+                outcome, status_code = classify_error(error)
+                if outcome in BACKOFF_OUTCOMES:
+                    self._backoff(now, f"{outcome} ({status_code})" if status_code else outcome)
+                return
+
+            cost = self._normalize(latency, group_size)
+            if self._baseline is not None and self._samples >= 5 and cost > self._baseline * self.latency_factor:
+                self._backoff(now, f"延迟突增 {latency:.2f}s")
+                return
+            # 突增的样本不计入基线，避免基线被拉高后失去灵敏度
+            self._baseline = cost if self._baseline is None else self._baseline * 0.9 + cost * 0.1
+            self._latency = latency if self._latency is None else self._latency * 0.9 + latency * 0.1
+            self._samples += 1
+
+            # 当前上限下又成功完成了一整轮请求时加1
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self._change(self.limit + 1, "一轮请求全部成功")
+
+    def _backoff(self, now, reason):
+        # 一次限流通常同时影响已经发出的多个请求，距上次减半不足一个请求的时间时只减一次
+        cooldown = max(1.0, self._latency or 0)
+        self._successes = 0
+        if now - self._last_decrease < cooldown or self.limit <= self.minimum:
+            return
+        self._last_decrease = now
+        self._change(max(self.minimum, int(self.limit * self.decrease)), reason)
+
+    def _change(self, new_limit, reason):
+        old, self.limit = self.limit, new_limit
+        self._successes = 0
+        decision = {
+            "timestamp": datetime.now().isoformat(timespec='milliseconds'),
+            "from": old, "to": new_limit, "reason": reason, "in_flight": self.in_flight,
+        }
+        self.decisions.append(decision)
+        if self.verbose:
+            print(f"  [并发控制] {old} → {new_limit}：{reason}")
+        if self.log_path:
+            try:
+                os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+                with open(self.log_path, 'ab') as f:
+                    f.write(dumps_json(decision, pretty=False) + b'\n')
+            except OSError as e:
+                print(f"[警告] 写入并发控制日志失败: {e}")
+        self._cond.notify_all()
+
+    def summary(self):
+        increases = sum(1 for d in self.decisions if d["to"] > d["from"])
+        return (f"并发控制: 最终并发 {self.limit}（范围 {self.minimum}-{self.maximum}），"
+                f"提高 {increases} 次，降低 {len(self.decisions) - increases} 次")
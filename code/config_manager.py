@@ -4,9 +4,10 @@
 """
 
 import os
-import json
+import time
 import argparse
 from api_clients import ProvidersConfig
+from json_io import dump_json
 
 def list_providers():
     """列出所有服务商"""
@@ -52,6 +53,9 @@ def show_provider_config(provider_id):
                 print(f"  {i}. {model_name}{default_mark}")
                 if model_desc:
                     print(f"     {model_desc}")
+                pricing = model.get('pricing')
+                if pricing:
+                    print(f"     单价: 输入 {pricing.get('input', 0)} 元/千token，输出 {pricing.get('output', 0)} 元/千token")
         
     except ValueError as e:
         print(f"错误: {e}")
@@ -91,8 +95,7 @@ def set_default_provider(provider_id):
         
         # 更新配置文件
         config.config['default_provider'] = provider_id
-        with open(config.config_file, 'w', encoding='utf-8') as f:
-            json.dump(config.config, f, ensure_ascii=False, indent=2)
+        dump_json(config.config, config.config_file, pretty=True)
         
         print(f"✓ 默认服务商已设置为: {provider_id}")
     except ValueError as e:
@@ -112,8 +115,7 @@ def set_default_model(provider_id, model_id):
         
         # 更新配置文件
         config.config['providers'][provider_id]['default_model'] = model_id
-        with open(config.config_file, 'w', encoding='utf-8') as f:
-            json.dump(config.config, f, ensure_ascii=False, indent=2)
+        dump_json(config.config, config.config_file, pretty=True)
         
         print(f"✓ 服务商 {provider_id} 的默认模型已设置为: {model_id}")
         
@@ -142,8 +144,7 @@ def add_provider(provider_id, name, api_url, api_key, default_model, client_type
     config.config['providers'][provider_id] = new_provider
     
     # 保存配置
-    with open(config.config_file, 'w', encoding='utf-8') as f:
-        json.dump(config.config, f, ensure_ascii=False, indent=2)
+    dump_json(config.config, config.config_file, pretty=True)
     
     print(f"✓ 服务商 {provider_id} 已添加")
 
@@ -164,8 +165,7 @@ def remove_provider(provider_id):
     del config.config['providers'][provider_id]
     
     # 保存配置
-    with open(config.config_file, 'w', encoding='utf-8') as f:
-        json.dump(config.config, f, ensure_ascii=False, indent=2)
+    dump_json(config.config, config.config_file, pretty=True)
     
     print(f"✓ 服务商 {provider_id} 已删除")
 
@@ -190,6 +190,174 @@ def test_provider(provider_id, model_id=None):
     except Exception as e:
         print(f"✗ 测试失败: {e}")
 
+# bench 命令的默认测试档位
+BENCH_CONCURRENCY = [1, 2, 4, 8, 16]
+BENCH_GROUP_SIZES = [10, 25, 50]
+
+# 判定一个档位"健康"的阈值
+BENCH_MAX_ERROR_RATE = 0.05
+BENCH_MIN_VALID_RATE = 0.9
+# p95 延迟超过同一分组大小下单并发 p50 的该倍数时视为排队或被限流
+BENCH_MAX_LATENCY_FACTOR = 3
+# 吞吐量提升不足该比例时不再提高并发
+BENCH_MIN_GAIN = 0.1
+# 写入的速率限制为实测最大健康吞吐量的该比例
+BENCH_RATE_LIMIT_FACTOR = 0.8
+
+def _bench_workload(requests, group_size):
+    """用合成音效名按顺序切出 requests 个恰好 group_size 条的分组（相邻名称通常前缀相同，与实际分组相近）"""
+    import synthetic_library
+    names = synthetic_library.iter_synthetic_files(requests * group_size, depth=2, fanout=6)
+    items = [(str(i), filename.rsplit('.', 1)[0]) for i, (_, filename) in enumerate(names, 1)]
+    return [items[i:i + group_size] for i in range(0, len(items), group_size)]
+
+def _bench_step(client, groups, concurrency, max_retries):
+    """以 concurrency 并发发送 groups，返回该档位的统计"""
+    from load_test import run_load
+    from telemetry import Telemetry, percentile
+    
+    client.telemetry = Telemetry(enabled=False)
+    start = time.perf_counter()
+    results = run_load(client, groups, concurrency, max_retries)
+    elapsed = max(time.perf_counter() - start, 1e-6)
+    records = client.telemetry.records
+    latencies = [r["latency"] for r in results]
+    count = len(results) or 1
+    ok = [r for r in results if r["outcome"] == "ok"]
+    return {
+        "concurrency": concurrency,
+        "group_size": len(groups[0]) if groups else 0,
+        "requests": len(results),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "requests_per_sec": len(results) / elapsed,
+        "items_per_sec": sum(r["items"] for r in ok) / elapsed,
+        "tokens_per_sec": sum(r["prompt_tokens"] + r["completion_tokens"] for r in records) / elapsed,
+        # 请求失败（429、5xx、网络错误等）计入错误率，返回了内容但无法解析或不完整的计入有效率
+        "error_rate": sum(1 for r in records if r["outcome"] not in ("ok", "parse_error")) / count,
+        "rate_limited": sum(1 for r in records if r["outcome"] == "rate_limited"),
+        "valid_rate": len(ok) / count,
+    }
+
+def _is_healthy(step, baseline=None):
+    """baseline: 同一分组大小下单并发（最低并发）档位，用于判断延迟是否明显变长"""
+    if step["error_rate"] > BENCH_MAX_ERROR_RATE or step["valid_rate"] < BENCH_MIN_VALID_RATE:
+        return False
+    return baseline is None or step["p95"] <= baseline["p50"] * BENCH_MAX_LATENCY_FACTOR
+
+def recommend_settings(steps):
+    """
+    根据各档位的结果给出推荐配置，没有健康的档位时返回None
+    steps: _bench_step 的结果，带有 healthy 标记
+    - group_size / concurrency：条目吞吐量最高的健康档位；同一分组大小下吞吐量达到其90%的最小并发
+    - rate_limit：实测健康档位中的最大请求数（每分钟），乘以 BENCH_RATE_LIMIT_FACTOR 留出余量，至少为1
+    """
+    healthy = [s for s in steps if s.get("healthy", True)]
+    if not healthy:
+        return None
+    best = max(healthy, key=lambda s: s["items_per_sec"])
+    same_size = [s for s in healthy if s["group_size"] == best["group_size"]
+                 and s["items_per_sec"] >= best["items_per_sec"] * 0.9]
+    chosen = min(same_size, key=lambda s: s["concurrency"])
+    return {
+        "concurrency": chosen["concurrency"],
+        "group_size": chosen["group_size"],
+        "rate_limit": {
+            "requests_per_minute": max(1, int(max(s["requests_per_sec"] for s in healthy) * 60 * BENCH_RATE_LIMIT_FACTOR)),
+        },
+    }
+
+def bench_provider(provider_id, model_id=None, base_url=None, mock_args=None, requests=20,
+                   concurrency_levels=None, group_sizes=None, max_retries=1, write=True, yes=False):
+    """
+    用一组固定的合成音效名，按不同分组大小逐级提高并发压测服务商，
+    统计延迟分位数、吞吐量、错误率和结果有效率，并把推荐的 concurrency、group_size、rate_limit
+    写回 providers.json 中对应模型的配置
+    base_url: 替换服务商的API地址（如本地模拟服务器）；mock_args 不为None时在进程内启动模拟服务器。
+    这两种情况测的不是该服务商本身，结果不写入配置
+    """
+    from api_clients import APIClientFactory
+    
+    concurrency_levels = concurrency_levels or BENCH_CONCURRENCY
+    group_sizes = group_sizes or BENCH_GROUP_SIZES
+    config = ProvidersConfig()
+    try:
+        provider_config = config.get_provider_config(provider_id, model_id)
+    except ValueError as e:
+        print(f"错误: {e}")
+        return None
+    model_id = provider_config['model']
+    
+    server = None
+    if mock_args is not None:
+        import shlex
+        import mock_openai_server
+        server_args = mock_openai_server.build_arg_parser().parse_args(['--port', '0'] + shlex.split(mock_args))
+        server, base_url = mock_openai_server.start_server(server_args)
+        print(f"已在进程内启动模拟服务器: {base_url}")
+    if base_url:
+        provider_config['api_url'] = base_url
+        if provider_config.get('client_type') == 'siliconflow':
+            provider_config['api_url'] = base_url.rstrip('/') + "/chat/completions"
+    
+    total = requests * len(group_sizes) * len(concurrency_levels)
+    print(f"正在压测服务商: {provider_config.get('name', provider_id)} (模型: {model_id}, 地址: {provider_config['api_url']})")
+    if server is None and not base_url and not yes:
+        confirm = input(f"最多将发送 {total} 个真实请求并产生费用，是否继续？(y/N): ").strip().lower()
+        if confirm != 'y':
+            print("已取消")
+            return None
+    
+    client = APIClientFactory.create_client(provider_config)
+    if hasattr(getattr(client, 'client', None), 'with_options'):
+        # openai SDK 默认会自动重试429和5xx，压测时关闭，才能统计到真实的错误率
+        client.client = client.client.with_options(max_retries=0)
+    steps = []
+    try:
+        print(f"\n{'分组':>4} {'并发':>4} {'p50':>7} {'p95':>7} {'请求/秒':>8} {'条目/秒':>8} {'token/秒':>9} {'错误率':>6} {'429':>4} {'有效率':>6}")
+        for group_size in group_sizes:
+            groups = _bench_workload(requests, group_size)
+            previous = baseline = None
+            for concurrency in concurrency_levels:
+                step = _bench_step(client, groups, concurrency, max_retries)
+                step["healthy"] = _is_healthy(step, baseline)
+                baseline = baseline or step
+                steps.append(step)
+                print(f"{group_size:>4} {concurrency:>4} {step['p50']:>6.2f}s {step['p95']:>6.2f}s "
+                      f"{step['requests_per_sec']:>8.2f} {step['items_per_sec']:>8.1f} {step['tokens_per_sec']:>9.0f} "
+                      f"{step['error_rate']:>6.1%} {step['rate_limited']:>4} {step['valid_rate']:>6.1%}")
+                # 出现错误、结果无效、延迟明显变长或吞吐量不再明显提升时，不再提高并发
+                if not step["healthy"]:
+                    break
+                if previous and step["items_per_sec"] < previous["items_per_sec"] * (1 + BENCH_MIN_GAIN):
+                    break
+                previous = step
+    finally:
+        if server:
+            server.shutdown()
+    
+    recommended = recommend_settings(steps)
+    if recommended is None:
+        print("\n✗ 没有错误率和有效率都达标的档位，未写入推荐配置")
+        return None
+    rate_limit = recommended["rate_limit"]
+    print(f"\n推荐配置: 并发 {recommended['concurrency']}，每组 {recommended['group_size']} 条，"
+          f"限速 {rate_limit['requests_per_minute']} 请求/分钟")
+    
+    if write and (server is not None or base_url):
+        print("压测的是模拟服务器或指定的API地址，推荐配置不写入 providers.json")
+    elif write:
+        provider = config.config['providers'][provider_id]
+        model = next((m for m in provider.get('models', []) if m.get('id') == model_id), None)
+        if model is None:
+            model = {"id": model_id, "name": model_id}
+            provider.setdefault('models', []).append(model)
+        model.update(recommended)
+        dump_json(config.config, config.config_file, pretty=True)
+        print(f"✓ 已写入 {config.config_file}（服务商 {provider_id} 的模型 {model_id}）")
+    return recommended
+
 def main():
     parser = argparse.ArgumentParser(description="服务商配置管理工具")
     subparsers = parser.add_subparsers(dest='command', help='可用命令')
@@ -232,6 +400,22 @@ def main():
     test_parser.add_argument('provider_id', help='服务商ID')
     test_parser.add_argument('--model', help='指定模型ID')
     
+    # bench 命令
+    bench_parser = subparsers.add_parser('bench', help='压测服务商，写入推荐的并发、分组大小和限速')
+    bench_parser.add_argument('provider_id', help='服务商ID')
+    bench_parser.add_argument('--model', help='指定模型ID')
+    bench_parser.add_argument('--base-url', help='改为压测该地址（如本地模拟服务器 http://127.0.0.1:8765/v1）')
+    bench_parser.add_argument('--mock', nargs='?', const='', metavar='ARGS',
+                              help='在进程内启动模拟服务器并压测它，可附带模拟服务器参数，如 --mock="--rate-429 0.05 --max-concurrency 8"')
+    bench_parser.add_argument('--requests', type=int, default=20, help='每个档位的请求数，默认20')
+    bench_parser.add_argument('--concurrency', type=str, default=','.join(map(str, BENCH_CONCURRENCY)),
+                              help='依次测试的并发数，默认 1,2,4,8,16')
+    bench_parser.add_argument('--group-sizes', type=str, default=','.join(map(str, BENCH_GROUP_SIZES)),
+                              help='依次测试的每组条数，默认 10,25,50')
+    bench_parser.add_argument('--max-retries', type=int, default=1, help='每个请求的最大尝试次数，默认1（不重试，便于统计错误率）')
+    bench_parser.add_argument('--no-write', action='store_true', help='只打印推荐配置，不写入 providers.json（使用 --mock 或 --base-url 时总是不写入）')
+    bench_parser.add_argument('--yes', '-y', action='store_true', help='压测真实服务商时不询问')
+    
     args = parser.parse_args()
     
     if args.command == 'list':
@@ -251,6 +435,10 @@ def main():
         remove_provider(args.provider_id)
     elif args.command == 'test':
         test_provider(args.provider_id, getattr(args, 'model', None))
+    elif args.command == 'bench':
+        bench_provider(args.provider_id, args.model, args.base_url, args.mock, args.requests,
+                       [int(c) for c in args.concurrency.split(',')], [int(g) for g in args.group_sizes.split(',')],
+                       args.max_retries, write=not args.no_write, yes=args.yes)
     else:
         parser.print_help()
 
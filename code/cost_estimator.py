@@ -0,0 +1,123 @@
+"""
+翻译费用和输出token估算
+从 telemetry 记录的历史调用（json/metrics/requests.jsonl）中学习"输出token / 条目输入token"的比例，
+用于 --dry-run 预算和自动分组大小
+"""
+
+import os
+from json_io import loads_json
+from telemetry import DEFAULT_METRICS_DIR, REQUESTS_FILE
+
+# 没有历史记录时，假设每个条目平均生成20个token
+DEFAULT_OUTPUT_PER_ITEM = 20
+# 少于该数量的有效记录时不使用学习到的比例
+MIN_SAMPLES = 5
+# 只使用最近的记录，跟随提示词和模型的变化
+MAX_SAMPLES = 2000
+
+# 未配置 pricing 时的旧版单价（元/千token）
+LEGACY_PRICING = {
+    "dashscope": {"input": 0.004, "output": 0.004},
+    "default": {"input": 0.002, "output": 0.002},
+}
+
+
+def default_pricing(provider_id):
+    """providers.json 中没有配置单价时使用的默认单价"""
+    key = "dashscope" if "dashscope" in (provider_id or "").lower() else "default"
+    return dict(LEGACY_PRICING[key])
+
+
+def load_samples(metrics_dir=DEFAULT_METRICS_DIR, provider=None, model=None):
+    """
+    读取成功调用的 (prompt_tokens, completion_tokens, group_size)
+    优先使用相同服务商+模型的记录，不足 MIN_SAMPLES 条时依次放宽到相同模型、全部记录
+    """
+    path = os.path.join(metrics_dir, REQUESTS_FILE)
+    if not os.path.exists(path):
+        return [], None
+    exact, same_model, everything = [], [], []
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                r = loads_json(line)
+            except ValueError:
+                continue  # 进程中断时可能留下不完整的最后一行
+            if r.get("outcome") != "ok" or not r.get("prompt_tokens") or not r.get("completion_tokens"):
+                continue
+            sample = (r["prompt_tokens"], r["completion_tokens"], r.get("group_size") or 0)
+            everything.append(sample)
+            if r.get("model") == model:
+                same_model.append(sample)
+                if r.get("provider") == provider:
+                    exact.append(sample)
+    for scope, samples in (("provider+model", exact), ("model", same_model), ("all", everything)):
+        if len(samples) >= MIN_SAMPLES:
+            return samples[-MAX_SAMPLES:], scope
+    return [], None
+
+
+class CostEstimator:
+    """
+    估算一组条目的输出token和费用
+    输出token ≈ ratio × (输入token - 提示词固定开销)；没有足够历史记录时按每条目 DEFAULT_OUTPUT_PER_ITEM 个token估算
+    """
+
+    def __init__(self, pricing=None, ratio=None, samples=0, scope=None, overhead_tokens=0):
+        self.pricing = pricing
+        self.ratio = ratio
+        self.samples = samples
+        self.scope = scope
+        self.overhead_tokens = overhead_tokens
+
+    @classmethod
+    def calibrate(cls, pricing=None, overhead_tokens=0, metrics_dir=DEFAULT_METRICS_DIR, provider=None, model=None):
+        """
+        从历史记录学习比例
+        overhead_tokens: 不含条目的提示词token数（系统提示和说明），这部分不会带来输出
+        """
+        samples, scope = load_samples(metrics_dir, provider, model)
+        item_input = sum(max(prompt - overhead_tokens, 1) for prompt, _, _ in samples)
+        output = sum(completion for _, completion, _ in samples)
+        ratio = output / item_input if samples else None
+        return cls(pricing, ratio, len(samples), scope, overhead_tokens)
+
+    @property
+    def calibrated(self):
+        return self.ratio is not None
+
+    def output_per_item(self, item_input_tokens):
+        """单个条目（平均输入 item_input_tokens 个token）预计的输出token"""
+        if self.calibrated:
+            return self.ratio * item_input_tokens
+        return DEFAULT_OUTPUT_PER_ITEM
+
+    def estimate_output(self, input_tokens, items):
+        """估算一个请求的输出token"""
+        if self.calibrated:
+            return int(round(self.ratio * max(input_tokens - self.overhead_tokens, 0)))
+        return items * DEFAULT_OUTPUT_PER_ITEM
+
+    def cost(self, input_tokens, output_tokens):
+        """按单价计算费用（元），未配置单价时返回None"""
+        if not self.pricing:
+            return None
+        return (input_tokens * self.pricing.get("input", 0) + output_tokens * self.pricing.get("output", 0)) / 1000
+
+    def suggest_group_size(self, item_input_tokens, max_output_tokens=4096, fill=0.8, minimum=5, maximum=200):
+        """
+        根据单条目输入token推算每组条目数：
+        让预计输出不超过 max_output_tokens × fill（留出余量避免输出被截断），
+        同时分组越大，提示词固定开销分摊到每条目上越少
+        """
+        per_item = max(self.output_per_item(item_input_tokens), 1)
+        size = int(max_output_tokens * fill // per_item)
+        return max(minimum, min(maximum, size))
+
+    def describe(self):
+        if self.calibrated:
+            return f"按历史记录学习的比例估算（{self.samples} 条记录，范围: {self.scope}，输出/条目输入 = {self.ratio:.2f}）"
+        return f"没有足够的历史记录，按每条目 {DEFAULT_OUTPUT_PER_ITEM} 个输出token估算"
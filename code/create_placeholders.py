@@ -1,6 +1,9 @@
 import os
-import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from json_stream import iter_structure
 
 def create_placeholders(base_dir, tree):
     for name, value in tree.items():
@@ -18,16 +21,69 @@ def create_placeholders(base_dir, tree):
                 os.makedirs(path)
             create_placeholders(path, value)
 
+def create_placeholders_from_records(base_dir, records, workers=8, sparse_sizes=False, seed=0, verbose=False):
+    """
+    根据 (id, rel_path, ext) 记录创建占位文件，返回新建的文件数
+    - 先按目录归并记录，一次性建好全部目录
+    - 每个目录只列一次已有文件，已存在的直接跳过，不再逐个 os.path.exists
+    - 以目录为单位交给最多 workers 个线程创建文件
+    sparse_sizes: 用 ftruncate 把文件设为按格式估算的真实大小（稀疏文件，不占用磁盘块），
+    与 synthetic_library 生成的同名文件大小相同
+    """
+    if sparse_sizes:
+        from synthetic_library import realistic_size
+    by_dir = {}
+    for _, rel_path, ext in records:
+        dir_rel, filename = os.path.split(rel_path)
+        by_dir.setdefault(dir_rel, []).append((filename, ext, rel_path))
+
+    for dir_rel in sorted(by_dir):
+        os.makedirs(os.path.join(base_dir, dir_rel), exist_ok=True)
+
+    def fill(item):
+        dir_rel, files = item
+        dir_path = os.path.join(base_dir, dir_rel)
+        existing = set(os.listdir(dir_path))
+        created = 0
+        for filename, ext, rel_path in files:
+            if filename in existing:
+                continue
+            path = os.path.join(dir_path, filename)
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                continue
+            try:
+                if sparse_sizes:
+                    os.ftruncate(fd, realistic_size(ext, rel_path, seed))
+            finally:
+                os.close(fd)
+            created += 1
+            if verbose:
+                print(f"创建占位音频: {path}")
+        return created
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return sum(pool.map(fill, by_dir.items()))
+
 def main():
+    parser = argparse.ArgumentParser(description="按 structure.json 创建占位音频文件")
+    parser.add_argument("--structure", type=str, default="./json/structure.json", help="structure.json 路径")
+    parser.add_argument("--workers", type=int, default=8, help="并行创建文件的线程数，默认8")
+    parser.add_argument("--sparse-size", action="store_true", help="按真实大小创建稀疏文件（默认创建空文件）")
+    parser.add_argument("--seed", type=int, default=0, help="文件大小的随机种子，默认0（与 synthetic_library.py 一致）")
+    parser.add_argument("--verbose", action="store_true", help="逐个打印创建的文件")
+    args = parser.parse_args()
+
     load_dotenv()
-    # 读取结构
-    with open("./json/structure.json", "r", encoding="utf-8") as f:
-        tree = json.load(f)
     base_dir = os.environ.get("SFX_PLACEHOLDER_DIR")
     if not base_dir:
         raise RuntimeError("请在 .env 文件中设置 SFX_PLACEHOLDER_DIR 环境变量！")
-    create_placeholders(base_dir, tree)
-    print("占位音频文件创建完成。")
+    start = time.perf_counter()
+    # 流式读取结构
+    count = create_placeholders_from_records(base_dir, iter_structure(args.structure), args.workers,
+                                             args.sparse_size, args.seed, args.verbose)
+    print(f"占位音频文件创建完成，新建 {count} 个，耗时 {time.perf_counter() - start:.1f}s。")
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,7 @@
 import os
-import json
 from dotenv import load_dotenv
+from json_stream import StructureStreamWriter, MappingStreamWriter
+from json_io import atomic_write
 
 # 支持的音频文件后缀
 AUDIO_EXTS = ['.wav', '.mp3', '.flac', '.ogg', '.aac', '.m4a', '.wma']
@@ -33,6 +34,19 @@ def scan_folder(folder):
             tree[entry] = {"id": file_id, "ext": ext}
     return tree
 
+def iter_audio_files(folder, parents=()):
+    """
+    按与 scan_folder 相同的顺序逐个产出 (dirs, filename)
+    dirs 为文件所在目录相对于 folder 的各级名称，不在内存中构建整棵树
+    """
+    with os.scandir(folder) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        if entry.is_dir():
+            yield from iter_audio_files(entry.path, parents + (entry.name,))
+        elif is_audio_file(entry.name):
+            yield parents, entry.name
+
 def build_mapping(tree, mapping, parent_path=""):
     for key, value in tree.items():
         if isinstance(value, dict) and 'id' in value:
@@ -44,18 +58,37 @@ def build_mapping(tree, mapping, parent_path=""):
         elif isinstance(value, dict):
             build_mapping(value, mapping, os.path.join(parent_path, key))
 
+def generate(target_dir, structure_path, mapping_path, index=None, mapping=None):
+    """
+    扫描 target_dir，边扫描边写出 structure.json 和 mapping.json，返回文件数
+    index / mapping: 可选的 StructureIndex 和字典，传入时同时在内存中保留扫描结果，供后续步骤直接使用
+    """
+    count = 0
+    with atomic_write(structure_path) as sf, atomic_write(mapping_path) as mf:
+        structure_writer = StructureStreamWriter(sf)
+        mapping_writer = MappingStreamWriter(mf)
+        for dirs, filename in iter_audio_files(target_dir):
+            count += 1
+            file_id = str(count)
+            name, ext = os.path.splitext(filename)
+            info = {"original": name, "translation": ""}
+            structure_writer.add_file(dirs, filename, file_id, ext)
+            mapping_writer.add(file_id, info)
+            if index is not None:
+                index.add_file(file_id, os.path.join(*dirs, filename), ext)
+            if mapping is not None:
+                mapping[file_id] = info
+        structure_writer.close()
+        mapping_writer.close()
+    return count
+
 def main():
     load_dotenv()
     target_dir = os.environ.get("SFX_DIR")
     if not target_dir:
         raise RuntimeError("请在 .env 文件中设置 SFX_DIR 环境变量！")
-    tree = scan_folder(target_dir)
-    mapping = {}
-    build_mapping(tree, mapping)
-    with open("./json/structure.json", "w", encoding="utf-8") as f:
-        json.dump(tree, f, ensure_ascii=False, indent=2)
-    with open("./json/mapping.json", "w", encoding="utf-8") as f:
-        json.dump(mapping, f, ensure_ascii=False, indent=2)
+    # 边扫描边写出，不在内存中保留整棵树
+    generate(target_dir, "./json/structure.json", "./json/mapping.json")
     print("已生成带id的 structure.json 和 i18n风格的 mapping.json")
 
 if __name__ == "__main__":
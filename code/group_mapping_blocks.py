@@ -1,10 +1,19 @@
-import json
 import os
 import argparse
 from collections import defaultdict
 import re
+from json_stream import iter_mapping, write_json_array
+from json_io import load_json, dump_json, atomic_write
 
-def group_by_continuous_prefix(mapping, min_group_size=2, max_group_items=100):
+# 可选的分组策略：前四种按 _get_prefix_by_strategy 的前缀分组，trie 按前缀树分层合并，
+# minhash 按名称相似度聚类（similarity_grouping.py）
+PREFIX_STRATEGIES = ["detailed", "first_underscore", "first_word", "single_char"]
+STRATEGIES = PREFIX_STRATEGIES + ["trie", "minhash"]
+
+# 前缀树的分词：大写缩写、单词、数字、单个分隔符，例如 WEAPSwrd_Weapon 01 -> WEAP|Swrd|_|Weapon| |01
+_TOKEN_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+|[^A-Za-z\d]')
+
+def group_by_continuous_prefix(mapping, min_group_size=2, max_group_items=100, strategy="detailed"):
     """
     按照 original 中的前缀进行分组。
     1. 优先按照第一个数字前的所有字符为分组前缀
@@ -13,37 +22,203 @@ def group_by_continuous_prefix(mapping, min_group_size=2, max_group_items=100):
     4. 如果单个分组的条目数量超过max_group_items，会将该分组拆分成多个子分组
     例如：WEAPSwrd_Weapon 01 Unequip_JSE_MW, WEAPSwrd_Weapon 02 Unequip_JSE_MW -> WEAPSwrd_Weapon
     例如：WEAPArmr_Hybrid Shield Drops_JSE_MW, WEAPArmr_Metal Shield Drops_JSE_MW -> WEAPArmr_
+    strategy: 前缀策略，见 PREFIX_STRATEGIES
     """
     items = [(k, v["original"]) for k, v in mapping.items() if not v.get("translation") and v.get("original")]
+    return list(_group_sorted_items(items, min_group_size, max_group_items, strategy))
+
+def _group_sorted_items(items, min_group_size, max_group_items, strategy):
+    """把 [(id, original), ...] 按 original 排序后按前缀分组，逐个产出分组"""
     if not items:
-        return []
+        return
     items.sort(key=lambda x: x[1])
     
-    # 使用详细策略进行分组
+    # 按指定策略进行分组
     groups = {}
     for k, original in items:
-        prefix = _get_prefix_by_strategy(original, "detailed")
+        prefix = _get_prefix_by_strategy(original, strategy)
         groups.setdefault(prefix, []).append((k, original))
     
     # 分离大分组和小分组，并处理超过max_group_items的分组
-    result = []
     for group in groups.values():
         if len(group) >= min_group_size:
-            # 如果分组条目数量超过max_group_items，将其拆分成多个子分组
-            if len(group) > max_group_items:
-                # 按照max_group_items拆分成多个子分组
-                for i in range(0, len(group), max_group_items):
-                    subgroup = group[i:i + max_group_items]
-                    result.append(subgroup)
-            else:
-                result.append(group)
+            # 如果分组条目数量超过max_group_items，按照max_group_items拆分成多个子分组
+            for i in range(0, len(group), max_group_items):
+                yield group[i:i + max_group_items]
         else:
             # 小于min_group_size的分组，每个条目单独成组
             for item in group:
-                result.append([item])
-    
+                yield [item]
+
+def iter_windowed_groups(records, window=20000, min_group_size=2, max_group_items=100, strategy="detailed"):
+    """
+    流式分组：每攒够 window 条未翻译的 (id, original, translation) 记录，就在窗口内排序并按前缀分组产出。
+    mapping 按扫描顺序（目录、文件名）排列，同前缀的条目大多落在同一窗口内，分组效果接近全量排序，
+    但第一组不需要等全部条目排序完成，内存也只与窗口大小有关
+    """
+    items = []
+    for k, original, translation in records:
+        if translation or not original:
+            continue
+        items.append((k, original))
+        if len(items) >= window:
+            yield from _group_sorted_items(items, min_group_size, max_group_items, strategy)
+            items = []
+    yield from _group_sorted_items(items, min_group_size, max_group_items, strategy)
+
+def iter_continuous_groups(records, min_group_size=2, max_group_items=100, strategy="detailed"):
+    """
+    按文件中的原始顺序对 (id, original, translation) 记录流式分组。
+    只合并前缀相同且相邻的条目，同一时刻只缓存当前分组，适合超大规模的 mapping.json。
+    generate_sfx_json.py 按目录和文件名排序生成id，同前缀的条目在文件中通常是相邻的。
+    """
+    group = []
+    prefix = None
+    continued = False  # 当前分组是否为超长分组拆分后的剩余部分
+
+    def flush():
+        if len(group) >= min_group_size or continued:
+            yield list(group)
+        else:
+            for item in group:
+                yield [item]
+
+    for k, original, translation in records:
+        if translation or not original:
+            continue
+        item_prefix = _get_prefix_by_strategy(original, strategy)
+        if item_prefix != prefix:
+            yield from flush()
+            group.clear()
+            prefix = item_prefix
+            continued = False
+        elif len(group) >= max_group_items:
+            yield list(group)
+            group.clear()
+            continued = True
+        group.append((k, original))
+    yield from flush()
+
+class _TrieNode:
+    """前缀树（LCP区间树）的内部节点，depth 为子树内所有条目共有的分词数"""
+    __slots__ = ("depth", "children")
+
+    def __init__(self, depth, children=None):
+        self.depth = depth
+        self.children = children or []
+
+def _tokenize(original):
+    return _TOKEN_RE.findall(original)
+
+def _common_prefix_len(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+def _build_prefix_trie(tokens):
+    """
+    由已排序条目的分词构建压缩前缀树：相邻条目的最长公共前缀（LCP）决定分支位置，
+    用单调栈一次遍历完成，叶子为条目下标
+    """
+    root = _TrieNode(0)
+    stack = [root]
+    for i in range(len(tokens)):
+        lcp = _common_prefix_len(tokens[i - 1], tokens[i]) if i else 0
+        last = None
+        while lcp < stack[-1].depth:
+            last = stack.pop()
+            if lcp <= stack[-1].depth:
+                stack[-1].children.append(last)
+                last = None
+        if lcp > stack[-1].depth:
+            first = last if last is not None else stack[-1].children.pop()
+            node = _TrieNode(lcp, [first])
+            stack.append(node)
+        stack[-1].children.append(i)
+    while len(stack) > 1:
+        node = stack.pop()
+        stack[-1].children.append(node)
+    return root
+
+def _split_evenly(items, max_group_items):
+    """把超长分组拆成大小接近的若干组"""
+    parts = -(-len(items) // max_group_items)
+    size, extra = divmod(len(items), parts)
+    result = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        result.append(items[start:end])
+        start = end
+    return result
+
+def group_by_prefix_trie(mapping, min_group_size=2, max_group_items=100, target_size=None):
+    """
+    按前缀树分层分组：
+    1. 对所有待翻译条目排序并分词，相邻条目的最长公共前缀构成一棵前缀树
+    2. 自底向上合并：每个节点收集子节点剩余的条目，达到 target_size 即成组，
+       不足的条目继续上卷到父节点，与兄弟分支合并（共享更短的前缀）
+    3. 超过 max_group_items 的分组拆成大小接近的若干组
+    排序 O(n log n)，建树和合并均为 O(n)
+    target_size 默认为 max_group_items 的四分之一（不小于 min_group_size）
+    """
+    items = [(k, v["original"]) for k, v in mapping.items() if not v.get("translation") and v.get("original")]
+    if not items:
+        return []
+    items.sort(key=lambda x: x[1])
+    if target_size is None:
+        target_size = max(min_group_size, max_group_items // 4)
+    target_size = min(target_size, max_group_items)
+
+    root = _build_prefix_trie([_tokenize(original) for _, original in items])
+    result = []
+
+    def roll_up(node):
+        pending = []
+        for child in node.children:
+            if isinstance(child, int):
+                pending.append(items[child])
+            else:
+                pending.extend(roll_up(child))
+        if len(pending) > max_group_items:
+            result.extend(_split_evenly(pending, max_group_items))
+            return []
+        if len(pending) >= target_size and node.depth > 0:
+            result.append(pending)
+            return []
+        return pending
+
+    leftover = roll_up(root)
+    # 根节点剩下的条目没有共同前缀，仍合并发送以减少请求数
+    if leftover:
+        result.extend(_split_evenly(leftover, max_group_items))
     return result
 
+def group_mapping(mapping, strategy="detailed", min_group_size=2, max_group_items=100):
+    """按 strategy 选择分组方法"""
+    if strategy == "trie":
+        return group_by_prefix_trie(mapping, min_group_size, max_group_items)
+    if strategy == "minhash":
+        from similarity_grouping import group_by_similarity
+        return group_by_similarity(mapping, min_group_size, max_group_items)
+    if strategy in PREFIX_STRATEGIES:
+        return group_by_continuous_prefix(mapping, min_group_size, max_group_items, strategy)
+    raise ValueError(f"未知的分组策略: {strategy}")
+
+def iter_group_mapping(mapping, strategy="detailed", min_group_size=2, max_group_items=100, window=20000):
+    """
+    group_mapping 的流式版本，供翻译流程边分组边请求
+    前缀策略按窗口流式分组；trie、minhash 需要全部条目，仍一次生成全部分组
+    翻译过程中已翻译的条目会被跳过，mapping 只能修改已有条目，不能增删
+    """
+    if strategy not in PREFIX_STRATEGIES:
+        yield from group_mapping(mapping, strategy, min_group_size, max_group_items)
+        return
+    records = ((k, v.get("original"), v.get("translation")) for k, v in mapping.items())
+    yield from iter_windowed_groups(records, window, min_group_size, max_group_items, strategy)
+
 def _get_prefix_by_strategy(original, strategy):
     """根据策略获取前缀"""
     if strategy == "detailed":
@@ -75,22 +250,34 @@ def _get_prefix_by_strategy(original, strategy):
     else:
         return original
 
+def format_groups(groups):
+    """转换为 group.json 的格式 [{"ids": [id, ...], "originals": [original, ...]}]"""
+    return [{"ids": [k for k, _ in group], "originals": [o for _, o in group]} for group in groups]
+
 def main():
     parser = argparse.ArgumentParser(description="将 mapping.json 中 translation 为空的条目按连续前缀分组")
     parser.add_argument('--mapping', type=str, default=os.path.join(os.path.dirname(__file__), '..', 'json', 'mapping.json'))
     parser.add_argument('--min-group-size', type=int, default=2, help='最小分组条数，默认2')
     parser.add_argument('--max-group-items', type=int, default=100, help='每个分组的最大条目数量，默认100')
     parser.add_argument('--output', type=str, default=os.path.join(os.path.dirname(__file__), '..', 'json', 'group.json'), help='输出分组文件')
+    parser.add_argument('--stream', action='store_true', help='流式读取并只合并相邻的同前缀条目，内存占用与文件大小无关')
+    parser.add_argument('--strategy', type=str, default='detailed', choices=STRATEGIES,
+                        help='分组策略，默认detailed（第一个数字前的前缀）；trie 按前缀树分层合并小分组；minhash 按名称相似度聚类')
     args = parser.parse_args()
-    with open(args.mapping, 'r', encoding='utf-8') as f:
-        mapping = json.load(f)
-        groups = group_by_continuous_prefix(mapping, min_group_size=args.min_group_size, max_group_items=args.max_group_items)
-    # 输出为 [{"group": [id, ...], "originals": [original, ...]}]
-    result = [
-        {"ids": [k for k, _ in group], "originals": [o for _, o in group]} for group in groups
-    ]
-    with open(args.output, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.stream:
+        if args.strategy not in PREFIX_STRATEGIES:
+            parser.error(f"--stream 只支持前缀策略: {', '.join(PREFIX_STRATEGIES)}")
+        groups = iter_continuous_groups(iter_mapping(args.mapping), min_group_size=args.min_group_size,
+                                        max_group_items=args.max_group_items, strategy=args.strategy)
+        with atomic_write(args.output) as f:
+            count = write_json_array(f, (format_groups([group])[0] for group in groups))
+        print(f"已分组 {count} 组，输出到 {args.output}")
+        return
+    mapping = load_json(args.mapping)
+    groups = group_mapping(mapping, args.strategy, min_group_size=args.min_group_size, max_group_items=args.max_group_items)
+    # 输出为 [{"ids": [id, ...], "originals": [original, ...]}]
+    result = format_groups(groups)
+    dump_json(result, args.output)
     print(f"已分组 {len(result)} 组，输出到 {args.output}")
     
     # 检查是否有超过限制的分组
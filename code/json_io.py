@@ -0,0 +1,103 @@
+"""
+JSON读写工具
+安装了 orjson 时使用 orjson 编解码，否则回退到标准库 json；
+所有写入都先写入同目录下的临时文件，再原子替换目标文件，中途中断不会留下截断的文件
+"""
+
+import os
+import json
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+def default_pretty():
+    """默认是否缩进输出，可通过环境变量 SFX_JSON_COMPACT=1 改为紧凑输出"""
+    return os.environ.get("SFX_JSON_COMPACT", "").strip().lower() not in ("1", "true", "yes")
+
+
+def loads_json(data):
+    """解析JSON文本（str 或 bytes）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_json(obj, pretty=None):
+    """序列化为UTF-8编码的bytes，pretty为None时使用 default_pretty()"""
+    if pretty is None:
+        pretty = default_pretty()
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    if pretty:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+    return text.encode('utf-8')
+
+
+def load_json(path):
+    """读取JSON文件"""
+    with open(path, 'rb') as f:
+        return loads_json(f.read())
+
+
+def iter_jsonl(path):
+    """逐行读取JSON Lines文件，跳过空行和无法解析的行（如中断时写了一半的最后一行）"""
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield loads_json(line)
+            except ValueError:
+                continue
+
+
+def dump_json(obj, path, pretty=None):
+    """原子地写出JSON文件"""
+    data = dumps_json(obj, pretty)
+    with atomic_write(path, 'wb') as f:
+        f.write(data)
+
+
+# 进程的 umask 只能通过设置再恢复来读取，这会短暂影响所有线程，所以只在导入时读一次
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _target_mode(path):
+    """沿用已有文件的权限；新文件使用受 umask 限制的默认权限"""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8'):
+    """
+    写入临时文件，正常结束后 fsync 并用 os.replace 替换目标文件；
+    出现异常时删除临时文件，目标文件保持原样
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_path, _target_mode(path))
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
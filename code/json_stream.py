@@ -0,0 +1,303 @@
+"""
+structure.json / mapping.json 的流式读写工具
+逐条读取或写入记录，内存占用与音效库规模无关
+"""
+
+import os
+import re
+import json
+from json.decoder import scanstring
+from json.encoder import encode_basestring
+from json_io import default_pretty
+
+# 每次从文件读取的字符数
+CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_SCALAR_END = re.compile(r'[\s,:\]\}]')
+_decoder = json.JSONDecoder()
+
+# token类型
+PUNCT = 'p'
+STRING = 's'
+SCALAR = 'v'
+
+
+class _Tokenizer:
+    """按块读取JSON文本并逐个产出token"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """读取下一块数据，已读到文件末尾时返回False"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return True
+            if not self._fill():
+                return False
+
+    def peek(self):
+        """返回下一个非空白字符（不消耗），文件结束时返回None"""
+        if not self._skip_whitespace():
+            return None
+        return self.buf[self.pos]
+
+    def next(self):
+        """返回 (类型, 值)，文件结束时返回None"""
+        if not self._skip_whitespace():
+            return None
+        ch = self.buf[self.pos]
+        if ch in '{}[]:,':
+            self.pos += 1
+            return PUNCT, ch
+        if ch == '"':
+            while True:
+                try:
+                    value, end = scanstring(self.buf, self.pos + 1)
+                    self.pos = end
+                    return STRING, value
+                except json.JSONDecodeError:
+                    if not self._fill():
+                        raise
+        while True:
+            m = _SCALAR_END.search(self.buf, self.pos)
+            if m or self.eof:
+                end = m.start() if m else len(self.buf)
+                literal = self.buf[self.pos:end]
+                self.pos = end
+                return SCALAR, json.loads(literal)
+            self._fill()
+
+    def value(self):
+        """解析一个完整的JSON值（用于体积较小的对象）"""
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def expect(self, punct):
+        token = self.next()
+        if token != (PUNCT, punct):
+            raise ValueError(f"JSON格式错误：期望 '{punct}'，实际为 {token}")
+
+
+def _read_key(tok):
+    """读取对象中的下一个键，对象结束时返回None"""
+    while True:
+        token = tok.next()
+        if token is None:
+            raise ValueError("JSON格式错误：文件意外结束")
+        kind, value = token
+        if kind == PUNCT and value == ',':
+            continue
+        if kind == PUNCT and value == '}':
+            return None
+        if kind != STRING:
+            raise ValueError(f"JSON格式错误：期望对象键，实际为 {token}")
+        tok.expect(':')
+        return value
+
+
+def iter_structure(path):
+    """
+    流式读取 structure.json
+    逐个产出 (id, rel_path, ext)，rel_path 为相对于音效根目录的文件路径
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        tok = _Tokenizer(f)
+        tok.expect('{')
+        stack = []  # 当前所在的目录名
+        pending = None  # 已读取但尚未处理的键
+        while True:
+            if pending is None:
+                name = _read_key(tok)
+                if name is None:
+                    if not stack:
+                        return
+                    stack.pop()
+                    continue
+            else:
+                name, pending = pending, None
+            tok.expect('{')
+            key = _read_key(tok)
+            if key is None:
+                continue  # 空文件夹
+            if tok.peek() == '{':
+                # 值为对象，说明是文件夹节点
+                stack.append(name)
+                pending = key
+                continue
+            # 值为字符串，说明是文件节点 {"id": ..., "ext": ...}
+            node = {key: tok.value()}
+            while True:
+                key = _read_key(tok)
+                if key is None:
+                    break
+                node[key] = tok.value()
+            yield node.get('id'), os.path.join(*stack, name), node.get('ext', '')
+
+
+def iter_mapping(path):
+    """
+    流式读取 mapping.json
+    逐个产出 (id, original, translation)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        tok = _Tokenizer(f)
+        tok.expect('{')
+        while True:
+            file_id = _read_key(tok)
+            if file_id is None:
+                return
+            info = tok.value()
+            yield file_id, info.get('original', ''), info.get('translation', '')
+
+
+def iter_joined(structure_path, mapping_path):
+    """
+    按id合并 structure.json 与 mapping.json 的记录
+    逐个产出 (id, rel_path, ext, original, translation)
+    两个文件顺序一致时（generate_sfx_json.py 生成的文件即如此）只占用常数内存，
+    顺序不一致时会缓存尚未匹配的mapping条目。
+    mapping中存在但结构树中找不到的条目，最后以 rel_path=None 产出。
+    """
+    mapping_records = iter_mapping(mapping_path)
+    pending = {}
+    for file_id, rel_path, ext in iter_structure(structure_path):
+        info = pending.pop(file_id, None)
+        while info is None:
+            record = next(mapping_records, None)
+            if record is None:
+                break
+            if record[0] == file_id:
+                info = record[1:]
+            else:
+                pending[record[0]] = record[1:]
+        original, translation = info if info else (None, None)
+        yield file_id, rel_path, ext, original, translation
+    for file_id, (original, translation) in pending.items():
+        yield file_id, None, None, original, translation
+    for file_id, original, translation in mapping_records:
+        yield file_id, None, None, original, translation
+
+
+class _Layout:
+    """缩进输出时与 json.dump(indent=2) 格式相同，紧凑输出时与 separators=(',', ':') 相同"""
+
+    def __init__(self, pretty):
+        self.pretty = default_pretty() if pretty is None else pretty
+        self.colon = ': ' if self.pretty else ':'
+
+    def newline(self, depth):
+        return '\n' + '  ' * depth if self.pretty else ''
+
+    def value(self, value, depth):
+        """序列化嵌套在depth层的值"""
+        if not self.pretty:
+            return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        text = json.dumps(value, ensure_ascii=False, indent=2)
+        return text.replace('\n', '\n' + '  ' * depth)
+
+
+class StructureStreamWriter:
+    """
+    流式写出 structure.json
+    文件需按目录深度优先的顺序写入（与 scan_folder 的遍历顺序一致），
+    缩进输出时与 json.dump(tree, indent=2, ensure_ascii=False) 完全相同
+    """
+
+    def __init__(self, f, pretty=None):
+        self.f = f
+        self.layout = _Layout(pretty)
+        self.stack = []  # 当前打开的目录名
+        self.counts = [0]  # 每层已写入的子项数量
+        f.write('{')
+
+    def _write_key(self, name):
+        depth = len(self.stack) + 1
+        sep = ',' if self.counts[-1] else ''
+        self.f.write(f"{sep}{self.layout.newline(depth)}{encode_basestring(name)}{self.layout.colon}")
+        self.counts[-1] += 1
+
+    def _close_dir(self):
+        self.stack.pop()
+        self.counts.pop()
+        self.f.write(self.layout.newline(len(self.stack) + 1) + '}')
+
+    def add_file(self, dirs, filename, file_id, ext):
+        """dirs 为文件所在目录的各级名称"""
+        common = 0
+        while common < len(self.stack) and common < len(dirs) and self.stack[common] == dirs[common]:
+            common += 1
+        while len(self.stack) > common:
+            self._close_dir()
+        for name in dirs[common:]:
+            self._write_key(name)
+            self.f.write('{')
+            self.stack.append(name)
+            self.counts.append(0)
+        self._write_key(filename)
+        self.f.write(self.layout.value({"id": file_id, "ext": ext}, len(self.stack) + 1))
+
+    def close(self):
+        while self.stack:
+            self._close_dir()
+        self.f.write(self.layout.newline(0) + '}' if self.counts[0] else '}')
+
+
+class MappingStreamWriter:
+    """
+    流式写出 mapping.json
+    缩进输出时与 json.dump(mapping, indent=2, ensure_ascii=False) 完全相同
+    """
+
+    def __init__(self, f, pretty=None):
+        self.f = f
+        self.layout = _Layout(pretty)
+        self.count = 0
+        f.write('{')
+
+    def add(self, file_id, info):
+        sep = ',' if self.count else ''
+        layout = self.layout
+        self.f.write(f"{sep}{layout.newline(1)}{encode_basestring(file_id)}{layout.colon}{layout.value(info, 1)}")
+        self.count += 1
+
+    def close(self):
+        self.f.write(self.layout.newline(0) + '}' if self.count else '}')
+
+
+def write_json_array(f, items, pretty=None):
+    """流式写出JSON数组，返回写出的元素个数"""
+    layout = _Layout(pretty)
+    count = 0
+    f.write('[')
+    for item in items:
+        f.write(f"{',' if count else ''}{layout.newline(1)}{layout.value(item, 1)}")
+        count += 1
+    f.write(layout.newline(0) + ']' if count else ']')
+    return count
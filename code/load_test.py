@@ -0,0 +1,167 @@
+"""
+翻译吞吐量压力测试
+用真实的API客户端代码（api_clients.py）并发请求本地模拟服务器（或任意 OpenAI 兼容地址），
+统计每秒请求数、每秒token数和延迟分位数
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from api_clients import APIClientFactory
+from prompts import build_translation_messages
+from group_mapping_blocks import group_by_continuous_prefix
+from telemetry import percentile
+import synthetic_library
+import mock_openai_server
+
+
+def build_workload(requests, group_size, seed=0):
+    """用合成音效名生成 requests 个分组"""
+    names = synthetic_library.iter_synthetic_files(requests * group_size * 2, depth=2, fanout=6, seed=seed)
+    mapping = {str(i): {"original": filename.rsplit('.', 1)[0], "translation": ""}
+               for i, (_, filename) in enumerate(names, 1)}
+    groups = group_by_continuous_prefix(mapping, min_group_size=1, max_group_items=group_size)
+    groups.sort(key=len, reverse=True)
+    return groups[:requests]
+
+
+def _fetch_stats(base_url):
+    """读取模拟服务器的统计数据，非模拟服务器时返回None"""
+    import requests
+    try:
+        response = requests.get(base_url.rstrip('/') + "/stats", timeout=5)
+        return response.json() if response.ok else None
+    except Exception:
+        return None
+
+
+def run_load(client, groups, concurrency, max_retries):
+    """并发发送所有分组，返回每个请求的结果列表"""
+    results = []
+    lock = threading.Lock()
+
+    def send(block):
+        messages = build_translation_messages(block)
+        start = time.perf_counter()
+        try:
+            result = client.call_api(messages, max_retries)
+            translated = result.get("result", result) if isinstance(result, dict) else {}
+            valid = isinstance(translated, dict) and all(k in translated for k, _ in block)
+            outcome = "ok" if valid else "invalid"
+            error = None
+        except Exception as e:
+            outcome = "error"
+            error = type(e).__name__
+        latency = time.perf_counter() - start
+        with lock:
+            results.append({"latency": latency, "outcome": outcome, "error": error, "items": len(block)})
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, groups))
+    return results
+
+
+def run_batch(client, groups, poll_interval=1.0):
+    """通过批量API提交所有分组（超过限制时拆分为多个作业），返回 (结果列表, 各作业的最终状态)"""
+    requests_data = ({"messages": build_translation_messages(block)} for block in groups)
+    jobs, _ = client.create_batch_jobs(requests_data, "SFX Load Test")
+    if not jobs:
+        raise RuntimeError("批量作业创建失败")
+    results, statuses = [], []
+    for batch_job in jobs:
+        while True:
+            status = client.get_batch_status(batch_job.id)
+            if status is None or status.status in ("completed", "failed", "cancelled", "expired"):
+                break
+            time.sleep(poll_interval)
+        statuses.append(status)
+        results.extend(client.get_batch_results(batch_job.id) or [])
+    return results, statuses
+
+
+def print_report(results, elapsed, stats_before, stats_after):
+    latencies = [r["latency"] for r in results]
+    ok = sum(1 for r in results if r["outcome"] == "ok")
+    invalid = sum(1 for r in results if r["outcome"] == "invalid")
+    errors = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+
+    print("\n=== 压测结果 ===")
+    print(f"请求数: {len(results)}，成功: {ok}，结果不完整: {invalid}，失败: {len(results) - ok - invalid}")
+    print(f"总耗时: {elapsed:.2f}s")
+    print(f"吞吐量: {len(results) / elapsed:.2f} 请求/秒，{sum(r['items'] for r in results) / elapsed:.1f} 条目/秒")
+    if stats_before is not None and stats_after is not None:
+        tokens = (stats_after["prompt_tokens"] - stats_before["prompt_tokens"]
+                  + stats_after["completion_tokens"] - stats_before["completion_tokens"])
+        print(f"Token吞吐: {tokens / elapsed:.0f} token/秒（服务端统计）")
+        print(f"服务端请求: {stats_after['requests'] - stats_before['requests']}，"
+              f"429: {stats_after['rate_limited'] - stats_before['rate_limited']}，"
+              f"5xx: {stats_after['server_errors'] - stats_before['server_errors']}，"
+              f"截断: {stats_after['truncated'] - stats_before['truncated']}，"
+              f"非法JSON: {stats_after['malformed'] - stats_before['malformed']}")
+    print(f"延迟 p50: {percentile(latencies, 50) * 1000:.0f}ms  p95: {percentile(latencies, 95) * 1000:.0f}ms  "
+          f"p99: {percentile(latencies, 99) * 1000:.0f}ms  max: {max(latencies, default=0) * 1000:.0f}ms")
+    if errors:
+        print("错误类型: " + ", ".join(f"{name}×{count}" for name, count in sorted(errors.items())))
+
+
+def main():
+    parser = mock_openai_server.build_arg_parser()
+    parser.description = "用真实客户端代码对模拟服务器（或指定地址）做压力测试"
+    parser.add_argument('--base-url', type=str, help='已运行的服务地址（如 http://127.0.0.1:8765/v1），不指定则在进程内启动模拟服务器')
+    parser.add_argument('--client-type', type=str, default='openai', choices=['openai', 'siliconflow'], help='使用的客户端类型，默认openai')
+    parser.add_argument('--model', type=str, default='mock-model', help='模型名称，默认mock-model')
+    parser.add_argument('--api-key', type=str, default='mock-key', help='API密钥，默认mock-key')
+    parser.add_argument('--requests', type=int, default=200, help='请求数，默认200')
+    parser.add_argument('--group-size', type=int, default=20, help='每个请求的条目数，默认20')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发数，默认8')
+    parser.add_argument('--max-retries', type=int, default=3, help='每个请求的最大重试次数，默认3')
+    parser.add_argument('--batch', action='store_true', help='通过批量API（/files + /batches）提交，而不是逐个请求')
+    parser.add_argument('--batch-max-requests', type=int, default=50000, help='批量API单个输入文件的最大请求数，超过时拆分为多个作业')
+    args = parser.parse_args()
+    args.port = 0 if args.base_url is None else args.port
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = mock_openai_server.start_server(args)
+        print(f"已在进程内启动模拟服务器: {base_url}")
+
+    api_url = base_url if args.client_type == 'openai' else base_url.rstrip('/') + "/chat/completions"
+    client = APIClientFactory.create_client({
+        "name": "压测", "api_url": api_url, "api_key": args.api_key,
+        "model": args.model, "client_type": args.client_type, "temperature": 1.3,
+        "supports_batch": True, "batch_max_requests": args.batch_max_requests,
+    })
+
+    groups = build_workload(args.requests, args.group_size)
+    print(f"共 {len(groups)} 个请求，每个最多 {args.group_size} 条，并发 {args.concurrency}")
+
+    stats_before = _fetch_stats(base_url)
+    start = time.perf_counter()
+    if args.batch:
+        if args.client_type != 'openai':
+            parser.error("--batch 只支持 openai 客户端")
+        batch_results, statuses = run_batch(client, groups)
+        elapsed = time.perf_counter() - start
+        print(f"\n批量作业 {len(statuses)} 个，状态: {', '.join(str(getattr(s, 'status', None)) for s in statuses)}，"
+              f"取回 {len(batch_results)} 条结果，总耗时 {elapsed:.2f}s，{len(groups) / elapsed:.2f} 请求/秒")
+        counts = [s.request_counts for s in statuses if getattr(s, "request_counts", None)]
+        if counts:
+            print(f"完成: {sum(c.completed for c in counts)}，失败: {sum(c.failed for c in counts)}")
+        if server:
+            server.shutdown()
+        return
+    results = run_load(client, groups, args.concurrency, args.max_retries)
+    elapsed = time.perf_counter() - start
+    stats_after = _fetch_stats(base_url)
+    print_report(results, elapsed, stats_before, stats_after)
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
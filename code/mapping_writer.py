@@ -0,0 +1,101 @@
+"""
+后台写入 mapping.json
+翻译循环每完成一组只在内存中更新映射表并通知写入线程，由写入线程合并多次更新后按时间/条数策略写盘，
+磁盘写入不再阻塞下一次API请求。退出、异常或 Ctrl+C 时 close() 会做最后一次写入，已翻译的结果不会丢失
+"""
+
+import time
+import threading
+from json_io import dumps_json, atomic_write
+
+
+class MappingWriter:
+    """
+    mapping 由调用方修改，修改时需持有 self.lock（序列化期间不能修改），修改后调用 mark_dirty()
+    写入策略：距第一次未写入的修改超过 interval 秒，或未写入的修改达到 max_pending 条时写盘
+    """
+
+    def __init__(self, mapping, path, interval=5.0, max_pending=500):
+        self.mapping = mapping
+        self.path = path
+        self.interval = interval
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._dirty_since = None
+        self._closed = False
+        self.flushes = 0
+        self.write_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="mapping-writer", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, count=1):
+        """通知有 count 条修改等待写入"""
+        if count <= 0:
+            return
+        with self._cond:
+            self._pending += count
+            # 第一条修改开始计时，写入线程据此设定等待超时
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+                self._cond.notify()
+            elif self._pending >= self.max_pending:
+                self._cond.notify()
+
+    def _due(self):
+        if not self._pending:
+            return False
+        return self._pending >= self.max_pending or time.monotonic() - self._dirty_since >= self.interval
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._due():
+                    timeout = None if self._dirty_since is None else \
+                        max(self.interval - (time.monotonic() - self._dirty_since), 0.01)
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # 写入失败（磁盘满、权限等）时保留修改，稍后重试，close() 时还会再写一次
+                print(f"[警告] 写入 {self.path} 失败: {e}")
+                time.sleep(self.interval)
+
+    def flush(self):
+        """立即写出当前的映射表（没有未写入的修改时跳过）"""
+        with self._cond:
+            if not self._pending:
+                return False
+            pending, self._pending = self._pending, 0
+            self._dirty_since = None
+        start = time.perf_counter()
+        try:
+            # 只在序列化期间持有锁，写盘时翻译循环可以继续更新映射表
+            with self.lock:
+                data = dumps_json(self.mapping)
+            with atomic_write(self.path, 'wb') as f:
+                f.write(data)
+        except BaseException:
+            self.mark_dirty(pending)
+            raise
+        self.flushes += 1
+        self.write_seconds += time.perf_counter() - start
+        return True
+
+    def close(self):
+        """停止写入线程并写出剩余的修改"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
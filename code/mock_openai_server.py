@@ -0,0 +1,393 @@
+"""
+本地 OpenAI 兼容模拟服务器
+实现 /chat/completions、/files、/batches 接口，用于在不调用真实服务商的情况下做吞吐量和压力测试。
+可配置延迟分布，并按比例注入 429/5xx 错误、截断输出和格式错误的JSON。
+
+python mock_openai_server.py --port 8765 --latency lognormal:-1.5,0.6 --rate-429 0.05
+之后将服务商的 api_url 设为 http://127.0.0.1:8765/v1（openai客户端）
+或 http://127.0.0.1:8765/v1/chat/completions（siliconflow客户端）
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from synthetic_library import translate_name
+
+_decoder = json.JSONDecoder()
+
+
+def parse_latency(spec):
+    """
+    解析延迟分布，返回无参函数，每次调用得到一个延迟秒数
+    fixed:0.2 / uniform:0.1,0.5 / lognormal:mu,sigma（sigma为对数标准差）/ none
+    """
+    if not spec or spec == "none":
+        return lambda: 0.0
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(values[0], values[1])
+    raise ValueError(f"不支持的延迟分布: {spec}")
+
+
+def count_tokens(text):
+    """粗略估算token数：ASCII字符约4个一个token，其余字符每个一个token"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+class MockState:
+    """服务器配置、上传的文件、批量作业及统计数据"""
+
+    def __init__(self, args):
+        self.latency = parse_latency(args.latency)
+        self.output_tps = args.output_tps
+        self.rate_429 = args.rate_429
+        self.rate_5xx = args.rate_5xx
+        self.rate_truncate = args.rate_truncate
+        self.rate_malformed = args.rate_malformed
+        self.batch_delay = args.batch_delay
+        self.cache_min_tokens = args.cache_min_tokens
+        # 已见过的提示词前缀（除最后一条消息外的全部消息），模拟服务商的前缀缓存
+        self.prefix_cache = set()
+        self.slots = threading.BoundedSemaphore(args.max_concurrency) if args.max_concurrency else None
+        self.lock = threading.Lock()
+        self.files = {}
+        self.batches = {}
+        self.stats = {
+            "requests": 0, "completed": 0, "rate_limited": 0, "server_errors": 0,
+            "truncated": 0, "malformed": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+        }
+
+    def count(self, **deltas):
+        with self.lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def cached_prefix_tokens(self, prefix_text):
+        """前缀此前出现过且足够长时返回命中缓存的token数，否则记录该前缀并返回0"""
+        tokens = count_tokens(prefix_text)
+        if tokens < self.cache_min_tokens:
+            return 0
+        with self.lock:
+            if prefix_text in self.prefix_cache:
+                return tokens
+            self.prefix_cache.add(prefix_text)
+        return 0
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+
+def _translate_items(messages):
+    """从最后一条用户消息中取出条目列表并生成假翻译"""
+    content = ""
+    for message in messages:
+        if message.get("role") == "user":
+            content = message.get("content", "")
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content)
+    # 从后往前找到第一个能解析为条目列表的JSON数组（提示词中的示例也是同样格式）
+    items = None
+    pos = content.rfind('[')
+    while pos != -1 and items is None:
+        try:
+            value, _ = _decoder.raw_decode(content, pos)
+            if isinstance(value, list) and value and all(isinstance(v, dict) and "id" in v for v in value):
+                items = value
+        except json.JSONDecodeError:
+            pass
+        pos = content.rfind('[', 0, pos)
+    if items is None:
+        return {"status": "ok", "message": "测试成功"}
+    return {str(item.get("id")): translate_name(str(item.get("text", ""))) for item in items}
+
+
+def complete(state, body, inject_faults=True):
+    """
+    处理一次 chat completion 请求
+    返回 (HTTP状态码, 响应体dict)
+    """
+    roll = random.random() if inject_faults else 1.0
+    if roll < state.rate_429:
+        state.count(rate_limited=1)
+        return 429, {"error": {"message": "Rate limit exceeded (mock)", "type": "rate_limit_error", "code": "rate_limit"}}
+    roll -= state.rate_429
+    if roll < state.rate_5xx:
+        state.count(server_errors=1)
+        return random.choice([500, 502, 503]), {"error": {"message": "Internal error (mock)", "type": "server_error"}}
+
+    messages = body.get("messages", [])
+    content = json.dumps(_translate_items(messages), ensure_ascii=False)
+    texts = [
+        m["content"] if isinstance(m.get("content"), str)
+        else "".join(p.get("text", "") for p in m.get("content") or [])
+        for m in messages
+    ]
+    prompt_tokens = count_tokens("".join(texts))
+    cached_tokens = min(state.cached_prefix_tokens("\x00".join(texts[:-1])), prompt_tokens) if len(texts) > 1 else 0
+    completion_tokens = count_tokens(content)
+    finish_reason = "stop"
+
+    fault = random.random() if inject_faults else 1.0
+    if fault < state.rate_truncate:
+        content = content[:max(1, len(content) // 2)]
+        completion_tokens = count_tokens(content)
+        finish_reason = "length"
+        state.count(truncated=1)
+    elif fault < state.rate_truncate + state.rate_malformed:
+        content = "以下是翻译结果：" + content.replace('"', "'")
+        state.count(malformed=1)
+
+    state.count(completed=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached_tokens)
+    return 200, {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock-model"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason,
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+    }
+
+
+def run_batch(state, batch_id):
+    """在后台线程中执行批量作业"""
+    with state.lock:
+        batch = state.batches[batch_id]
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        input_file = state.files.get(batch["input_file_id"])
+    time.sleep(state.batch_delay)
+
+    output_lines, error_lines = [], []
+    lines = input_file["content"].decode("utf-8").splitlines() if input_file else []
+    for line in lines:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        status, body = complete(state, request.get("body", {}))
+        record = {
+            "id": f"batch_req_{uuid.uuid4().hex[:16]}",
+            "custom_id": request.get("custom_id"),
+            "response": {"status_code": status, "request_id": uuid.uuid4().hex, "body": body},
+            "error": None,
+        }
+        if status == 200:
+            # 与通义千问/OpenAI的批量结果格式一致：结果只在 response.body 中
+            output_lines.append(record)
+        else:
+            record["error"] = body.get("error")
+            error_lines.append(record)
+
+    def store(records, prefix):
+        if not records:
+            return None
+        file_id = f"file-{prefix}-{uuid.uuid4().hex[:12]}"
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        state.files[file_id] = {"id": file_id, "filename": f"{prefix}.jsonl", "purpose": "batch_output", "content": data}
+        return file_id
+
+    with state.lock:
+        batch["output_file_id"] = store(output_lines, "output")
+        batch["error_file_id"] = store(error_lines, "error")
+        batch["request_counts"] = {
+            "total": len(output_lines) + len(error_lines),
+            "completed": len(output_lines),
+            "failed": len(error_lines),
+        }
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass  # 压测时不逐条打印请求日志
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _path(self):
+        return self.path.split("?", 1)[0].rstrip("/")
+
+    def do_GET(self):
+        path = self._path()
+        if path.endswith("/stats"):
+            return self._send(200, self.state.snapshot())
+        m = re.search(r'/files/([^/]+)/content$', path)
+        if m:
+            file = self.state.files.get(m.group(1))
+            if not file:
+                return self._send(404, {"error": {"message": "file not found"}})
+            return self._send(200, file["content"], "application/octet-stream")
+        m = re.search(r'/batches/([^/]+)$', path)
+        if m:
+            with self.state.lock:
+                batch = self.state.batches.get(m.group(1))
+                batch = dict(batch) if batch else None
+            if not batch:
+                return self._send(404, {"error": {"message": "batch not found"}})
+            return self._send(200, batch)
+        self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+    def do_POST(self):
+        path = self._path()
+        raw = self._read_body()
+        if path.endswith("/chat/completions"):
+            return self._chat(raw)
+        if path.endswith("/files"):
+            return self._upload(raw)
+        if path.endswith("/batches"):
+            return self._create_batch(raw)
+        m = re.search(r'/batches/([^/]+)/cancel$', path)
+        if m:
+            with self.state.lock:
+                batch = self.state.batches.get(m.group(1))
+                if batch:
+                    batch["status"] = "cancelled"
+            return self._send(200 if batch else 404, batch or {"error": {"message": "batch not found"}})
+        self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+    def _chat(self, raw):
+        state = self.state
+        state.count(requests=1)
+        if state.slots and not state.slots.acquire(blocking=False):
+            state.count(rate_limited=1)
+            return self._send(429, {"error": {"message": "Too many concurrent requests (mock)", "type": "rate_limit_error"}})
+        try:
+            try:
+                body = json.loads(raw or b"{}")
+            except json.JSONDecodeError:
+                return self._send(400, {"error": {"message": "invalid JSON body"}})
+            status, response = complete(state, body)
+            delay = state.latency()
+            if status == 200 and state.output_tps:
+                delay += response["usage"]["completion_tokens"] / state.output_tps
+            time.sleep(delay)
+            self._send(status, response)
+        finally:
+            if state.slots:
+                state.slots.release()
+
+    def _upload(self, raw):
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=default_policy).parsebytes(header + raw)
+        content, filename, purpose = b"", "upload.jsonl", "batch"
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                content = part.get_payload(decode=True) or b""
+                filename = part.get_filename() or filename
+            elif name == "purpose":
+                purpose = part.get_content().strip()
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        record = {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        }
+        self.state.files[file_id] = dict(record, content=content)
+        self._send(200, record)
+
+    def _create_batch(self, raw):
+        body = json.loads(raw or b"{}")
+        if body.get("input_file_id") not in self.state.files:
+            return self._send(400, {"error": {"message": "input file not found"}})
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint", "/v1/chat/completions"),
+            "errors": None, "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"), "status": "validating",
+            "output_file_id": None, "error_file_id": None, "created_at": int(time.time()),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": body.get("metadata"),
+        }
+        with self.state.lock:
+            self.state.batches[batch_id] = batch
+        threading.Thread(target=run_batch, args=(self.state, batch_id), daemon=True).start()
+        self._send(200, dict(batch))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟服务器")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址，默认127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口，默认8765，0表示随机端口')
+    parser.add_argument('--latency', type=str, default='lognormal:-1.5,0.5',
+                        help='延迟分布：none / fixed:秒 / uniform:最小,最大 / lognormal:mu,sigma，默认 lognormal:-1.5,0.5')
+    parser.add_argument('--output-tps', type=float, default=0, help='模拟输出速度（token/秒），0表示不额外延迟')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='返回429的比例')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='返回5xx的比例')
+    parser.add_argument('--rate-truncate', type=float, default=0.0, help='输出被截断的比例')
+    parser.add_argument('--rate-malformed', type=float, default=0.0, help='输出非法JSON的比例')
+    parser.add_argument('--max-concurrency', type=int, default=0, help='同时处理的请求上限，超出时返回429，0表示不限')
+    parser.add_argument('--cache-min-tokens', type=int, default=1024,
+                        help='前缀达到该token数才会被缓存（与常见服务商一致），默认1024')
+    parser.add_argument('--batch-delay', type=float, default=1.0, help='批量作业开始处理前的等待秒数，默认1')
+    return parser
+
+
+def start_server(args, host=None, port=None):
+    """在后台线程中启动服务器，返回 (server, base_url)"""
+    server = ThreadingHTTPServer((host or args.host, args.port if port is None else port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(args)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address, bound_port = server.server_address[:2]
+    return server, f"http://{address}:{bound_port}/v1"
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(args)
+    address, port = server.server_address[:2]
+    print(f"模拟服务器已启动: http://{address}:{port}/v1")
+    print(f"统计信息: http://{address}:{port}/v1/stats")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+翻译请求的提示词
+auto_translate_mapping.py 的常规翻译、批量API、token估算共用同一份提示词。
+消息按 固定前缀（系统提示词 + 说明 + 术语表 + 示例对话）→ 本次条目 排列，
+每个请求的前缀完全相同，服务商可以缓存前缀部分（命中缓存的输入token更便宜、首token延迟更低）
+"""
+
+import json
+
+SYSTEM_PROMPT = "你是专业的音效术语翻译助手，请将英文音效术语翻译为中文。"
+
+INSTRUCTIONS = (
+    "请将用户发送的音效条目的text字段从英文翻译为中文，保持同类条目风格一致。\n"
+    "翻译为中文。保证翻译后的中文的每一个词汇用下划线分割，不使用空格。如遇某些无法翻译的词语或缩写，就保留\n"
+    "输出格式：JSON字典，key为id，value为翻译后的中文"
+)
+
+# 示例对话（作为固定前缀的一部分，不随条目变化）
+# id 不用数字，模型照抄示例时不会与真实条目的id重合
+FEW_SHOT_EXAMPLES = [
+    ([("ex1", "WeaponSword_Wooden Hit_JSE")], {"ex1": "武器_剑_木制_击打_JSE"}),
+    ([("ex2", "DoorCreak_Old Wood 02"), ("ex3", "Whoosh_Fast_Short_SSL")],
+     {"ex2": "门_吱嘎声_旧_木头_02", "ex3": "呼啸_快速_短_SSL"}),
+]
+
+
+def _items_json(block):
+    return json.dumps([{"id": k, "text": v} for k, v in block], ensure_ascii=False)
+
+
+def build_glossary(words, limit=300):
+    """
+    把 {英文: 中文} 词典整理成术语表文本，按英文排序保证每次生成的前缀相同
+    limit: 最多收录的词条数，避免前缀过长
+    """
+    if not words:
+        return ""
+    lines = [f"{k}: {v}" for k, v in sorted(words.items())[:limit]]
+    return "术语表（请优先使用以下译法）：\n" + "\n".join(lines)
+
+
+def build_prefix_messages(glossary=""):
+    """固定前缀：系统提示词、说明、术语表和示例对话"""
+    system = SYSTEM_PROMPT + "\n\n" + INSTRUCTIONS
+    if glossary:
+        system += "\n\n" + glossary
+    messages = [{"role": "system", "content": system}]
+    for block, output in FEW_SHOT_EXAMPLES:
+        messages.append({"role": "user", "content": _items_json(block)})
+        messages.append({"role": "assistant", "content": json.dumps(output, ensure_ascii=False)})
+    return messages
+
+
+def build_translation_messages(block, glossary="", cache_hint=False):
+    """
+    block: [(id, original), ...]
+    glossary: build_glossary 生成的术语表，为空时不附加
+    cache_hint: 在前缀最后一条消息上加 cache_control 标记（通义千问显式缓存等支持该字段的服务商使用）
+    返回发送给API的messages
+    """
+    messages = build_prefix_messages(glossary)
+    if cache_hint:
+        last = messages[-1]
+        last["content"] = [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]
+    messages.append({"role": "user", "content": _items_json(block)})
+    return messages
@@ -1,7 +1,8 @@
 import os
-import json
-import shutil
+import argparse
 from dotenv import load_dotenv
+from json_stream import iter_joined
+from rename_journal import RenameJournal, pending_renames
 
 def find_file_by_id(tree, target_id, parent_path=""):
     for key, value in tree.items():
@@ -14,43 +15,251 @@ def find_file_by_id(tree, target_id, parent_path=""):
                 return result
     return None
 
-def main():
-    load_dotenv()
-    # 读取结构和映射文件
-    with open("./json/structure.json", "r", encoding="utf-8") as f:
-        tree = json.load(f)
-    with open("./json/mapping.json", "r", encoding="utf-8") as f:
-        mapping = json.load(f)
-    base_dir = os.environ.get("SFX_DIR")
-    if not base_dir:
-        raise RuntimeError("请在 .env 文件中设置 SFX_DIR 环境变量！")
-    rename_count = 0
-    for file_id, info in mapping.items():
-        translation = info.get("translation", "").strip()
+def rename_files(base_dir, structure_path, mapping_path, preview=False):
+    """按映射表重命名 base_dir 下的文件，返回成功重命名的数量"""
+    # 流式合并结构和映射文件，不把整棵树载入内存
+    return len(rename_records(base_dir, iter_joined(structure_path, mapping_path), preview))
+
+class RenameMove:
+    """一个文件的重命名：同一目录内 src → dst"""
+    __slots__ = ('file_id', 'dir_rel', 'src', 'target', 'dst', 'suffixed', 'via_temp')
+
+    def __init__(self, file_id, dir_rel, src, target):
+        self.file_id = file_id
+        self.dir_rel = dir_rel
+        self.src = src
+        self.target = target  # 翻译得到的文件名
+        self.dst = target  # 解决重名后的最终文件名
+        self.suffixed = False
+        self.via_temp = False
+
+class RenamePlan:
+    """
+    完整的重命名计划
+    moves: 每个文件的重命名；steps: 按执行顺序排列的 (目录, 原名, 新名)，包含经过临时名的中间步骤
+    skipped: (id, 原因)
+    """
+
+    def __init__(self):
+        self.moves = []
+        self.steps = []
+        self.skipped = []
+
+    def summary(self):
+        suffixed = sum(1 for m in self.moves if m.suffixed)
+        via_temp = sum(1 for m in self.moves if m.via_temp)
+        return (f"重命名计划: {len(self.moves)} 个文件（重名加后缀 {suffixed} 个，"
+                f"目标被其他待重命名文件占用、经临时名 {via_temp} 个），跳过 {len(self.skipped)} 个")
+
+    def preview(self, limit=None):
+        """预览文本：每个文件的 原路径 -> 新路径，以及重名后缀和临时名标记"""
+        lines = [self.summary()]
+        for m in self.moves[:limit]:
+            notes = []
+            if m.suffixed:
+                notes.append(f"重名，原目标 {m.target}")
+            if m.via_temp:
+                notes.append("经临时名")
+            note = f"  [{'，'.join(notes)}]" if notes else ""
+            lines.append(f"  {os.path.join(m.dir_rel, m.src)} -> {m.dst}{note}")
+        if limit is not None and len(self.moves) > limit:
+            lines.append(f"  ... 另有 {len(self.moves) - limit} 个")
+        return "\n".join(lines)
+
+def _id_key(file_id):
+    return (0, int(file_id), "") if file_id.isdigit() else (1, 0, file_id)
+
+def _renamed_by_journal(base_dir):
+    """
+    按重命名日志推算已经改过名的文件：返回 ({(目录, 原名): 当前名}, {(目录, 当前名): 原名})，名字均经过 normcase
+    日志中经过临时名的多步改名合并为一条；没有日志时返回两个空字典
+    """
+    current_of, origin_of = {}, {}
+    for entry in pending_renames(base_dir) or []:
+        dir_rel, src, dst = entry["dir"], entry["src"], entry["dst"]
+        origin = origin_of.pop((dir_rel, os.path.normcase(src)), src)
+        origin_of[(dir_rel, os.path.normcase(dst))] = origin
+    for (dir_rel, name), origin in origin_of.items():
+        current_of[(dir_rel, os.path.normcase(origin))] = name
+    return current_of, origin_of
+
+def plan_renames(base_dir, records, journal=True):
+    """
+    按映射表生成完整的重命名计划，不改动任何文件
+    - 每个目录只列一次文件，用集合检测冲突（按 os.path.normcase 比较，Windows 上不区分大小写）
+    - 多个文件翻译成同一个名字，或目标名已被不改名的文件占用时，按id顺序依次加后缀 _2、_3…
+    - 目标名正被另一个待重命名的文件占用（链式 A→B、B→C 或循环 A→B、B→A）时，先移到临时名，
+      其他文件改名后再移到最终名
+    - 重复运行不会再次改名：按重命名日志找到已改过名的文件的当前名字，当前名已是目标名（含后缀）时跳过，
+      翻译修改过的从当前名改到新目标；某个原名已被另一个文件改名占用时也不会把它当成该id的文件。
+      日志丢失时，原名正是另一个已改名（原文件不存在）记录的目标名的文件同样跳过
+    - journal 为False（不写日志）时无法识别已改过名的文件，原名是其他记录目标名的文件一律跳过，不处理链式和循环改名
+    """
+    plan = RenamePlan()
+    listings = {}
+    current_of, origin_of = _renamed_by_journal(base_dir) if journal else ({}, {})
+
+    def listing(dir_rel):
+        names = listings.get(dir_rel)
+        if names is None:
+            try:
+                names = {os.path.normcase(n): n for n in os.listdir(os.path.join(base_dir, dir_rel) or '.')}
+            except FileNotFoundError:
+                names = {}
+            listings[dir_rel] = names
+        return names
+
+    def is_target_name(name, target):
+        """name 是否为 target 或加了重名后缀的 target"""
+        stem, ext = os.path.splitext(os.path.normcase(target))
+        name_stem, name_ext = os.path.splitext(os.path.normcase(name))
+        if name_ext != ext:
+            return False
+        if name_stem == stem:
+            return True
+        head, _, n = name_stem.rpartition("_")
+        return head == stem and n.isdigit()
+
+    by_dir = {}
+    # 目录 → 可能已被改名占用的目标名：有日志时只算原文件已不存在的记录的目标名，不写日志时算所有记录的目标名
+    vacated_targets = {}
+    for file_id, rel_path, ext_from_tree, _, translation in records:
+        translation = (translation or "").strip()
         if not translation:
             continue  # 跳过未填写翻译的
-        result = find_file_by_id(tree, file_id)
-        if not result:
-            print(f"未找到id: {file_id}")
+        if rel_path is None:
+            plan.skipped.append((file_id, "结构中没有该id"))
             continue
-        rel_path, ext_from_tree = result
-        abs_path = os.path.normpath(os.path.join(base_dir, rel_path))
-        if not os.path.isfile(abs_path):
-            print(f"未找到文件: {abs_path}")
+        dir_rel, src = os.path.split(rel_path)
+        target = translation + ext_from_tree
+        names = listing(dir_rel)
+        current = current_of.get((dir_rel, os.path.normcase(src)))
+        if current is not None and current in names:
+            # 日志记录该文件已改名，以日志中的当前名为准
+            if is_target_name(current, target):
+                plan.skipped.append((file_id, "已重命名"))
+                continue
+            src = names[current]
+        elif (dir_rel, os.path.normcase(src)) in origin_of:
+            plan.skipped.append((file_id, f"{rel_path} 已被另一个文件改名占用"))
             continue
-        dir_name = os.path.dirname(abs_path)
-        new_path = os.path.join(dir_name, translation + ext_from_tree)
-        if abs_path == new_path:
+        if src == target:
             continue  # 已是目标名
-        if os.path.exists(new_path):
-            print(f"目标已存在，跳过: {new_path}")
+        if not journal:
+            vacated_targets.setdefault(dir_rel, set()).add(os.path.normcase(target))
+        if os.path.normcase(src) not in names:
+            if os.path.normcase(target) in names:
+                vacated_targets.setdefault(dir_rel, set()).add(os.path.normcase(target))
+                plan.skipped.append((file_id, "已是目标名"))
+            else:
+                plan.skipped.append((file_id, f"未找到文件: {rel_path}"))
             continue
-        try:
-            shutil.move(abs_path, new_path)
-            print(f"重命名: {abs_path} -> {new_path}")
-            rename_count += 1
-        except Exception as e:
-            print(f"重命名失败: {abs_path} -> {new_path}, 错误: {e}")
+        by_dir.setdefault(dir_rel, []).append(RenameMove(file_id, dir_rel, src, target))
+
+    for dir_rel, vacated in vacated_targets.items():
+        kept = []
+        for m in by_dir.get(dir_rel, []):
+            src = os.path.normcase(m.src)
+            if src in vacated and src != os.path.normcase(m.target) and (dir_rel, src) not in origin_of:
+                plan.skipped.append((m.file_id, f"{os.path.join(dir_rel, m.src)} 可能是已重命名的其他文件"))
+            else:
+                kept.append(m)
+        by_dir[dir_rel] = kept
+
+    temps, directs = [], []
+    for dir_rel, moves in by_dir.items():
+        names = listing(dir_rel)
+        leaving = {os.path.normcase(m.src) for m in moves}
+        taken = set(names) - leaving  # 不改名的文件占用的名字
+        moves.sort(key=lambda m: _id_key(m.file_id))
+        for m in moves:
+            stem, ext = os.path.splitext(m.target)
+            dst, n = m.target, 1
+            while os.path.normcase(dst) in taken:
+                n += 1
+                dst = f"{stem}_{n}{ext}"
+            taken.add(os.path.normcase(dst))
+            m.dst, m.suffixed = dst, n > 1
+            # 目标名当前仍被待改名的文件占用（包括只改大小写的自身），需要经过临时名
+            m.via_temp = os.path.normcase(dst) in leaving
+            plan.moves.append(m)
+            if m.via_temp:
+                temp = f".{stem}.{m.file_id}.sfxtmp{ext}"
+                while os.path.normcase(temp) in names or os.path.normcase(temp) in taken:
+                    temp = "." + temp
+                taken.add(os.path.normcase(temp))
+                temps.append((m, temp))
+            else:
+                directs.append(m)
+
+    # 第一步：被占用目标的文件先移到临时名；第二步：目标空闲的直接改名；第三步：临时名移到最终名
+    plan.steps += [(m.dir_rel, m.src, temp) for m, temp in temps]
+    plan.steps += [(m.dir_rel, m.src, m.dst) for m in directs]
+    plan.steps += [(m.dir_rel, temp, m.dst) for m, temp in temps]
+    return plan
+
+def execute_plan(base_dir, plan, verbose=True, journal=True):
+    """
+    按顺序执行重命名计划，返回完成最终改名的文件 {id: 新的相对路径}（含重名后缀）；出错时停止并提示残留的临时文件
+    journal: 先把每一步追加到重命名日志并落盘再改名，之后可用 restore 按日志撤销
+    """
+    final = {(m.dir_rel, m.dst): m.file_id for m in plan.moves}
+    renamed = {}
+    log = RenameJournal(base_dir) if journal and plan.steps else None
+    try:
+        steps = plan.steps
+        chunk = log.sync_every if log else len(steps) or 1
+        for i in range(0, len(steps), chunk):
+            batch = steps[i:i + chunk]
+            if log:
+                for dir_rel, src, dst in batch:
+                    log.log(dir_rel, src, dst)
+                log.sync()
+            for dir_rel, src, dst in batch:
+                src_path = os.path.join(base_dir, dir_rel, src)
+                dst_path = os.path.join(base_dir, dir_rel, dst)
+                try:
+                    os.rename(src_path, dst_path)
+                except OSError as e:
+                    print(f"重命名失败: {src_path} -> {dst_path}, 错误: {e}")
+                    print("已停止执行，目录中可能残留 .sfxtmp 临时文件，请检查后重新运行（或用 restore 按日志撤销）")
+                    return renamed
+                if (dir_rel, dst) in final:
+                    renamed[final[(dir_rel, dst)]] = os.path.join(dir_rel, dst)
+                    if verbose:
+                        print(f"重命名: {src_path} -> {dst_path}")
+    finally:
+        if log:
+            log.close()
+    return renamed
+
+def rename_records(base_dir, records, preview=False, journal=True):
+    """
+    records: (id, rel_path, ext, original, translation)，rel_path 为None表示结构中没有该id
+    先生成完整计划再执行；preview 为True时只打印计划
+    返回成功重命名的文件 {id: 新的相对路径}
+    """
+    plan = plan_renames(base_dir, records, journal)
+    for file_id, reason in plan.skipped:
+        print(f"跳过 {file_id}: {reason}")
+    if preview:
+        print(plan.preview())
+        return {}
+    print(plan.summary())
+    return execute_plan(base_dir, plan, journal=journal)
+
+def main():
+    parser = argparse.ArgumentParser(description="按 mapping.json 的翻译重命名音效文件")
+    parser.add_argument("--preview", action="store_true", help="只打印重命名计划，不改动文件")
+    args = parser.parse_args()
+
+    load_dotenv()
+    base_dir = os.environ.get("SFX_DIR")
+    if not base_dir:
+        raise RuntimeError("请在 .env 文件中设置 SFX_DIR 环境变量！")
+    rename_count = rename_files(base_dir, "./json/structure.json", "./json/mapping.json", args.preview)
+    if args.preview:
+        return
     print(f"完成，成功重命名 {rename_count} 个文件。")
 
 if __name__ == "__main__":
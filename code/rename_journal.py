@@ -0,0 +1,157 @@
+"""
+重命名日志
+rename_by_map.py 每次改名前先把操作追加到音效目录下的 .sfx_rename_journal.jsonl 并 fsync（先写日志再改名），
+撤销时倒序重放日志，只处理真正改过名的文件，不需要按映射表逐条推算路径和探测文件系统。
+撤销过程中定期追加检查点，中断后再次撤销会从检查点继续；全部撤销后日志归档为 .done
+"""
+
+import os
+import json
+import time
+
+JOURNAL_FILE = ".sfx_rename_journal.jsonl"
+
+# 每写入多少条记录 fsync 一次（这一批记录落盘后才执行对应的改名）
+SYNC_EVERY = 256
+
+
+def journal_path(base_dir):
+    return os.path.join(base_dir, JOURNAL_FILE)
+
+
+def _read_entries(path):
+    """逐行读取日志，跳过崩溃时写了一半的最后一行"""
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def _last_seq(path):
+    """读取日志末尾的最后一个序号，不扫描整个文件"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        chunk = 4096
+        while True:
+            start = max(0, size - chunk)
+            f.seek(start)
+            lines = f.read(size - start).splitlines()
+            # 最前面一行可能不完整，除非已经读到文件开头
+            for line in reversed(lines if start == 0 else lines[1:]):
+                try:
+                    return json.loads(line)["seq"]
+                except (ValueError, KeyError):
+                    continue
+            if start == 0:
+                return 0
+            chunk *= 4
+
+
+class RenameJournal:
+    """
+    只追加的重命名日志，每行一条JSON：
+    - {"seq": n, "dir": 目录, "src": 原名, "dst": 新名}：一次改名（dir 相对于音效目录）
+    - {"seq": n, "undone": m}：撤销检查点，表示此前序号 ≥ m 的改名都已撤销
+    log() 返回前记录不一定已落盘，调用方在执行改名前调用 sync()
+    """
+
+    def __init__(self, base_dir, sync_every=SYNC_EVERY):
+        self.path = journal_path(base_dir)
+        self.sync_every = sync_every
+        self.seq = _last_seq(self.path) if os.path.exists(self.path) else 0
+        self._file = open(self.path, 'ab')
+        # 上次崩溃留下不完整的最后一行时先补换行，避免和新记录连在一起
+        if self._file.tell() > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write(b"\n")
+        self._unsynced = 0
+
+    def _append(self, entry):
+        self.seq += 1
+        entry = {"seq": self.seq, **entry}
+        self._file.write(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b"\n")
+        self._unsynced += 1
+        return self.seq
+
+    def log(self, dir_rel, src, dst):
+        return self._append({"dir": dir_rel, "src": src, "dst": dst})
+
+    def checkpoint(self, undone_seq):
+        self._append({"undone": undone_seq})
+        self.sync()
+
+    def sync(self):
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def pending_renames(base_dir):
+    """返回尚未撤销的改名记录（按序号升序）；没有日志时返回None"""
+    path = journal_path(base_dir)
+    if not os.path.exists(path):
+        return None
+    pending = []
+    for entry in _read_entries(path):
+        if "undone" in entry:
+            # 检查点只作用于写在它之前的记录
+            undone = entry["undone"]
+            while pending and pending[-1]["seq"] >= undone:
+                pending.pop()
+        elif "src" in entry:
+            pending.append(entry)
+    return pending
+
+
+def undo_renames(base_dir, checkpoint_every=SYNC_EVERY, verbose=True):
+    """
+    倒序重放日志撤销改名，返回撤销的数量；没有日志时返回None
+    只有新名存在且原名空闲时才改回，日志中记录了但没来得及执行的改名会被跳过
+    """
+    pending = pending_renames(base_dir)
+    if pending is None:
+        return None
+    undone = 0
+    with RenameJournal(base_dir) as journal:
+        for i, entry in enumerate(reversed(pending), 1):
+            folder = os.path.join(base_dir, entry["dir"])
+            current = os.path.join(folder, entry["dst"])
+            original = os.path.join(folder, entry["src"])
+            if os.path.lexists(current) and not os.path.lexists(original):
+                try:
+                    os.rename(current, original)
+                    undone += 1
+                    if verbose:
+                        print(f"恢复: {current} -> {original}")
+                except OSError as e:
+                    # 停在这里，检查点之后的记录下次继续撤销
+                    print(f"恢复失败: {current} -> {original}, 错误: {e}")
+                    journal.checkpoint(entry["seq"] + 1)
+                    return undone
+            elif os.path.lexists(current):
+                print(f"原始文件已存在，跳过: {original}")
+            if i % checkpoint_every == 0:
+                journal.checkpoint(entry["seq"])
+        if pending:
+            journal.checkpoint(pending[0]["seq"])
+    # 全部撤销后归档日志，之后的重命名从新日志开始
+    path = journal_path(base_dir)
+    os.replace(path, f"{path}.{time.strftime('%Y%m%d%H%M%S')}.done")
+    return undone
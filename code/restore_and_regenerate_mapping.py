@@ -1,7 +1,9 @@
 import os
-import json
 import shutil
 from dotenv import load_dotenv
+from structure_index import StructureIndex
+from json_io import load_json, dump_json
+from rename_journal import undo_renames
 
 def find_file_by_id(tree, target_id, parent_path=""):
     """根据ID在结构树中查找文件的原始路径和扩展名"""
@@ -26,65 +28,60 @@ def extract_original_name_from_path(file_path):
     """从文件路径中提取原始文件名（不含扩展名）"""
     return os.path.splitext(os.path.basename(file_path))[0]
 
-def scan_directory_and_build_mapping(base_dir, tree, old_mapping):
+def scan_directory_and_build_mapping(base_dir, index, old_mapping):
     """扫描目录，构建新的mapping"""
     new_mapping = {}
     
-    def scan_tree_node(node, current_path=""):
-        for key, value in node.items():
-            full_path = os.path.join(current_path, key) if current_path else key
-            abs_path = os.path.join(base_dir, full_path)
-            
-            if isinstance(value, dict) and 'id' in value:
-                # 这是一个文件节点
-                file_id = value['id']
-                ext = value['ext']
-                
-                # 查找实际存在的文件
-                dir_path = os.path.dirname(abs_path)
-                if os.path.exists(dir_path):
-                    # 扫描目录中的所有文件
-                    for filename in os.listdir(dir_path):
-                        file_path = os.path.join(dir_path, filename)
-                        if os.path.isfile(file_path):
-                            name_without_ext = os.path.splitext(filename)[0]
-                            file_ext = os.path.splitext(filename)[1]
-                            
-                            # 检查扩展名是否匹配
-                            if file_ext == ext:
-                                # 检查这个文件名是否在旧mapping中作为translation存在
-                                matched_id = find_id_by_translation(old_mapping, name_without_ext)
-                                if matched_id == file_id:
-                                    # 找到匹配的文件
-                                    original_name = extract_original_name_from_path(key)
-                                    new_mapping[file_id] = {
-                                        "original": original_name,
-                                        "translation": name_without_ext
-                                    }
-                                    break
-                            elif name_without_ext == extract_original_name_from_path(key):
-                                # 文件名已经是原始名称
-                                new_mapping[file_id] = {
-                                    "original": name_without_ext,
-                                    "translation": ""
-                                }
-                                break
-                else:
-                    # 目录不存在，使用原始信息
-                    original_name = extract_original_name_from_path(key)
-                    old_info = old_mapping.get(file_id, {})
-                    new_mapping[file_id] = {
-                        "original": original_name,
-                        "translation": old_info.get("translation", "")
-                    }
-            elif isinstance(value, dict):
-                # 这是一个目录节点，递归处理
-                scan_tree_node(value, full_path)
-    
-    scan_tree_node(tree)
+    # 翻译名称 -> 第一个使用该翻译的ID，代替逐条调用 find_id_by_translation
+    translation_to_id = {}
+    for file_id, info in old_mapping.items():
+        translation_to_id.setdefault(info.get("translation", "").strip(), file_id)
+    
+    for file_id, full_path, ext in index.iter_records():
+        key = os.path.basename(full_path)
+        abs_path = os.path.join(base_dir, full_path)
+        
+        # 查找实际存在的文件
+        dir_path = os.path.dirname(abs_path)
+        if os.path.exists(dir_path):
+            # 扫描目录中的所有文件
+            for filename in os.listdir(dir_path):
+                file_path = os.path.join(dir_path, filename)
+                if os.path.isfile(file_path):
+                    name_without_ext = os.path.splitext(filename)[0]
+                    file_ext = os.path.splitext(filename)[1]
+                    
+                    # 检查扩展名是否匹配
+                    if file_ext == ext:
+                        # 检查这个文件名是否在旧mapping中作为translation存在
+                        matched_id = translation_to_id.get(name_without_ext)
+                        if matched_id == file_id:
+                            # 找到匹配的文件
+                            original_name = extract_original_name_from_path(key)
+                            new_mapping[file_id] = {
+                                "original": original_name,
+                                "translation": name_without_ext
+                            }
+                            break
+                    elif name_without_ext == extract_original_name_from_path(key):
+                        # 文件名已经是原始名称
+                        new_mapping[file_id] = {
+                            "original": name_without_ext,
+                            "translation": ""
+                        }
+                        break
+        else:
+            # 目录不存在，使用原始信息
+            original_name = extract_original_name_from_path(key)
+            old_info = old_mapping.get(file_id, {})
+            new_mapping[file_id] = {
+                "original": original_name,
+                "translation": old_info.get("translation", "")
+            }
+    
     return new_mapping
 
-def restore_files_to_original_names(base_dir, tree, mapping):
+def restore_files_to_original_names(base_dir, index, mapping):
     """将文件恢复为原始名称"""
     restore_count = 0
     
@@ -93,8 +90,8 @@ def restore_files_to_original_names(base_dir, tree, mapping):
         if not translation:
             continue  # 跳过没有翻译的文件
         
-        # 从结构树中找到原始路径
-        result = find_file_by_id(tree, file_id)
+        # 从结构索引中找到原始路径
+        result = index.find(file_id)
         if not result:
             print(f"未找到ID对应的原始路径: {file_id}")
             continue
@@ -126,38 +123,37 @@ def restore_files_to_original_names(base_dir, tree, mapping):
     
     return restore_count
 
-def main():
-    load_dotenv()
-    
-    # 读取结构和映射文件
-    with open("./json/structure.json", "r", encoding="utf-8") as f:
-        tree = json.load(f)
-    with open("./json/mapping.json", "r", encoding="utf-8") as f:
-        old_mapping = json.load(f)
-    
-    base_dir = os.environ.get("SFX_DIR")
-    if not base_dir:
-        raise RuntimeError("请在 .env 文件中设置 SFX_DIR 环境变量！")
-    
+def restore_files(base_dir, index, mapping):
+    """有重命名日志时倒序重放日志撤销，只处理改过名的文件；没有日志时按映射表逐条推算路径"""
+    restore_count = undo_renames(base_dir)
+    if restore_count is not None:
+        return restore_count
+    print("未找到重命名日志，按映射表推算当前文件名")
+    return restore_files_to_original_names(base_dir, index, mapping)
+
+def restore_and_regenerate(base_dir, index, old_mapping, mapping_path):
+    """
+    恢复原始文件名，备份 mapping_path 后写入重新生成的映射表
+    返回新的映射表
+    """
     print("开始恢复文件名...")
     
     # 恢复文件为原始名称
-    restore_count = restore_files_to_original_names(base_dir, tree, old_mapping)
+    restore_count = restore_files(base_dir, index, old_mapping)
     print(f"恢复完成，成功恢复 {restore_count} 个文件。")
     
     print("\n开始重新生成mapping.json...")
     
     # 重新扫描并生成新的mapping
-    new_mapping = scan_directory_and_build_mapping(base_dir, tree, old_mapping)
+    new_mapping = scan_directory_and_build_mapping(base_dir, index, old_mapping)
     
     # 备份原始mapping文件
-    backup_path = "./json/mapping.json.backup"
-    shutil.copy("./json/mapping.json", backup_path)
+    backup_path = mapping_path + ".backup"
+    shutil.copy(mapping_path, backup_path)
     print(f"原始mapping.json已备份到: {backup_path}")
     
     # 保存新的mapping文件
-    with open("./json/mapping.json", "w", encoding="utf-8") as f:
-        json.dump(new_mapping, f, ensure_ascii=False, indent=2)
+    dump_json(new_mapping, mapping_path)
     
     print(f"新的mapping.json已生成，包含 {len(new_mapping)} 个条目")
     
@@ -168,6 +164,20 @@ def main():
     print(f"统计信息:")
     print(f"  - 有翻译的条目: {with_translation}")
     print(f"  - 无翻译的条目: {without_translation}")
+    return new_mapping
+
+def main():
+    load_dotenv()
+    
+    # 读取结构和映射文件
+    index = StructureIndex.load("./json/structure.json")
+    old_mapping = load_json("./json/mapping.json")
+    
+    base_dir = os.environ.get("SFX_DIR")
+    if not base_dir:
+        raise RuntimeError("请在 .env 文件中设置 SFX_DIR 环境变量！")
+    
+    restore_and_regenerate(base_dir, index, old_mapping, "./json/mapping.json")
 
 if __name__ == "__main__":
     main()
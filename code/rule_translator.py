@@ -0,0 +1,159 @@
+"""
+规则预翻译
+很多条目只由厂商代码和常用词组成（Metal_Hit_JSE_MW），不需要调用AI。
+按 config/translation_rules.json 中的词典和正则规则逐词翻译，只有名称中的每个单词都能被规则覆盖时才采用，
+翻译结果在 mapping 中标记 "source": "rules"，这些条目不再参与分组和API请求
+"""
+
+import os
+import re
+import argparse
+from json_io import load_json, dump_json
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "translation_rules.json")
+
+SOURCE_RULES = "rules"
+
+# 名称中的分隔符
+_SEPARATOR_RE = re.compile(r'[_\s\-.]+')
+# 单词切分：大写缩写、单词、数字
+_WORD_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+class RuleTranslator:
+    """
+    rules 的字段：
+    - keep: 原样保留的代码（区分大小写）
+    - keep_patterns: 原样保留的正则（如纯数字、版本号）。不要用它匹配普通单词（如全大写缩写），
+      否则 DOOR SLAM 这类名称会被当作已覆盖，只翻译出一半；厂商代码请逐个列在 keep 中
+    - phrases: 多个单词组成的词组 → 译文，优先于单词匹配
+    - words: 单词 → 译文
+    - patterns: [{"match": 正则, "replace": 替换}]，对整个单词做替换（如 500ms → 500毫秒）
+    """
+
+    def __init__(self, rules=None):
+        rules = rules or {}
+        self.keep = set(rules.get("keep", []))
+        self.keep_patterns = [re.compile(p) for p in rules.get("keep_patterns", [])]
+        self.words = {k.lower(): v for k, v in rules.get("words", {}).items()}
+        self.phrases = {tuple(k.lower().split()): v for k, v in rules.get("phrases", {}).items()}
+        self.max_phrase_len = max((len(k) for k in self.phrases), default=0)
+        self.patterns = [(re.compile(p["match"]), p["replace"]) for p in rules.get("patterns", [])]
+
+    @classmethod
+    def load(cls, path=DEFAULT_RULES_PATH):
+        """读取规则文件，文件不存在时返回None"""
+        if not os.path.exists(path):
+            return None
+        return cls(load_json(path))
+
+    def _fixed(self, token):
+        """保留或正则替换的单词，返回译文，不匹配时返回None"""
+        if token in self.keep:
+            return token
+        for pattern, replace in self.patterns:
+            if pattern.fullmatch(token):
+                return pattern.sub(replace, token)
+        return None
+
+    def _split(self, name):
+        """切分名称，返回单词列表；含有无法识别的字符时返回None"""
+        tokens = []
+        for part in _SEPARATOR_RE.split(name):
+            if not part:
+                continue
+            # 整段命中保留或正则规则时不再切分（500ms 不拆成 500 和 ms）
+            if self._fixed(part) is not None:
+                tokens.append(part)
+                continue
+            words = _WORD_RE.findall(part)
+            if "".join(words) != part:
+                return None
+            tokens.extend(words)
+        return tokens
+
+    def _word(self, token):
+        fixed = self._fixed(token)
+        if fixed is not None:
+            return fixed
+        translation = self.words.get(token.lower())
+        if translation is not None:
+            return translation
+        if any(p.fullmatch(token) for p in self.keep_patterns):
+            return token
+        return None
+
+    def translate(self, name):
+        """规则能覆盖名称中的每个单词时返回译文（单词间用下划线连接），否则返回None"""
+        tokens = self._split(name)
+        if not tokens:
+            return None
+        lowered = [t.lower() for t in tokens]
+        result = []
+        i = 0
+        while i < len(tokens):
+            # 最长词组优先
+            for length in range(min(self.max_phrase_len, len(tokens) - i), 1, -1):
+                phrase = self.phrases.get(tuple(lowered[i:i + length]))
+                if phrase is not None:
+                    result.append(phrase)
+                    i += length
+                    break
+            else:
+                word = self._word(tokens[i])
+                if word is None:
+                    return None
+                result.append(word)
+                i += 1
+        # 全部是原样保留的代码和数字时没有可翻译的内容，交给AI判断
+        if result == tokens:
+            return None
+        return "_".join(result)
+
+    def apply(self, mapping):
+        """翻译 mapping 中未翻译且能被规则覆盖的条目，返回翻译条数"""
+        count = 0
+        for info in mapping.values():
+            if info.get("translation") or not info.get("original"):
+                continue
+            translation = self.translate(info["original"])
+            if translation is not None:
+                info["translation"] = translation
+                info["source"] = SOURCE_RULES
+                count += 1
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用词典和正则规则预翻译 mapping.json，查看规则覆盖率")
+    parser.add_argument("--mapping", type=str, default=os.path.join(os.path.dirname(__file__), "..", "json", "mapping.json"),
+                        help="mapping.json 路径，默认 json/mapping.json")
+    parser.add_argument("--rules", type=str, default=DEFAULT_RULES_PATH, help="规则文件，默认 config/translation_rules.json")
+    parser.add_argument("--apply", action="store_true", help="把规则翻译写回 mapping.json（默认只统计和预览）")
+    parser.add_argument("--show", type=int, default=20, help="预览的条目数，默认20")
+    args = parser.parse_args()
+
+    translator = RuleTranslator.load(args.rules)
+    if translator is None:
+        print(f"规则文件不存在: {args.rules}")
+        return
+    mapping = load_json(args.mapping)
+    pending = [(k, v["original"]) for k, v in mapping.items() if not v.get("translation") and v.get("original")]
+    covered = [(k, original, translator.translate(original)) for k, original in pending]
+    covered = [item for item in covered if item[2] is not None]
+
+    print(f"未翻译条目 {len(pending)} 条，规则可覆盖 {len(covered)} 条"
+          + (f"（{len(covered) / len(pending):.1%}）" if pending else ""))
+    for k, original, translation in covered[:args.show]:
+        print(f"  {k}: {original} -> {translation}")
+
+    if args.apply and covered:
+        for k, _, translation in covered:
+            mapping[k]["translation"] = translation
+            mapping[k]["source"] = SOURCE_RULES
+        dump_json(mapping, args.mapping)
+        print(f"已写回 {args.mapping}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+SFX File Translator 统一入口
+各步骤作为子命令运行，pipeline 在同一进程中依次执行 扫描 → 分组 → 翻译 → 重命名，
+各步骤共享已载入的结构索引和映射表，不重复读取 .env 和 JSON 文件
+"""
+
+import os
+import time
+import argparse
+from workspace import Workspace, ROOT_DIR
+from group_mapping_blocks import STRATEGIES
+from translated_view import LINK_MODES
+
+
+def cmd_scan(ws, args):
+    """扫描音效目录，生成 structure.json 和 mapping.json"""
+    from generate_sfx_json import generate
+    from structure_index import StructureIndex
+    index = StructureIndex()
+    mapping = {}
+    os.makedirs(ws.json_dir, exist_ok=True)
+    count = generate(ws.require_sfx_dir(), ws.structure_path, ws.mapping_path, index, mapping)
+    ws.set_scan_result(index, mapping)
+    print(f"已扫描 {count} 个音频文件，生成 {ws.structure_path} 和 {ws.mapping_path}")
+
+
+def cmd_group(ws, args):
+    """按前缀分组并写出 group.json"""
+    from group_mapping_blocks import group_mapping, format_groups
+    from json_io import dump_json
+    groups = group_mapping(ws.mapping, args.strategy, args.min_group_size, int(args.max_group_items))
+    dump_json(format_groups(groups), ws.group_path)
+    print(f"已分组 {len(groups)} 组，输出到 {ws.group_path}")
+
+
+def cmd_translate(ws, args):
+    """翻译 mapping 中未翻译的条目，返回是否执行了翻译"""
+    import auto_translate_mapping as atm
+
+    provider_id = atm.choose_client(args.provider, args.model, interactive=not args.yes)
+    if not args.dry_run:
+        atm.enable_telemetry(ws.metrics_dir, enabled=not args.no_metrics)
+    atm.configure_prompt(args.rules if args.glossary else None, True if args.prompt_cache else None)
+
+    if not args.no_rules and atm.apply_rules(ws.mapping, args.rules) and not args.dry_run:
+        from json_io import dump_json
+        dump_json(ws.mapping, ws.mapping_path)
+
+    estimator, pricing, model = atm.build_estimator(provider_id, ws.metrics_dir)
+    max_group_items = atm.resolve_group_size(args.max_group_items, ws.mapping, estimator, model)
+    groups = atm.get_grouped_blocks(ws.mapping, args.min_group_size, max_group_items, args.strategy, stream=args.stream)
+    if args.stream:
+        total = atm.count_pending(ws.mapping)
+        print(f"待翻译条目数: {total}，边分组边翻译")
+    else:
+        total = sum(len(g) for g in groups)
+        print(f"待翻译条目数: {total}, 分为 {len(groups)} 组")
+    if not total:
+        return False
+
+    use_batch = args.batch and atm.selected_client.supports_batch()
+    if args.batch and not use_batch:
+        print("❌ 当前客户端不支持批量API，将使用常规翻译")
+
+    if args.stream:
+        atm.print_quick_budget(ws.mapping, total, max_group_items, model, estimator, pricing)
+    else:
+        atm.print_budget(groups, model, estimator, pricing)
+    if args.dry_run:
+        print("\n--dry-run 模式，不执行翻译")
+        return False
+    if not args.yes and input("\n是否继续执行翻译？(y/N): ").strip().lower() != 'y':
+        print("已取消翻译")
+        return False
+
+    controller = atm.build_controller(args.concurrency, args.max_concurrency, not args.no_adaptive, ws.metrics_dir)
+    atm.run_translation(groups, ws.mapping, ws.mapping_path, use_batch=use_batch, save_interval=args.save_interval,
+                        total=total, controller=controller)
+    atm.finish_telemetry(pricing)
+    return True
+
+
+def cmd_rename(ws, args):
+    """按翻译重命名音效文件"""
+    from rename_by_map import rename_records
+    preview = getattr(args, 'preview', False)
+    renamed = rename_records(ws.require_sfx_dir(), ws.iter_joined(), preview)
+    if not preview:
+        print(f"完成，成功重命名 {len(renamed)} 个文件。")
+
+
+def cmd_view(ws, args):
+    """按翻译生成（或增量更新、删除）硬链接视图，不移动原始文件"""
+    from translated_view import build_view, remove_view
+    view_dir = args.view_dir or os.environ.get("SFX_VIEW_DIR")
+    if not view_dir:
+        raise RuntimeError("请使用 --view-dir 指定视图目录，或在 .env 文件中设置 SFX_VIEW_DIR")
+    if args.remove:
+        if remove_view(view_dir):
+            print(f"已删除翻译视图 {view_dir}")
+        return
+    stats = build_view(ws.require_sfx_dir(), view_dir, ws.iter_joined(), args.link, args.workers)
+    print(f"翻译视图 {view_dir}: 新建 {stats['created']}（硬链接 {stats['hard']}，符号链接 {stats['symlink']}），"
+          f"删除 {stats['removed']}，未变 {stats['kept']}，失败 {stats['failed']}")
+
+
+def cmd_restore(ws, args):
+    """恢复原始文件名并重新生成 mapping.json"""
+    from restore_and_regenerate_mapping import restore_and_regenerate
+    new_mapping = restore_and_regenerate(ws.require_sfx_dir(), ws.index, ws.mapping, ws.mapping_path)
+    ws.set_mapping(new_mapping)
+
+
+def cmd_placeholders(ws, args):
+    """按 structure.json 创建空的占位音频文件"""
+    from create_placeholders import create_placeholders_from_records
+    count = create_placeholders_from_records(ws.require_placeholder_dir(), ws.index.iter_records(),
+                                             args.workers, args.sparse_size, args.seed)
+    print(f"占位音频文件创建完成，新建 {count} 个。")
+
+
+def cmd_pipeline(ws, args):
+    """扫描 → 分组 → 翻译 → 重命名"""
+    if args.rescan or not os.path.exists(ws.mapping_path):
+        print("=== 扫描 ===")
+        cmd_scan(ws, args)
+    else:
+        print(f"=== 扫描 ===\n使用已有的 {ws.mapping_path}（重新扫描请加 --rescan，会清空已有翻译）")
+
+    print("\n=== 分组与翻译 ===")
+    translated = cmd_translate(ws, args)
+
+    if args.no_rename:
+        return
+    if not translated and not args.rename_anyway:
+        print("\n未执行翻译，跳过重命名（使用 --rename-anyway 按已有翻译重命名）")
+        return
+    print("\n=== 重命名 ===")
+    cmd_rename(ws, args)
+
+
+def cmd_watch(ws, args):
+    """监视音效目录，新文件到达后增量登记、翻译（可选重命名）"""
+    import auto_translate_mapping as atm
+    from watch_sfx import watch
+    if not os.path.exists(ws.mapping_path):
+        print("=== 首次运行，先全量扫描 ===")
+        cmd_scan(ws, args)
+
+    provider_id = atm.choose_client(args.provider, args.model, interactive=False)
+    atm.enable_telemetry(ws.metrics_dir, enabled=not args.no_metrics)
+    atm.configure_prompt(args.rules if args.glossary else None, True if args.prompt_cache else None)
+    pricing = (atm.selected_client.config.get('pricing') if atm.selected_client else None) or atm.default_pricing(provider_id)
+    # 控制器在各批之间共用，保留已经调整出的并发
+    controller = atm.build_controller(args.concurrency, args.max_concurrency, not args.no_adaptive, ws.metrics_dir)
+
+    def translate_new(new_ids, incremental):
+        started = time.monotonic()
+        entries = {file_id: ws.mapping[file_id] for file_id in new_ids}
+        if not args.no_rules:
+            atm.apply_rules(entries, args.rules)
+        # 新文件数量少，单条也单独成组，不等待凑满分组
+        groups = atm.get_grouped_blocks(entries, 1, int(args.max_group_items), args.strategy)
+        if groups:
+            atm.translate_groups(groups, ws.mapping, ws.mapping_path, args.save_interval, controller=controller)
+        else:
+            from json_io import dump_json
+            dump_json(ws.mapping, ws.mapping_path)
+        if args.rename:
+            from rename_by_map import rename_records
+            records = [(file_id, *ws.index.find(file_id), info.get("original"), info.get("translation"))
+                       for file_id, info in entries.items()]
+            incremental.mark_renamed(rename_records(ws.require_sfx_dir(), records))
+        print(f"本批 {len(new_ids)} 个文件处理完成，耗时 {time.monotonic() - started:.1f}s，继续监视...")
+
+    try:
+        watch(ws, translate_new, debounce=args.debounce, max_wait=args.max_wait, catch_up=not args.no_catch_up)
+    except KeyboardInterrupt:
+        print("\n已停止监视")
+    finally:
+        atm.finish_telemetry(pricing)
+
+
+def _add_group_args(parser):
+    parser.add_argument('--min-group-size', type=int, default=2, help='分组最小条数，默认2')
+    parser.add_argument('--max-group-items', type=str, default='100', help='每组最大条数，默认100（translate/pipeline 可用 auto）')
+    parser.add_argument('--strategy', type=str, default='detailed', choices=STRATEGIES, help='分组策略，默认detailed')
+
+
+def _add_translate_args(parser):
+    _add_group_args(parser)
+    parser.add_argument('--provider', type=str, help='指定服务商，不指定则交互式选择')
+    parser.add_argument('--model', type=str, help='指定模型，不指定则交互式选择')
+    parser.add_argument('--batch', action='store_true', help='使用批量API进行翻译')
+    parser.add_argument('--dry-run', action='store_true', help='仅计算token预算，不执行翻译')
+    parser.add_argument('--stream', action='store_true', help='边分组边翻译，第一组分好即开始请求（token预算改为快速估算）')
+    parser.add_argument('--yes', '-y', action='store_true', help='不询问，未指定的服务商和模型使用默认值，直接开始翻译')
+    parser.add_argument('--no-metrics', action='store_true', help='不写出API调用记录')
+    parser.add_argument('--rules', type=str, default=os.path.join(ROOT_DIR, 'config', 'translation_rules.json'),
+                        help='规则预翻译的词典文件，默认 config/translation_rules.json')
+    parser.add_argument('--no-rules', action='store_true', help='不使用规则预翻译，全部条目交给API')
+    parser.add_argument('--save-interval', type=float, default=5.0, help='后台保存 mapping.json 的最短间隔（秒），默认5')
+    parser.add_argument('--concurrency', type=int, help='初始并发请求数，默认使用 config_manager.py bench 的推荐值，没有时为1')
+    parser.add_argument('--max-concurrency', type=int, help='自适应并发的上限，默认为初始并发的2倍（至少8）')
+    parser.add_argument('--no-adaptive', action='store_true', help='固定并发，不根据429/5xx和延迟自动调整')
+    parser.add_argument('--glossary', action='store_true', help='把规则文件中的词典作为术语表放进提示词的固定前缀')
+    parser.add_argument('--prompt-cache', action='store_true', help='在提示词前缀上加 cache_control 缓存标记')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="SFX File Translator：扫描、翻译并重命名音效文件")
+    parser.add_argument('--json-dir', type=str, help='structure.json / mapping.json 所在目录，默认为项目根目录下的 json/')
+    parser.add_argument('--sfx-dir', type=str, help='音效目录，默认读取 .env 中的 SFX_DIR')
+    parser.add_argument('--placeholder-dir', type=str, help='占位文件目录，默认读取 .env 中的 SFX_PLACEHOLDER_DIR')
+    sub = parser.add_subparsers(dest='command')
+
+    sub.add_parser('scan', help='扫描音效目录，生成 structure.json 和 mapping.json').set_defaults(func=cmd_scan)
+
+    p = sub.add_parser('group', help='按前缀分组，输出 group.json')
+    _add_group_args(p)
+    p.set_defaults(func=cmd_group)
+
+    p = sub.add_parser('translate', help='AI翻译 mapping.json 中未翻译的条目')
+    _add_translate_args(p)
+    p.set_defaults(func=cmd_translate)
+
+    p = sub.add_parser('rename', help='按翻译重命名音效文件（先生成完整计划，解决重名和互换后一次执行）')
+    p.add_argument('--preview', action='store_true', help='只打印重命名计划，不改动文件')
+    p.set_defaults(func=cmd_rename)
+    p = sub.add_parser('view', help='按翻译生成硬链接视图（不移动原始文件），再次运行时增量更新')
+    p.add_argument('--view-dir', type=str, help='视图目录，默认读取 .env 中的 SFX_VIEW_DIR')
+    p.add_argument('--link', type=str, default='auto', choices=LINK_MODES,
+                   help='auto: 硬链接，跨文件系统时用符号链接；hard: 只用硬链接；symlink: 只用符号链接')
+    p.add_argument('--workers', type=int, default=8, help='并行建立链接的线程数，默认8')
+    p.add_argument('--remove', action='store_true', help='删除视图目录（回滚）')
+    p.set_defaults(func=cmd_view)
+
+    sub.add_parser('restore', help='恢复原始文件名并重新生成 mapping.json').set_defaults(func=cmd_restore)
+    p = sub.add_parser('placeholders', help='按 structure.json 创建占位文件')
+    p.add_argument('--workers', type=int, default=8, help='并行创建文件的线程数，默认8')
+    p.add_argument('--sparse-size', action='store_true', help='按真实大小创建稀疏文件（默认创建空文件）')
+    p.add_argument('--seed', type=int, default=0, help='文件大小的随机种子，默认0')
+    p.set_defaults(func=cmd_placeholders)
+
+    p = sub.add_parser('watch', help='监视音效目录，增量翻译新加入的文件（仅Linux）')
+    _add_translate_args(p)
+    p.add_argument('--rename', action='store_true', help='翻译后立即按翻译重命名新文件')
+    p.add_argument('--debounce', type=float, default=2.0, help='最后一个文件到达后等待多少秒再处理这一批，默认2')
+    p.add_argument('--max-wait', type=float, default=20.0, help='持续有文件到达时一批最多等待的秒数，默认20')
+    p.add_argument('--no-catch-up', action='store_true', help='启动时不补扫停机期间加入的文件')
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser('pipeline', help='在同一进程中依次执行 扫描 → 分组 → 翻译 → 重命名')
+    _add_translate_args(p)
+    p.add_argument('--rescan', action='store_true', help='即使已有 mapping.json 也重新扫描（会清空已有翻译）')
+    p.add_argument('--no-rename', action='store_true', help='翻译后不重命名')
+    p.add_argument('--rename-anyway', action='store_true', help='本次没有执行翻译时也按已有翻译重命名')
+    p.set_defaults(func=cmd_pipeline)
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if not args.command:
+        parser.print_help()
+        return
+    max_group_items = getattr(args, 'max_group_items', '100')
+    if not max_group_items.isdigit() and not (max_group_items == 'auto' and args.command in ('translate', 'pipeline')):
+        parser.error("--max-group-items 必须是正整数（translate/pipeline 也可以用 auto）")
+    ws = Workspace(json_dir=args.json_dir, sfx_dir=args.sfx_dir, placeholder_dir=args.placeholder_dir)
+    args.func(ws, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+相似度聚类分组（MinHash + LSH）
+命名不统一的音效（Sword_Swing_Heavy / HeavySwordSwing）没有共同前缀，按前缀分组会被拆散到不同请求中。
+这里把名称拆成单词、按字符n-gram计算 MinHash 签名，再用 LSH 分桶找出相似名称，
+复杂度近似线性；名称中去掉数字后相同的条目共用一次签名计算
+"""
+
+import re
+import zlib
+import random
+from group_mapping_blocks import group_by_prefix_trie, _split_evenly
+
+# 单词切分：大写缩写、单词，忽略数字和分隔符
+_WORD_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+')
+
+_DIGITS_RE = re.compile(r'\d+')
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _plain_name(name):
+    """去掉数字和首尾空白的名称，只有数字时保留原样"""
+    return _DIGITS_RE.sub("", name).strip() or name.strip()
+
+
+def shingles(name, n=3):
+    """
+    名称的字符n-gram集合：先切成小写单词，每个单词首尾加边界符再取n-gram，
+    因此与单词顺序和大小写无关，Sword_Swing_Heavy 与 HeavySwordSwing 得到相同的集合。
+    没有拉丁字母单词的名称（中文、纯数字、符号）对去掉数字的整个名称取n-gram，
+    否则它们的集合都为空、签名完全相同，会被全部聚成一簇
+    """
+    words = _WORD_RE.findall(name) or [_plain_name(name)]
+    result = set()
+    for word in words:
+        padded = f"^{word.lower()}$"
+        if len(padded) <= n:
+            result.add(padded)
+        else:
+            result.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return result
+
+
+class MinHasher:
+    """MinHash 签名计算，同一个n-gram的哈希值只计算一次"""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+        self._shingle_cache = {}
+
+    def _shingle_hashes(self, shingle):
+        hashes = self._shingle_cache.get(shingle)
+        if hashes is None:
+            # crc32 在不同进程间结果一致，分组结果可复现（内置hash每次启动的种子不同）
+            x = zlib.crc32(shingle.encode('utf-8'))
+            hashes = tuple(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for a, b in self.params)
+            self._shingle_cache[shingle] = hashes
+        return hashes
+
+    def signature(self, shingle_set):
+        if not shingle_set:
+            return (_MAX_HASH,) * self.num_perm
+        return tuple(map(min, *(self._shingle_hashes(s) for s in shingle_set))) if len(shingle_set) > 1 \
+            else self._shingle_hashes(next(iter(shingle_set)))
+
+
+def _similarity(sig_a, sig_b):
+    """签名相同位置相等的比例，近似 Jaccard 相似度"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+def cluster_names(names, threshold=0.6, num_perm=64, bands=16, seed=1):
+    """
+    对名称列表聚类，返回簇的列表（每个簇为 names 中的下标列表）
+    bands × rows = num_perm，相似度约为 (1/bands)^(1/rows) 以上的名称大概率落入同一个桶。
+    每个簇以第一个名称为代表，只有代表登记到桶中；新名称与同桶代表的估计相似度达到 threshold 才加入该簇，
+    否则自成新簇。只和代表比较，不会像并查集那样经由相似链把不相关的名称串成一个大簇
+    """
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm, seed)
+
+    # 去掉数字后相同的名称（Hit 01 / Hit 02）直接归为一类，只计算一次签名
+    keys = {}
+    key_of = []
+    for name in names:
+        key = " ".join(sorted(w.lower() for w in _WORD_RE.findall(name))) or _plain_name(name)
+        key_of.append(keys.setdefault(key, len(keys)))
+    signatures = [hasher.signature(shingles(key)) for key in keys]
+
+    buckets = [{} for _ in range(bands)]
+    leader_of = []
+    for i, sig in enumerate(signatures):
+        band_keys = [sig[band * rows:(band + 1) * rows] for band in range(bands)]
+        leader = None
+        checked = set()
+        for band, band_key in enumerate(band_keys):
+            candidate = buckets[band].get(band_key)
+            if candidate is None or candidate in checked:
+                continue
+            checked.add(candidate)
+            if _similarity(signatures[candidate], sig) >= threshold:
+                leader = candidate
+                break
+        if leader is None:
+            leader = i
+            for band, band_key in enumerate(band_keys):
+                buckets[band].setdefault(band_key, i)
+        leader_of.append(leader)
+
+    clusters = {}
+    for index, key in enumerate(key_of):
+        clusters.setdefault(leader_of[key], []).append(index)
+    return list(clusters.values())
+
+
+def group_by_similarity(mapping, min_group_size=2, max_group_items=100, threshold=0.6):
+    """
+    按名称相似度分组：
+    1. MinHash + LSH 聚类，相似的名称不论前缀是否相同都进入同一簇
+    2. 超过 max_group_items 的簇拆成大小接近的若干组
+    3. 小于 min_group_size 的簇交给前缀树分组，与共享前缀的条目合并，避免单条请求
+    """
+    items = [(k, v["original"]) for k, v in mapping.items() if not v.get("translation") and v.get("original")]
+    if not items:
+        return []
+    items.sort(key=lambda x: x[1])
+
+    result = []
+    leftovers = {}
+    for cluster in cluster_names([original for _, original in items], threshold):
+        group = [items[i] for i in cluster]
+        if len(group) >= min_group_size:
+            result.extend(_split_evenly(group, max_group_items))
+        else:
+            for k, original in group:
+                leftovers[k] = {"original": original, "translation": ""}
+    if leftovers:
+        result.extend(group_by_prefix_trie(leftovers, min_group_size, max_group_items))
+    result.sort(key=lambda group: group[0][1])
+    return result
@@ -0,0 +1,256 @@
+"""
+structure.json 的紧凑内存表示
+目录名去重后存入目录表，目录与文件通过数组中的父目录下标关联，
+id、扩展名等字段以数组按列存储，可与 structure.json 无损互转
+"""
+
+import os
+import sys
+from array import array
+from json_stream import iter_structure, StructureStreamWriter
+from json_io import atomic_write
+
+ROOT_DIR = 0
+
+
+class FileRecord:
+    """单个文件的记录"""
+    __slots__ = ('id', 'rel_path', 'ext')
+
+    def __init__(self, file_id, rel_path, ext):
+        self.id = file_id
+        self.rel_path = rel_path
+        self.ext = ext
+
+    def __iter__(self):
+        return iter((self.id, self.rel_path, self.ext))
+
+    def __repr__(self):
+        return f"FileRecord(id={self.id!r}, rel_path={self.rel_path!r}, ext={self.ext!r})"
+
+
+class StructureIndex:
+    """
+    列式存储的结构树
+    - 目录表：dir_names[i] 为目录名，dir_parents[i] 为父目录下标，0 号为根目录
+    - 文件表：file_dirs / file_stems / file_ext_codes / 文件id 按下标一一对应
+    文件按 structure.json 中的深度优先顺序存放，id 到路径的查询为 O(1)
+    """
+    __slots__ = (
+        'dir_names', 'dir_parents', '_dir_lookup', '_dir_paths',
+        'file_dirs', 'file_stems', 'file_ext_codes', 'ext_table', '_ext_codes',
+        '_int_ids', '_str_ids', '_id_positions', '_id_lookup', '_odd_names',
+    )
+
+    def __init__(self):
+        self.dir_names = ['']
+        self.dir_parents = array('i', [-1])
+        self._dir_lookup = {}  # (父目录下标, 目录名) -> 目录下标
+        self._dir_paths = ['']  # 目录相对路径缓存，按需填充
+        self.file_dirs = array('i')
+        self.file_stems = []
+        self.file_ext_codes = array('H')
+        self.ext_table = []
+        self._ext_codes = {}
+        # 纯数字id存入整数数组并用位置表反查；出现非数字id后改用字符串列表和字典
+        self._int_ids = array('q')
+        self._str_ids = None
+        self._id_positions = array('i')  # 数字id -> 文件下标，-1 表示不存在
+        self._id_lookup = None
+        self._odd_names = {}  # 文件名不等于 stem + ext 的少数文件
+
+    # ---------- 构建 ----------
+
+    @classmethod
+    def from_records(cls, records):
+        """由 (id, rel_path, ext) 记录构建"""
+        index = cls()
+        for file_id, rel_path, ext in records:
+            index.add_file(file_id, rel_path, ext)
+        return index
+
+    @classmethod
+    def from_tree(cls, tree):
+        """由嵌套字典形式的结构树构建"""
+        index = cls()
+
+        def walk(node, dir_index):
+            for key, value in node.items():
+                if isinstance(value, dict) and 'id' in value:
+                    index._append_file(dir_index, key, value['id'], value['ext'])
+                elif isinstance(value, dict):
+                    walk(value, index._get_dir(dir_index, key))
+
+        walk(tree, ROOT_DIR)
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """流式读取 structure.json 并构建"""
+        return cls.from_records(iter_structure(path))
+
+    def _get_dir(self, parent, name):
+        key = (parent, name)
+        dir_index = self._dir_lookup.get(key)
+        if dir_index is None:
+            dir_index = len(self.dir_names)
+            self.dir_names.append(sys.intern(name))
+            self.dir_parents.append(parent)
+            self._dir_paths.append(None)
+            self._dir_lookup[key] = dir_index
+        return dir_index
+
+    def _append_file(self, dir_index, filename, file_id, ext):
+        position = len(self.file_stems)
+        if ext not in self._ext_codes:
+            self._ext_codes[ext] = len(self.ext_table)
+            self.ext_table.append(ext)
+        if ext and filename.endswith(ext):
+            stem = filename[:-len(ext)]
+        else:
+            stem = filename
+            if ext:
+                self._odd_names[position] = filename
+        self.file_dirs.append(dir_index)
+        self.file_stems.append(stem)
+        self.file_ext_codes.append(self._ext_codes[ext])
+        self._append_id(file_id, position)
+
+    def _append_id(self, file_id, position):
+        if self._str_ids is None:
+            numeric = file_id.isdigit() and (file_id == '0' or not file_id.startswith('0'))
+            if numeric and int(file_id) < (1 << 24):
+                number = int(file_id)
+                if number >= len(self._id_positions):
+                    grow = max(number + 1, len(self._id_positions) * 2) - len(self._id_positions)
+                    self._id_positions.extend(array('i', [-1]) * grow)
+                if self._id_positions[number] == -1:
+                    self._id_positions[number] = position
+                self._int_ids.append(number)
+                return
+            self._switch_to_str_ids()
+        self._str_ids.append(file_id)
+        self._id_lookup.setdefault(file_id, position)
+
+    def _switch_to_str_ids(self):
+        self._str_ids = [str(n) for n in self._int_ids]
+        self._id_lookup = {}
+        for position, file_id in enumerate(self._str_ids):
+            self._id_lookup.setdefault(file_id, position)
+        self._int_ids = None
+        self._id_positions = None
+
+    def add_file(self, file_id, rel_path, ext):
+        """追加一个文件，rel_path 为相对于音效根目录的路径"""
+        parts = rel_path.split(os.sep)
+        dir_index = ROOT_DIR
+        for name in parts[:-1]:
+            dir_index = self._get_dir(dir_index, name)
+        self._append_file(dir_index, parts[-1], file_id, ext)
+
+    # ---------- 查询 ----------
+
+    def __len__(self):
+        return len(self.file_stems)
+
+    def __contains__(self, file_id):
+        return self._position(file_id) is not None
+
+    def _position(self, file_id):
+        if self._id_lookup is not None:
+            return self._id_lookup.get(file_id)
+        if not (file_id.isdigit() and (file_id == '0' or not file_id.startswith('0'))):
+            return None
+        number = int(file_id)
+        if number >= len(self._id_positions):
+            return None
+        position = self._id_positions[number]
+        return None if position == -1 else position
+
+    def _file_id(self, position):
+        if self._str_ids is not None:
+            return self._str_ids[position]
+        return str(self._int_ids[position])
+
+    def dir_path(self, dir_index):
+        """目录相对路径，计算结果会被缓存"""
+        path = self._dir_paths[dir_index]
+        if path is None:
+            parent = self.dir_parents[dir_index]
+            path = os.path.join(self.dir_path(parent), self.dir_names[dir_index])
+            self._dir_paths[dir_index] = path
+        return path
+
+    def _filename(self, position):
+        name = self._odd_names.get(position)
+        if name is None:
+            name = self.file_stems[position] + self.ext_table[self.file_ext_codes[position]]
+        return name
+
+    def _record(self, position):
+        dir_index = self.file_dirs[position]
+        filename = self._filename(position)
+        rel_path = os.path.join(self.dir_path(dir_index), filename) if dir_index else filename
+        return FileRecord(self._file_id(position), rel_path, self.ext_table[self.file_ext_codes[position]])
+
+    def get(self, file_id):
+        """按id查询文件记录，找不到时返回None"""
+        position = self._position(file_id)
+        return None if position is None else self._record(position)
+
+    def find(self, file_id):
+        """与 find_file_by_id 相同的返回值：(rel_path, ext) 或 None"""
+        record = self.get(file_id)
+        return None if record is None else (record.rel_path, record.ext)
+
+    def max_numeric_id(self):
+        """最大的数字id，没有数字id时返回0"""
+        if self._int_ids is not None:
+            return max(self._int_ids, default=0)
+        return max((int(i) for i in self._str_ids if i.isdigit()), default=0)
+
+    def iter_records(self):
+        """按原始顺序产出 (id, rel_path, ext)"""
+        for position in range(len(self.file_stems)):
+            yield tuple(self._record(position))
+
+    # ---------- 导出 ----------
+
+    def to_tree(self):
+        """转换回嵌套字典形式的结构树"""
+        tree = {}
+        nodes = {ROOT_DIR: tree}
+
+        def node_of(dir_index):
+            node = nodes.get(dir_index)
+            if node is None:
+                parent = node_of(self.dir_parents[dir_index])
+                node = parent.setdefault(self.dir_names[dir_index], {})
+                nodes[dir_index] = node
+            return node
+
+        for position in range(len(self.file_stems)):
+            node = node_of(self.file_dirs[position])
+            node[self._filename(position)] = {
+                "id": self._file_id(position),
+                "ext": self.ext_table[self.file_ext_codes[position]],
+            }
+        # 不含文件的空文件夹
+        for dir_index in range(1, len(self.dir_names)):
+            node_of(dir_index)
+        return tree
+
+    def write(self, path, pretty=None):
+        """流式、原子地写出 structure.json"""
+        with atomic_write(path) as f:
+            writer = StructureStreamWriter(f, pretty)
+            for position in range(len(self.file_stems)):
+                dirs = []
+                dir_index = self.file_dirs[position]
+                while dir_index != ROOT_DIR:
+                    dirs.append(self.dir_names[dir_index])
+                    dir_index = self.dir_parents[dir_index]
+                dirs.reverse()
+                record_ext = self.ext_table[self.file_ext_codes[position]]
+                writer.add_file(dirs, self._filename(position), self._file_id(position), record_ext)
+            writer.close()
@@ -0,0 +1,208 @@
+"""
+合成音效库生成器
+按可配置的目录深度、分支数和厂商命名风格生成虚拟音效库，用于在没有真实音效库时做规模测试。
+可以在磁盘上创建文件（可选按真实大小创建稀疏文件），也可以直接写出 structure.json / mapping.json。
+"""
+
+import os
+import random
+import argparse
+from json_stream import StructureStreamWriter, MappingStreamWriter
+from json_io import atomic_write
+
+# 厂商分类代码及子类
+CATEGORIES = {
+    "WEAP": ["Swrd", "Armr", "Bow", "Gun", "Axe"],
+    "FOLY": ["Cloth", "Foot", "Hand", "Bag"],
+    "IMPT": ["Metal", "Wood", "Stone", "Glass"],
+    "AMBN": ["Forest", "City", "Wind", "Rain"],
+    "MAGC": ["Fire", "Ice", "Arcane"],
+    "UI": ["Click", "Alert", "Menu"],
+}
+
+# 描述词及对应的中文（用于生成已翻译的mapping）
+WORDS = {
+    "Hit": "击打", "Impact": "撞击", "Swing": "挥舞", "Heavy": "重", "Light": "轻",
+    "Drop": "掉落", "Metal": "金属", "Wood": "木头", "Whoosh": "呼啸", "Slide": "滑动",
+    "Crash": "碰撞", "Shield": "盾牌", "Sword": "剑", "Step": "脚步", "Grab": "抓取",
+    "Cast": "施法", "Burst": "爆发", "Loop": "循环", "Short": "短", "Long": "长",
+    "Soft": "轻柔", "Hard": "坚硬", "Hybrid": "混合", "Unequip": "卸下", "Equip": "装备",
+    "Weapon": "武器", "Debris": "碎片", "Distant": "远处", "Close": "近处", "Tail": "尾音",
+}
+
+VENDOR_CODES = ["JSE_MW", "BOOM", "PRSM", "SSL", "AGS"]
+
+PACK_NAMES = ["Weapons", "Foley", "Impacts", "Ambience", "Magic", "Interface", "Creatures", "Vehicles"]
+
+# 各格式每秒音频的字节数及时长范围（秒）
+_BYTES_PER_SECOND = {
+    ".wav": 48000 * 2 * 3,  # 48kHz 立体声 24bit
+    ".flac": 48000 * 2 * 3 // 2,
+    ".mp3": 320000 // 8,
+    ".ogg": 192000 // 8,
+    ".m4a": 256000 // 8,
+}
+
+EXTS = [".wav"] * 8 + [".flac", ".mp3"]
+
+
+def realistic_size(ext, key, seed=0):
+    """
+    根据格式估算一个真实的文件大小（字节）
+    同一 key 总是得到相同的大小，时长服从对数正态分布（多数在0.3~8秒之间）
+    """
+    rng = random.Random(f"{seed}:{key}")
+    duration = min(max(rng.lognormvariate(0.5, 0.9), 0.1), 120.0)
+    bytes_per_second = _BYTES_PER_SECOND.get(ext.lower(), 48000 * 2 * 2)
+    return 44 + int(duration * bytes_per_second)
+
+
+def _family_names(rng, count):
+    """生成一个命名家族（同一前缀下的一组变体）"""
+    category = rng.choice(list(CATEGORIES))
+    sub = rng.choice(CATEGORIES[category])
+    words = rng.sample(list(WORDS), 3)
+    vendor = rng.choice(VENDOR_CODES)
+    style = rng.randrange(4)
+    names = []
+    for i in range(1, count + 1):
+        if style == 0:
+            # WEAPSwrd_Weapon 01 Unequip_JSE_MW
+            names.append(f"{category}{sub}_{words[0]} {i:02d} {words[1]}_{vendor}")
+        elif style == 1:
+            # Sword_Swing_Heavy_01
+            names.append(f"{words[0]}_{words[1]}_{words[2]}_{i:02d}")
+        elif style == 2:
+            # HeavySwordSwing01
+            names.append(f"{words[2]}{words[0]}{words[1]}{i:02d}")
+        else:
+            # WEAPArmr_Hybrid Shield Drops_JSE_MW
+            names.append(f"{category}{sub}_{words[0]} {words[1]} {words[2]} {i:02d}_{vendor}")
+    return names
+
+
+def _dir_names(rng, level, fanout):
+    if level == 0:
+        names = [f"{rng.choice(PACK_NAMES)}_Vol{i + 1:02d}" for i in range(fanout)]
+    elif level == 1:
+        categories = list(CATEGORIES)
+        names = [f"{categories[i % len(categories)]}_{i + 1:02d}" for i in range(fanout)]
+    else:
+        names = [f"Set {i + 1:02d}" for i in range(fanout)]
+    return sorted(set(names))
+
+
+def _leaf_dirs(rng, depth, fanout, limit, level=0, parents=()):
+    """按排序后的深度优先顺序产出叶子目录，最多 limit 个"""
+    if level == depth:
+        yield parents
+        return
+    for name in _dir_names(rng, level, fanout):
+        if limit <= 0:
+            return
+        for leaf in _leaf_dirs(rng, depth, fanout, limit, level + 1, parents + (name,)):
+            yield leaf
+            limit -= 1
+            if limit <= 0:
+                return
+
+
+def iter_synthetic_files(count, depth=3, fanout=6, seed=0):
+    """
+    按与 scan_folder 相同的顺序产出 (dirs, filename)
+    所有文件都放在深度为 depth 的叶子目录中，每个目录平均分配
+    """
+    rng = random.Random(seed)
+    max_leaves = fanout ** depth
+    # 每个目录至少约20个文件，与真实音效包的规模相近
+    leaves = list(_leaf_dirs(rng, depth, fanout, max(1, min(max_leaves, count // 20))))
+    base, extra = divmod(count, len(leaves))
+    for leaf_index, dirs in enumerate(leaves):
+        leaf_count = base + (1 if leaf_index < extra else 0)
+        leaf_rng = random.Random(f"{seed}:{leaf_index}")
+        names = set()
+        while len(names) < leaf_count:
+            family_size = min(leaf_rng.randint(1, 12), leaf_count - len(names))
+            for name in _family_names(leaf_rng, family_size):
+                names.add(name + leaf_rng.choice(EXTS))
+        for filename in sorted(names)[:leaf_count]:
+            yield dirs, filename
+
+
+def translate_name(name):
+    """用内置词表生成一个格式类似的中文翻译"""
+    parts = []
+    for token in name.replace(' ', '_').split('_'):
+        parts.append(WORDS.get(token, token))
+    return '_'.join(p for p in parts if p)
+
+
+def write_library(root, files, sparse_sizes=False, seed=0):
+    """在磁盘上创建文件；sparse_sizes 为True时用 truncate 设置真实大小（稀疏文件，不占用磁盘块）"""
+    last_dir = None
+    count = 0
+    for dirs, filename in files:
+        dir_path = os.path.join(root, *dirs)
+        if dir_path != last_dir:
+            os.makedirs(dir_path, exist_ok=True)
+            last_dir = dir_path
+        path = os.path.join(dir_path, filename)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if sparse_sizes:
+                os.ftruncate(fd, realistic_size(os.path.splitext(filename)[1], os.path.join(*dirs, filename), seed))
+        finally:
+            os.close(fd)
+        count += 1
+    return count
+
+
+def write_json(json_dir, files, translated_ratio=0.0, seed=0):
+    """直接写出 structure.json 和 mapping.json，translated_ratio 为预先填好翻译的比例"""
+    rng = random.Random(seed)
+    count = 0
+    os.makedirs(json_dir, exist_ok=True)
+    with atomic_write(os.path.join(json_dir, "structure.json")) as sf, \
+            atomic_write(os.path.join(json_dir, "mapping.json")) as mf:
+        structure_writer = StructureStreamWriter(sf)
+        mapping_writer = MappingStreamWriter(mf)
+        for dirs, filename in files:
+            count += 1
+            file_id = str(count)
+            name, ext = os.path.splitext(filename)
+            translation = translate_name(name) if rng.random() < translated_ratio else ""
+            structure_writer.add_file(dirs, filename, file_id, ext)
+            mapping_writer.add(file_id, {"original": name, "translation": translation})
+        structure_writer.close()
+        mapping_writer.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成音效库，用于规模测试")
+    parser.add_argument('--files', type=int, default=10000, help='文件数量，默认10000')
+    parser.add_argument('--depth', type=int, default=3, help='目录深度，默认3')
+    parser.add_argument('--fanout', type=int, default=6, help='每级目录的子目录数，默认6')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子，默认0')
+    parser.add_argument('--output-dir', type=str, help='在该目录下创建音效文件')
+    parser.add_argument('--sparse-size', action='store_true', help='按真实大小创建稀疏文件（默认创建空文件）')
+    parser.add_argument('--json-dir', type=str, help='直接写出 structure.json 和 mapping.json 到该目录')
+    parser.add_argument('--translated-ratio', type=float, default=0.0, help='mapping中预先填好翻译的比例，默认0')
+    args = parser.parse_args()
+
+    if not args.output_dir and not args.json_dir:
+        parser.error("至少需要指定 --output-dir 或 --json-dir")
+
+    def files():
+        return iter_synthetic_files(args.files, args.depth, args.fanout, args.seed)
+
+    if args.output_dir:
+        count = write_library(args.output_dir, files(), args.sparse_size, args.seed)
+        print(f"已在 {args.output_dir} 创建 {count} 个文件")
+    if args.json_dir:
+        count = write_json(args.json_dir, files(), args.translated_ratio, args.seed)
+        print(f"已在 {args.json_dir} 写出 structure.json 和 mapping.json，共 {count} 条")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+API调用遥测
+记录每次API调用的服务商、模型、分组大小、延迟、重试次数、token用量和结果，
+写入JSONL文件和 Prometheus textfile，并在运行结束时汇总吞吐量、延迟分位数和实际费用
+"""
+
+import os
+import time
+import uuid
+import threading
+from datetime import datetime
+from json_io import dumps_json, atomic_write
+
+DEFAULT_METRICS_DIR = os.path.join(os.path.dirname(__file__), '..', 'json', 'metrics')
+REQUESTS_FILE = "requests.jsonl"
+PROMETHEUS_FILE = "sfx_translate.prom"
+
+
+def percentile(values, p):
+    """线性插值的分位数，values 为空时返回0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def classify_error(error):
+    """
+    将异常归类为 (outcome, HTTP状态码)
+    outcome: rate_limited / server_error / client_error / parse_error / error
+    """
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status == 429:
+        return "rate_limited", status
+    if isinstance(status, int) and status >= 500:
+        return "server_error", status
+    if isinstance(status, int) and status >= 400:
+        return "client_error", status
+    if isinstance(error, ValueError):  # json.JSONDecodeError 是 ValueError 的子类
+        return "parse_error", status
+    return "error", status
+
+
+def usage_to_dict(usage):
+    """把SDK返回的usage对象或响应中的usage字典统一转换为 {prompt, completion, cached}"""
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, 'model_dump') else vars(usage)
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", 0)
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+        "cached_tokens": cached or 0,
+    }
+
+
+def _prom_escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prom_labels(**labels):
+    return "{" + ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Telemetry:
+    """线程安全的API调用记录器"""
+
+    def __init__(self, metrics_dir=DEFAULT_METRICS_DIR, run_id=None, enabled=True):
+        self.metrics_dir = metrics_dir
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self.enabled = enabled
+        self.records = []
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self._file = None
+        if enabled:
+            os.makedirs(metrics_dir, exist_ok=True)
+            self._file = open(os.path.join(metrics_dir, REQUESTS_FILE), 'ab')
+
+    def record(self, **fields):
+        """记录一次API调用"""
+        record = dict(timestamp=datetime.now().isoformat(timespec='milliseconds'), run_id=self.run_id, **fields)
+        with self.lock:
+            self.records.append(record)
+            if self._file:
+                self._file.write(dumps_json(record, pretty=False) + b'\n')
+                self._file.flush()
+
+    def summary(self, pricing=None):
+        """
+        汇总本次运行的调用记录
+        pricing: {"input": 元/千token, "output": 元/千token, "cached_input": 元/千token（可选）}
+        """
+        with self.lock:
+            records = list(self.records)
+        latencies = [r["latency"] for r in records if r.get("latency") is not None]
+        ok_records = [r for r in records if r.get("outcome") == "ok" and r.get("latency") is not None]
+        cached_latencies = [r["latency"] for r in ok_records if r.get("cached_tokens")]
+        uncached_latencies = [r["latency"] for r in ok_records if not r.get("cached_tokens")]
+        prompt = sum(r.get("prompt_tokens", 0) for r in records)
+        completion = sum(r.get("completion_tokens", 0) for r in records)
+        cached = sum(r.get("cached_tokens", 0) for r in records)
+        elapsed = max(time.time() - self.started, 1e-9)
+        outcomes = {}
+        for r in records:
+            outcomes[r.get("outcome")] = outcomes.get(r.get("outcome"), 0) + 1
+        summary = {
+            "calls": len(records),
+            "outcomes": outcomes,
+            "items": sum(r.get("group_size") or 0 for r in records if r.get("outcome") == "ok"),
+            "retries": sum(r.get("retries", 0) for r in records),
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "cached_tokens": cached,
+            "cache_hit_ratio": cached / prompt if prompt else 0.0,
+            "p50_cached": percentile(cached_latencies, 50) if cached_latencies else None,
+            "p50_uncached": percentile(uncached_latencies, 50) if uncached_latencies else None,
+            "elapsed": elapsed,
+            "calls_per_second": len(records) / elapsed,
+            "tokens_per_second": (prompt + completion) / elapsed,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "cost": None,
+            "cache_savings": None,
+        }
+        if pricing:
+            cached_price = pricing.get("cached_input", pricing.get("input", 0))
+            summary["cost"] = (
+                (prompt - cached) * pricing.get("input", 0)
+                + cached * cached_price
+                + completion * pricing.get("output", 0)
+            ) / 1000
+            summary["cache_savings"] = cached * (pricing.get("input", 0) - cached_price) / 1000
+        return summary
+
+    def print_summary(self, pricing=None):
+        s = self.summary(pricing)
+        if not s["calls"]:
+            return s
+        print("\n=== 本次运行统计 ===")
+        outcomes = "，".join(f"{k}: {v}" for k, v in sorted(s["outcomes"].items()))
+        print(f"API调用: {s['calls']} 次（{outcomes}），重试 {s['retries']} 次")
+        print(f"吞吐量: {s['calls_per_second']:.2f} 请求/秒，{s['items'] / s['elapsed']:.1f} 条目/秒，"
+              f"{s['tokens_per_second']:.0f} token/秒")
+        print(f"延迟 p50: {s['p50']:.2f}s  p95: {s['p95']:.2f}s  p99: {s['p99']:.2f}s")
+        print(f"实际token: 输入 {s['prompt_tokens']}（缓存命中 {s['cached_tokens']}，{s['cache_hit_ratio']:.1%}），"
+              f"输出 {s['completion_tokens']}")
+        if s["p50_cached"] is not None and s["p50_uncached"] is not None:
+            print(f"延迟 p50: 命中缓存 {s['p50_cached']:.2f}s，未命中 {s['p50_uncached']:.2f}s")
+        if s["cost"] is not None:
+            savings = f"（缓存节省 {s['cache_savings']:.4f} 元）" if s["cached_tokens"] else ""
+            print(f"实际费用: {s['cost']:.4f} 元{savings}")
+        if self.enabled:
+            print(f"调用明细: {os.path.join(self.metrics_dir, REQUESTS_FILE)}")
+        return s
+
+    def write_prometheus(self, pricing=None):
+        """写出 Prometheus textfile（供 node_exporter 的 textfile collector 采集）"""
+        if not self.enabled:
+            return None
+        with self.lock:
+            records = list(self.records)
+        counters = {}
+        tokens = {}
+        latencies = {}
+        for r in records:
+            key = (r.get("provider"), r.get("model"))
+            counters[key + (r.get("outcome"),)] = counters.get(key + (r.get("outcome"),), 0) + 1
+            for kind in ("prompt", "completion", "cached"):
+                tokens[key + (kind,)] = tokens.get(key + (kind,), 0) + r.get(f"{kind}_tokens", 0)
+            if r.get("latency") is not None:
+                latencies.setdefault(key, []).append(r["latency"])
+
+        lines = [
+            "# HELP sfx_api_requests_total API调用次数",
+            "# TYPE sfx_api_requests_total counter",
+        ]
+        for (provider, model, outcome), value in sorted(counters.items(), key=str):
+            lines.append(f"sfx_api_requests_total{_prom_labels(provider=provider, model=model, outcome=outcome)} {value}")
+        lines += ["# HELP sfx_api_tokens_total token用量", "# TYPE sfx_api_tokens_total counter"]
+        for (provider, model, kind), value in sorted(tokens.items(), key=str):
+            lines.append(f"sfx_api_tokens_total{_prom_labels(provider=provider, model=model, type=kind)} {value}")
+        lines += ["# HELP sfx_api_latency_seconds API调用延迟", "# TYPE sfx_api_latency_seconds summary"]
+        for (provider, model), values in sorted(latencies.items(), key=str):
+            for q in (0.5, 0.95, 0.99):
+                labels = _prom_labels(provider=provider, model=model, quantile=q)
+                lines.append(f"sfx_api_latency_seconds{labels} {percentile(values, q * 100):.6f}")
+            labels = _prom_labels(provider=provider, model=model)
+            lines.append(f"sfx_api_latency_seconds_sum{labels} {sum(values):.6f}")
+            lines.append(f"sfx_api_latency_seconds_count{labels} {len(values)}")
+        cost = self.summary(pricing)["cost"]
+        if cost is not None:
+            lines += ["# HELP sfx_api_cost_yuan 本次运行的实际费用（元）", "# TYPE sfx_api_cost_yuan gauge",
+                      f"sfx_api_cost_yuan{_prom_labels(run_id=self.run_id)} {cost:.6f}"]
+
+        path = os.path.join(self.metrics_dir, PROMETHEUS_FILE)
+        with atomic_write(path) as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def close(self):
+        with self.lock:
+            if self._file:
+                self._file.close()
+                self._file = None
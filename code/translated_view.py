@@ -0,0 +1,136 @@
+"""
+翻译视图
+不移动原始文件，而是在另一个目录中按翻译后的文件名建立与原目录结构相同的硬链接（跨文件系统时用符号链接）。
+视图目录中的清单记录了每个链接，翻译更新后再次生成时只增删变化的链接；删除视图目录即可完全回滚
+"""
+
+import os
+import errno
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from json_io import load_json, dump_json
+
+MANIFEST_FILE = ".sfx_view.json"
+
+LINK_MODES = ("auto", "hard", "symlink")
+
+
+def plan_links(records):
+    """
+    records: (id, rel_path, ext, original, translation)
+    返回 {视图中的相对路径: 原始相对路径}；未翻译的文件保留原名，同一目录下重名时在文件名后加 _id
+    """
+    links = {}
+    for file_id, rel_path, ext, _, translation in records:
+        if rel_path is None:
+            continue
+        translation = (translation or "").strip()
+        directory = os.path.dirname(rel_path)
+        name = translation + ext if translation else os.path.basename(rel_path)
+        target = os.path.join(directory, name)
+        if target in links:
+            stem, suffix = os.path.splitext(name)
+            target = os.path.join(directory, f"{stem}_{file_id}{suffix}")
+        links[target] = rel_path
+    return links
+
+
+def _load_manifest(view_dir):
+    path = os.path.join(view_dir, MANIFEST_FILE)
+    return load_json(path) if os.path.exists(path) else None
+
+
+def _make_link(source, target, mode):
+    """建立一个链接，返回实际使用的方式（hard/symlink）"""
+    if mode != "symlink":
+        try:
+            os.link(source, target)
+            return "hard"
+        except OSError as e:
+            # 跨文件系统或文件系统不支持硬链接时退回符号链接
+            if mode == "hard" or e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+    os.symlink(source, target)
+    return "symlink"
+
+
+def _remove_empty_dirs(view_dir, rel_dirs):
+    """从深到浅删除已经为空的目录"""
+    for rel_dir in sorted(rel_dirs, key=lambda d: d.count(os.sep), reverse=True):
+        while rel_dir:
+            try:
+                os.rmdir(os.path.join(view_dir, rel_dir))
+            except OSError:
+                break
+            rel_dir = os.path.dirname(rel_dir)
+
+
+def build_view(base_dir, view_dir, records, mode="auto", workers=8):
+    """
+    按 records 生成或增量更新翻译视图，返回 {"created", "removed", "kept", "hard", "symlink", "failed"}
+    """
+    base_dir = os.path.abspath(base_dir)
+    view_dir = os.path.abspath(view_dir)
+    if view_dir == base_dir or view_dir.startswith(base_dir + os.sep):
+        raise ValueError("视图目录不能位于音效目录内部")
+
+    manifest = _load_manifest(view_dir)
+    if manifest is None:
+        if os.path.isdir(view_dir) and os.listdir(view_dir):
+            raise ValueError(f"{view_dir} 不是空目录，也不是已有的翻译视图")
+        manifest = {"base_dir": base_dir, "links": {}}
+    elif manifest.get("base_dir") != base_dir:
+        raise ValueError(f"该视图由 {manifest.get('base_dir')} 生成，与当前音效目录不同，请先删除视图")
+
+    old_links = manifest["links"]
+    new_links = plan_links(records)
+    to_remove = [t for t, s in old_links.items() if new_links.get(t) != s]
+    to_create = [(t, s) for t, s in new_links.items() if old_links.get(t) != s]
+    stats = {"created": 0, "removed": 0, "kept": len(new_links) - len(to_create),
+             "hard": 0, "symlink": 0, "failed": 0}
+
+    for target in to_remove:
+        try:
+            os.unlink(os.path.join(view_dir, target))
+        except FileNotFoundError:
+            pass
+        old_links.pop(target)
+        stats["removed"] += 1
+    _remove_empty_dirs(view_dir, {os.path.dirname(t) for t in to_remove})
+
+    # 先串行建好目录，再并行建立链接
+    os.makedirs(view_dir, exist_ok=True)
+    for rel_dir in sorted({os.path.dirname(t) for t, _ in to_create}):
+        os.makedirs(os.path.join(view_dir, rel_dir), exist_ok=True)
+
+    def create(item):
+        target, source = item
+        target_path = os.path.join(view_dir, target)
+        try:
+            if os.path.lexists(target_path):
+                os.unlink(target_path)
+            return target, source, _make_link(os.path.join(base_dir, source), target_path, mode), None
+        except OSError as e:
+            return target, source, None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for target, source, kind, error in pool.map(create, to_create):
+            if error is not None:
+                print(f"链接失败: {source} -> {target}, 错误: {error}")
+                stats["failed"] += 1
+                continue
+            old_links[target] = source
+            stats["created"] += 1
+            stats[kind] += 1
+
+    dump_json(manifest, os.path.join(view_dir, MANIFEST_FILE))
+    return stats
+
+
+def remove_view(view_dir):
+    """删除翻译视图（只删除带有清单的目录，避免误删），返回是否删除"""
+    if _load_manifest(view_dir) is None:
+        print(f"{view_dir} 不是翻译视图（缺少 {MANIFEST_FILE}），不删除")
+        return False
+    shutil.rmtree(view_dir)
+    return True
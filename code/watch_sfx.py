@@ -0,0 +1,232 @@
+"""
+监视音效目录，增量翻译新加入的文件（仅Linux）
+通过 inotify 订阅 SFX_DIR 下所有目录的文件事件，把一段时间内连续到达的新文件合并为一批（防抖），
+为新文件分配新的id并追加到 structure.json / mapping.json，只把这些新条目送去分组和翻译。
+inotify 通过 ctypes 调用 libc，不需要额外依赖
+"""
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from generate_sfx_json import is_audio_file
+from structure_index import StructureIndex
+from json_io import dump_json
+from rename_journal import pending_renames
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """libc inotify 的最小封装"""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise RuntimeError("监视模式依赖 inotify，仅支持Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 失败: {os.strerror(err)}")
+        self.paths = {}  # wd → 目录的绝对路径
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify 监视数量已达上限，请调大 /proc/sys/fs/inotify/max_user_watches")
+            raise OSError(err, f"无法监视 {path}: {os.strerror(err)}")
+        self.paths[wd] = path
+        return wd
+
+    def read_events(self, timeout):
+        """等待最多 timeout 秒，返回 [(目录路径, 文件名, mask)]；队列溢出时目录路径为None"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, "", mask))
+                continue
+            path = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            if path is not None:
+                events.append((path, name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class IncrementalIndex:
+    """
+    在已有的 structure.json / mapping.json 上追加新文件
+    已知路径包括结构中的原始路径和按翻译重命名后的路径，避免把重命名产生的事件当成新文件
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.base_dir = os.path.abspath(ws.require_sfx_dir())
+        self.known = set()
+        for file_id, rel_path, ext, _, translation in ws.iter_joined():
+            if rel_path is None:
+                continue
+            self.known.add(rel_path)
+            if translation:
+                self.known.add(self.translated_path(rel_path, translation, ext))
+        # 重名加了后缀的文件只能从重命名日志得知实际名字
+        for entry in pending_renames(self.base_dir) or []:
+            self.known.add(os.path.join(entry["dir"], entry["dst"]))
+        numeric = [int(k) for k in ws.mapping if k.isdigit()]
+        self.next_id = max([ws.index.max_numeric_id()] + numeric) + 1
+
+    @staticmethod
+    def translated_path(rel_path, translation, ext):
+        return os.path.join(os.path.dirname(rel_path), translation.strip() + ext)
+
+    def relpath(self, abs_path):
+        return os.path.relpath(abs_path, self.base_dir)
+
+    def is_new(self, abs_path):
+        return (is_audio_file(abs_path) and os.path.isfile(abs_path)
+                and self.relpath(abs_path) not in self.known)
+
+    def scan_new(self, folder=None):
+        """扫描目录下所有未登记的音频文件（启动时补齐停机期间加入的文件，或事件队列溢出后使用）"""
+        found = []
+        for root, dirs, files in os.walk(folder or self.base_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if self.is_new(path):
+                    found.append(path)
+        return found
+
+    def add(self, abs_paths):
+        """登记新文件并写出 structure.json 和 mapping.json，返回新分配的id列表"""
+        mapping = self.ws.mapping
+        records = list(self.ws.index.iter_records())
+        new_ids = []
+        for abs_path in abs_paths:
+            rel_path = self.relpath(abs_path)
+            if rel_path in self.known:
+                continue
+            self.known.add(rel_path)
+            file_id = str(self.next_id)
+            self.next_id += 1
+            name, ext = os.path.splitext(os.path.basename(rel_path))
+            records.append((file_id, rel_path, ext))
+            mapping[file_id] = {"original": name, "translation": ""}
+            new_ids.append(file_id)
+        if not new_ids:
+            return []
+        # 按路径排序后重建索引，与全量扫描的顺序一致，写出时每个目录保持连续
+        records.sort(key=lambda r: r[1].split(os.sep))
+        index = StructureIndex.from_records(records)
+        index.write(self.ws.structure_path)
+        dump_json(mapping, self.ws.mapping_path)
+        self.ws.set_scan_result(index, mapping)
+        return new_ids
+
+    def mark_renamed(self, renamed):
+        """登记重命名后的路径，renamed 为 rename_records 返回的 {id: 新的相对路径}（含重名后缀）"""
+        self.known.update(renamed.values())
+
+
+def watch(ws, handle_new, debounce=2.0, max_wait=20.0, max_batch=500, catch_up=True):
+    """
+    监视 SFX_DIR，新文件按批交给 handle_new(new_ids, incremental_index) 处理，直到 Ctrl+C
+    debounce: 最后一个事件之后静默多少秒才处理这一批
+    max_wait: 持续有文件到达时，一批最多等待的秒数
+    max_batch: 一批的最大文件数
+    """
+    incremental = IncrementalIndex(ws)
+    inotify = Inotify()
+    pending = {}
+    first_pending = last_event = 0.0
+
+    def watch_tree(folder):
+        for root, dirs, _ in os.walk(folder):
+            dirs.sort()
+            inotify.add_watch(root)
+
+    def queue(paths):
+        nonlocal first_pending, last_event
+        now = time.monotonic()
+        for path in paths:
+            if not pending:
+                first_pending = now
+            pending[path] = now
+        if paths:
+            last_event = now
+
+    def flush():
+        paths = [p for p in pending if incremental.is_new(p)]
+        pending.clear()
+        if not paths:
+            return
+        new_ids = incremental.add(paths)
+        print(f"\n发现 {len(new_ids)} 个新文件，已登记到 {ws.mapping_path}")
+        if new_ids:
+            handle_new(new_ids, incremental)
+
+    try:
+        watch_tree(incremental.base_dir)
+        print(f"正在监视 {incremental.base_dir}（{len(inotify.paths)} 个目录），按 Ctrl+C 退出")
+        if catch_up:
+            queue(incremental.scan_new())
+        while True:
+            timeout = None
+            if pending:
+                now = time.monotonic()
+                timeout = max(min(last_event + debounce, first_pending + max_wait) - now, 0)
+            for directory, name, mask in inotify.read_events(timeout):
+                if directory is None:
+                    print("[警告] inotify 事件队列溢出，重新扫描新文件")
+                    queue(incremental.scan_new())
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # 新目录：先加监视再扫描，监视生效前写入的文件也不会漏掉
+                    watch_tree(path)
+                    queue(incremental.scan_new(path))
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and is_audio_file(name):
+                    queue([path])
+            now = time.monotonic()
+            if pending and (now - last_event >= debounce or now - first_pending >= max_wait
+                            or len(pending) >= max_batch):
+                flush()
+    finally:
+        inotify.close()
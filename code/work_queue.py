@@ -0,0 +1,230 @@
+"""
+基于 SQLite 的分布式翻译任务队列
+协调进程把分组写入队列文件；任意数量的工作进程（同一台或共享文件系统的多台机器）领取任务时获得租约，
+处理期间定时续约，完成后写回结果；租约过期未完成的任务会被其他工作进程重新领取。
+SQLite 依赖文件锁保证并发安全，共享目录需要支持 POSIX 文件锁（NFS 需开启锁服务）
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import threading
+from json_io import dumps_json, loads_json
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    任务状态：pending → leased → done；租约过期的 leased 任务视同 pending，
+    失败超过 max_attempts 次的任务标记为 failed
+    """
+
+    def __init__(self, path, lease_seconds=300, max_attempts=5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # isolation_level=None：由下面的 BEGIN IMMEDIATE 显式控制事务
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(_SCHEMA)
+
+    def _transaction(self, func):
+        """在写事务中执行 func(cursor)，BEGIN IMMEDIATE 保证领取任务时不会有两个进程拿到同一条"""
+        with self.lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(cur)
+                cur.execute("COMMIT")
+                return result
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # ---------- 协调进程 ----------
+
+    def enqueue(self, payloads, meta=None):
+        """写入任务，返回写入数量"""
+        now = time.time()
+
+        def insert(cur):
+            for key, value in (meta or {}).items():
+                cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, dumps_json(value).decode('utf-8')))
+            cur.executemany("INSERT INTO tasks (payload, updated) VALUES (?, ?)",
+                            ((dumps_json(p).decode('utf-8'), now) for p in payloads))
+            return cur.rowcount
+        return self._transaction(insert)
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return loads_json(row[0]) if row else default
+
+    def stats(self):
+        """各状态的任务数，租约已过期的任务计入 expired"""
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT CASE WHEN status = ? AND lease_expires < ? THEN 'expired' ELSE status END, COUNT(*) "
+                "FROM tasks GROUP BY 1", (LEASED, now)).fetchall()
+        counts = {PENDING: 0, LEASED: 0, "expired": 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def iter_results(self):
+        """产出已完成任务的 (task_id, payload, result)"""
+        with self.lock:
+            rows = self.conn.execute("SELECT id, payload, result FROM tasks WHERE status = ? ORDER BY id", (DONE,)).fetchall()
+        for task_id, payload, result in rows:
+            yield task_id, loads_json(payload), loads_json(result)
+
+    # ---------- 工作进程 ----------
+
+    def claim(self, worker_id):
+        """领取一个待处理或租约已过期的任务，返回 (task_id, payload)，没有可领取的任务时返回None"""
+        def take(cur):
+            now = time.time()
+            # 多次租约过期（处理进程反复崩溃）的任务不再重试
+            cur.execute("UPDATE tasks SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated = ? "
+                        "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                        (FAILED, "lease expired", now, LEASED, now, self.max_attempts))
+            row = cur.execute(
+                "SELECT id, payload, attempts FROM tasks "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY id LIMIT 1",
+                (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            task_id, payload, attempts = row
+            cur.execute("UPDATE tasks SET status = ?, lease_owner = ?, lease_expires = ?, attempts = ?, updated = ? "
+                        "WHERE id = ?", (LEASED, worker_id, now + self.lease_seconds, attempts + 1, now, task_id))
+            return task_id, loads_json(payload)
+        return self._transaction(take)
+
+    def heartbeat(self, task_id, worker_id):
+        """续约，租约已被其他进程接手时返回False"""
+        def extend(cur):
+            now = time.time()
+            cur.execute("UPDATE tasks SET lease_expires = ?, updated = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                        (now + self.lease_seconds, now, task_id, LEASED, worker_id))
+            return cur.execute("SELECT changes()").fetchone()[0] == 1
+        return self._transaction(extend)
+
+    def complete(self, task_id, worker_id, result):
+        """
+        写回结果。即使租约已过期，只要任务尚未被其他进程完成也接受结果（翻译结果相同，不必浪费）
+        返回是否写入
+        """
+        def finish(cur):
+            now = time.time()
+            cur.execute("UPDATE tasks SET status = ?, result = ?, lease_owner = ?, lease_expires = NULL, error = NULL, "
+                        "updated = ? WHERE id = ? AND status != ?",
+                        (DONE, dumps_json(result).decode('utf-8'), worker_id, now, task_id, DONE))
+            return cur.execute("SELECT changes()").fetchone()[0] == 1
+        return self._transaction(finish)
+
+    def fail(self, task_id, worker_id, error):
+        """释放任务以便重试，失败次数达到 max_attempts 时标记为 failed"""
+        def release(cur):
+            now = time.time()
+            cur.execute("UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                        "lease_owner = NULL, lease_expires = NULL, error = ?, updated = ? "
+                        "WHERE id = ? AND status = ? AND lease_owner = ?",
+                        (self.max_attempts, FAILED, PENDING, str(error)[:500], now, task_id, LEASED, worker_id))
+        self._transaction(release)
+
+
+class _Heartbeat(threading.Thread):
+    """处理任务期间定时续约"""
+
+    def __init__(self, queue, task_id, worker_id):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        interval = max(self.queue.lease_seconds / 3, 0.1)
+        while not self.stopped.wait(interval):
+            if not self.queue.heartbeat(self.task_id, self.worker_id):
+                self.lost = True
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_worker(queue, handle, worker_id=None, poll_interval=5.0, max_tasks=None):
+    """
+    循环领取并处理任务，直到队列中没有待处理、也没有其他进程持有租约的任务
+    handle(payload) 返回结果，抛出异常或返回空结果时任务会被释放重试
+    返回本进程完成的任务数
+    """
+    worker_id = worker_id or default_worker_id()
+    completed = 0
+    while max_tasks is None or completed < max_tasks:
+        claimed = queue.claim(worker_id)
+        if claimed is None:
+            stats = queue.stats()
+            if stats[LEASED] == 0 and stats["expired"] == 0 and stats[PENDING] == 0:
+                break
+            # 其他进程仍持有租约：等待它们完成或租约过期后接手
+            time.sleep(poll_interval)
+            continue
+
+        task_id, payload = claimed
+        heartbeat = _Heartbeat(queue, task_id, worker_id)
+        heartbeat.start()
+        try:
+            result = handle(payload)
+        except Exception as e:
+            heartbeat.stop()
+            print(f"[{worker_id}] 任务 {task_id} 失败: {e}")
+            queue.fail(task_id, worker_id, e)
+            continue
+        heartbeat.stop()
+        if not result:
+            print(f"[{worker_id}] 任务 {task_id} 没有返回结果，稍后重试")
+            queue.fail(task_id, worker_id, "empty result")
+            continue
+        if queue.complete(task_id, worker_id, result):
+            completed += 1
+            print(f"[{worker_id}] 完成任务 {task_id}" + ("（租约曾过期）" if heartbeat.lost else ""))
+        else:
+            print(f"[{worker_id}] 任务 {task_id} 已由其他进程完成，丢弃本次结果")
+    return completed
@@ -0,0 +1,92 @@
+"""
+工作区路径和共享状态
+统一解析项目根目录、json目录和音效目录（不依赖当前工作目录），只读取一次 .env，
+并缓存已载入的结构索引和映射表，供 sfx.py 的多个步骤在同一进程中复用
+"""
+
+import os
+from json_io import load_json
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+class Workspace:
+    """一次运行所用的路径和已载入的数据"""
+
+    def __init__(self, root=ROOT_DIR, json_dir=None, sfx_dir=None, placeholder_dir=None, env_file=None):
+        self.root = os.path.abspath(root)
+        self._load_env(env_file or os.path.join(self.root, '.env'))
+        self.json_dir = os.path.abspath(json_dir or os.path.join(self.root, 'json'))
+        self.sfx_dir = sfx_dir or os.environ.get("SFX_DIR")
+        self.placeholder_dir = placeholder_dir or os.environ.get("SFX_PLACEHOLDER_DIR")
+        self._index = None
+        self._mapping = None
+
+    @staticmethod
+    def _load_env(env_file):
+        if os.path.exists(env_file):
+            from dotenv import load_dotenv
+            load_dotenv(env_file)
+
+    @property
+    def structure_path(self):
+        return os.path.join(self.json_dir, 'structure.json')
+
+    @property
+    def mapping_path(self):
+        return os.path.join(self.json_dir, 'mapping.json')
+
+    @property
+    def group_path(self):
+        return os.path.join(self.json_dir, 'group.json')
+
+    @property
+    def metrics_dir(self):
+        return os.path.join(self.json_dir, 'metrics')
+
+    def require_sfx_dir(self):
+        if not self.sfx_dir:
+            raise RuntimeError("请在 .env 文件中设置 SFX_DIR 环境变量，或使用 --sfx-dir 指定！")
+        return self.sfx_dir
+
+    def require_placeholder_dir(self):
+        if not self.placeholder_dir:
+            raise RuntimeError("请在 .env 文件中设置 SFX_PLACEHOLDER_DIR 环境变量，或使用 --placeholder-dir 指定！")
+        return self.placeholder_dir
+
+    @property
+    def index(self):
+        """结构索引，首次访问时读取 structure.json"""
+        if self._index is None:
+            from structure_index import StructureIndex
+            self._index = StructureIndex.load(self.structure_path)
+        return self._index
+
+    @property
+    def mapping(self):
+        """映射表，首次访问时读取 mapping.json"""
+        if self._mapping is None:
+            self._mapping = load_json(self.mapping_path)
+        return self._mapping
+
+    def set_scan_result(self, index, mapping):
+        """记录扫描结果，后续步骤不再重新读取文件"""
+        self._index = index
+        self._mapping = mapping
+
+    def set_mapping(self, mapping):
+        self._mapping = mapping
+
+    def iter_joined(self):
+        """按结构顺序产出 (id, rel_path, ext, original, translation)，映射表中多出的条目 rel_path 为None"""
+        mapping = self.mapping
+        seen = set()
+        for file_id, rel_path, ext in self.index.iter_records():
+            info = mapping.get(file_id)
+            if info is None:
+                continue
+            seen.add(file_id)
+            yield file_id, rel_path, ext, info.get("original"), info.get("translation")
+        for file_id, info in mapping.items():
+            if file_id not in seen:
+                yield file_id, None, None, info.get("original"), info.get("translation")